@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Interest, Skill, User, UserProfile, VerificationCode
+from .models import Interest, Skill, User, UserImport, UserProfile, VerificationCode
 
 
 admin.site.register(User, UserAdmin)
@@ -9,3 +9,4 @@ admin.site.register(UserProfile)
 admin.site.register(Skill)
 admin.site.register(Interest)
 admin.site.register(VerificationCode)
+admin.site.register(UserImport)
@@ -0,0 +1,57 @@
+"""
+Async versions of the UserViewSet read endpoints, routed in place of the
+viewset's when ASGI_READ_VIEWS is set. They answer GET with the same
+envelope and hand other methods to the viewset.
+"""
+from rest_framework.request import Request
+
+from core.async_views import async_api_view, async_success_response, run_sync
+
+from .serializers import UserProfileSerializer
+from .views import UserViewSet, fetch_profile
+
+
+def get_viewset(request, action):
+    # the UserViewSet the sync route would dispatch `action` to, for its
+    # permission checks
+    initkwargs = getattr(UserViewSet, action).kwargs if action != 'retrieve' else {}
+    view = UserViewSet(**initkwargs)
+    view.action = action
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    # the user is already authenticated by async_api_view
+    view.request = Request(request, authenticators=())
+    view.request.user = request.user
+    return view
+
+
+def get_profile_data(request, action, detail='User profile does not exist', **lookup):
+    # UserViewSet.get_profile and serialization, in one trip to a worker thread
+    profile = fetch_profile(get_viewset(request, action), detail, **lookup)
+    return UserProfileSerializer(profile).data
+
+
+def viewset_view(actions, action=None):
+    initkwargs = getattr(UserViewSet, action).kwargs if action else {}
+    return UserViewSet.as_view(actions, **initkwargs)
+
+
+@async_api_view(authenticated=True, fallback=viewset_view({'put': 'me'}, 'me'))
+async def me(request):
+    data = await run_sync(get_profile_data)(request, 'me', user=request.user)
+    return async_success_response(detail="User data fetched successfully", **data)
+
+
+@async_api_view(authenticated=True)
+async def profile(request, pk):
+    data = await run_sync(get_profile_data)(
+        request, 'profile', **{f'user__{UserViewSet.lookup_field}': pk})
+    return async_success_response(detail="Profile data fetched successfully", **data)
+
+
+@async_api_view(fallback=viewset_view({
+    'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+async def retrieve(request, pk):
+    data = await run_sync(get_profile_data)(
+        request, 'retrieve', detail='User Profile does not exist for this user',
+        **{f'user__{UserViewSet.lookup_field}': pk})
+    return async_success_response(detail='Successfully fetched user profile', **data)
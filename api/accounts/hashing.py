@@ -0,0 +1,124 @@
+"""
+Password hashing in a process pool.
+
+Hashers are slow on purpose, a PBKDF2 hash or check costs 100-300 ms of
+CPU. `make_password` and `check_password` below hand that work to a pool of
+PASSWORD_HASHING_WORKERS processes: threads of a threaded worker keep
+serving other requests while they wait, concurrent logins use every core
+but never more, and the `a`-prefixed variants await the pool without
+blocking an event loop.
+"""
+import asyncio
+import atexit
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+__all__ = ['make_password', 'check_password', 'amake_password', 'acheck_password']
+
+
+def get_password_hashing_workers():
+    """
+    Returns the number of password hashing processes (default: CPU count)
+    Set Django SETTINGS.PASSWORD_HASHING_WORKERS to overwrite this, 0
+    hashes in the calling thread
+    """
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def setup_worker():
+    # spawned (not forked) workers start without configured apps
+    django.setup()
+
+
+def get_executor():
+    """
+    Returns the hashing pool of the current process, or None when
+    PASSWORD_HASHING_WORKERS is 0.
+    """
+    global _executor, _executor_pid
+
+    workers = get_password_hashing_workers()
+    if not workers:
+        return None
+    with _executor_lock:
+        # a pool inherited through fork (e.g. gunicorn --preload) has no
+        # worker processes in this process
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+@atexit.register
+def shutdown_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown()
+        _executor = None
+
+
+def _check_password(password, encoded):
+    # runs in the pool, where the caller's setter cannot go
+    updated = []
+    is_correct = hashers.check_password(password, encoded, setter=updated.append)
+    return is_correct, bool(updated)
+
+
+def _run(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
+
+
+async def _arun(func, *args):
+    executor = get_executor()
+    if executor is None:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(func, *args))
+    return await asyncio.wrap_future(executor.submit(func, *args))
+
+
+def make_password(password, salt=None, hasher='default'):
+    """
+    `django.contrib.auth.hashers.make_password` computed in the hashing pool.
+    """
+    return _run(hashers.make_password, password, salt, hasher)
+
+
+def check_password(password, encoded, setter=None):
+    """
+    `django.contrib.auth.hashers.check_password` computed in the hashing
+    pool. `setter(password)` is called in this process when the hash must
+    be upgraded.
+    """
+    is_correct, must_update = _run(_check_password, password, encoded)
+    if is_correct and must_update and setter is not None:
+        setter(password)
+    return is_correct
+
+
+async def amake_password(password, salt=None, hasher='default'):
+    return await _arun(hashers.make_password, password, salt, hasher)
+
+
+async def acheck_password(password, encoded):
+    """
+    Returns (is_correct, must_update) for `password` against `encoded`.
+    """
+    return await _arun(_check_password, password, encoded)
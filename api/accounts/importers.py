@@ -0,0 +1,342 @@
+"""
+Bulk user import from CSV or JSON lines.
+
+Rows are read lazily and written in batches: every batch is validated, has
+its passwords hashed in a process pool and is inserted with one
+`bulk_create` per table in its own transaction. Imported users get no
+verification email.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.functions import Upper
+from django.utils.translation import gettext_lazy as _
+
+from core.camel_case import underscoreize_key
+from core.pagination import invalidate_cached_counts
+from core.uploads import get_upload_storage
+
+from .hashing import setup_worker
+from .models import User, UserProfile, normalize_tag_name
+from .relations import InterestRelatedField, SkillRelatedField
+from .serializers import UserImportSerializer
+
+
+__all__ = ['InvalidRow', 'ImportReport', 'UserImporter', 'get_import_storage', 'guess_format',
+           'read_rows']
+
+
+FORMATS = ('csv', 'jsonl')
+
+# separates the skills or interests in a CSV cell
+CSV_LIST_SEPARATOR = ';'
+
+CSV_LIST_FIELDS = ('skills', 'interests')
+
+PROFILE_FIELDS = ('first_name', 'last_name', 'country_code', 'location', 'nationality')
+
+
+def get_user_import_batch_size():
+    """
+    Returns the number of rows written per transaction (default: 1000)
+    Set Django SETTINGS.USER_IMPORT_BATCH_SIZE to overwrite this
+    """
+    return getattr(settings, 'USER_IMPORT_BATCH_SIZE', 1000)
+
+
+def get_user_import_hashing_workers():
+    """
+    Returns the number of processes hashing passwords (default: CPU count)
+    Set Django SETTINGS.USER_IMPORT_HASHING_WORKERS to overwrite this, 0
+    hashes in the importing process
+    """
+    workers = getattr(settings, 'USER_IMPORT_HASHING_WORKERS', None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def get_user_import_max_reported_errors():
+    """
+    Returns how many row errors an import report keeps (default: 1000)
+    Set Django SETTINGS.USER_IMPORT_MAX_REPORTED_ERRORS to overwrite this
+    """
+    return getattr(settings, 'USER_IMPORT_MAX_REPORTED_ERRORS', 1000)
+
+
+def get_import_storage():
+    """
+    Returns the storage uploaded import files wait in for a worker, the
+    private one when configured as they hold passwords.
+    """
+    return get_upload_storage(private=True) or default_storage
+
+
+def guess_format(name, content_type=None):
+    """
+    Returns 'csv' or 'jsonl' from a file name or content type, or None.
+    """
+    extension = os.path.splitext(name or '')[1].lower()
+    if extension == '.csv' or content_type == 'text/csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson') or content_type in (
+            'application/jsonl', 'application/x-ndjson', 'application/x-jsonlines'):
+        return 'jsonl'
+    return None
+
+
+class InvalidRow:
+    """
+    Stands in for a row that could not be parsed.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+
+def read_rows(stream, format):
+    """
+    Yields (line number, row) for every record of a CSV or JSON lines text
+    stream, one at a time. Keys are turned into snake_case and empty CSV
+    cells are left out; skills and interests in a CSV cell are separated by
+    semicolons.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames:
+            reader.fieldnames = [underscoreize_key(name.strip()) for name in reader.fieldnames]
+        for record in reader:
+            row = {}
+            for key, value in record.items():
+                # cells beyond the header have no key, missing ones are None
+                if not key or value is None or not value.strip():
+                    continue
+                if key in CSV_LIST_FIELDS:
+                    row[key] = [item.strip() for item in value.split(CSV_LIST_SEPARATOR)
+                                if item.strip()]
+                else:
+                    row[key] = value.strip()
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as error:
+                yield line, InvalidRow(_('Invalid JSON: {error}').format(error=error))
+                continue
+            if not isinstance(record, dict):
+                yield line, InvalidRow(_('Expected a JSON object'))
+                continue
+            yield line, {underscoreize_key(key): value for key, value in record.items()
+                         if value not in (None, '')}
+    else:
+        raise ValueError(f'Unknown import format {format!r}, expected one of {FORMATS}')
+
+
+class ImportReport:
+    """
+    Running totals of an import. Only the first `max_errors` row errors are
+    kept, `failed` counts all of them.
+    """
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def rows(self):
+        return self.created + self.failed
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def tick(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+        }
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class UserImporter:
+    """
+    Creates users with their profiles, skills and interests from rows of
+    `read_rows`, `batch_size` rows per transaction.
+    """
+
+    def __init__(self, batch_size=None, workers=None, max_errors=None):
+        self.batch_size = batch_size or get_user_import_batch_size()
+        self.workers = get_user_import_hashing_workers() if workers is None else workers
+        self.max_errors = max_errors
+
+    def run(self, rows, on_batch=None):
+        """
+        Import every row and return the ImportReport. `on_batch(report,
+        errors)` is called after every batch with the row errors of that
+        batch.
+        """
+        report = ImportReport(max_errors=self.max_errors)
+        pool = None
+        if self.workers:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=setup_worker)
+        try:
+            for chunk in _chunks(rows, self.batch_size):
+                errors = self.import_batch(chunk, report, pool)
+                report.tick()
+                if on_batch is not None:
+                    on_batch(report, errors)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        report.tick()
+        return report
+
+    def import_batch(self, rows, report, pool=None):
+        errors = []
+        valid = []
+        for line, row in rows:
+            if isinstance(row, InvalidRow):
+                errors.append((line, {'non_field_errors': [row.message]}))
+                continue
+            serializer = UserImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((line, serializer.validated_data))
+            else:
+                errors.append((line, serializer.errors))
+
+        valid = self.drop_conflicts(valid, errors)
+        if valid:
+            passwords = self.hash_passwords([data.get('password') for _, data in valid], pool)
+            with transaction.atomic():
+                self.create_users([data for _, data in valid], passwords)
+            report.created += len(valid)
+            invalidate_cached_counts(User)
+            invalidate_cached_counts(UserProfile)
+
+        errors.sort(key=lambda error: error[0])
+        for line, row_errors in errors:
+            report.add_error(line, row_errors)
+        return errors
+
+    def drop_conflicts(self, rows, errors):
+        """
+        Returns the rows whose username, email and phone are neither taken
+        nor used by an earlier row, adding an error for the others.
+        """
+        if not rows:
+            return rows
+        taken = {
+            'username': set(User.objects.filter(
+                username__in=[data['username'] for _, data in rows if 'username' in data]
+            ).values_list('username', flat=True)),
+            'email': set(User.objects.annotate(email_upper=Upper('email')).filter(
+                email_upper__in=[data['email'].upper() for _, data in rows]
+            ).values_list('email_upper', flat=True)),
+            'phone': set(User.objects.filter(
+                phone__in=[data['phone'] for _, data in rows if 'phone' in data]
+            ).values_list('phone', flat=True)),
+        }
+        messages = {
+            'username': User._meta.get_field('username').error_messages['unique'],
+            'email': _('Email already exists'),
+            'phone': _('Phone already exists'),
+        }
+
+        unique = []
+        for line, data in rows:
+            values = {
+                'username': data.get('username'),
+                'email': data['email'].upper(),
+                'phone': data.get('phone'),
+            }
+            conflicts = {field: [messages[field]] for field, value in values.items()
+                         if value is not None and value in taken[field]}
+            if conflicts:
+                errors.append((line, conflicts))
+                continue
+            for field, value in values.items():
+                if value is not None:
+                    taken[field].add(value)
+            unique.append((line, data))
+        return unique
+
+    def hash_passwords(self, passwords, pool=None):
+        # rows without a password get an unusable one
+        if pool is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+    def create_users(self, rows, passwords):
+        users = []
+        for data, password in zip(rows, passwords):
+            fields = {field: data[field] for field in
+                      ('username', 'email', 'first_name', 'last_name', 'phone') if field in data}
+            users.append(User(password=password, **fields))
+        User.objects.bulk_create(users)
+        if users[0].pk is None:
+            # only some backends return the primary keys of bulk inserts
+            pks = dict(User.objects.filter(
+                username__in=[user.username for user in users]).values_list('username', 'pk'))
+            for user in users:
+                user.pk = pks[user.username]
+
+        # the same row accounts.signals.create_related_profile writes on signup
+        UserProfile.objects.bulk_create([
+            UserProfile(pk=user.pk, user=user, email=user.email, phone=user.phone,
+                        **{field: data[field] for field in PROFILE_FIELDS if field in data})
+            for user, data in zip(users, rows)
+        ])
+
+        self.link_tags(users, rows, 'skills', SkillRelatedField())
+        self.link_tags(users, rows, 'interests', InterestRelatedField())
+
+    def link_tags(self, users, rows, field_name, related_field):
+        names = [name for data in rows for name in data.get(field_name, [])]
+        if not names:
+            return
+        ids = related_field.resolve_names(names)
+        descriptor = getattr(UserProfile, field_name)
+        through = descriptor.through
+        source = descriptor.field.m2m_field_name()
+        target = descriptor.field.m2m_reverse_field_name()
+        links = {
+            (user.pk, ids[normalize_tag_name(name)])
+            for user, data in zip(users, rows) for name in data.get(field_name, [])
+        }
+        through.objects.bulk_create([
+            through(**{f'{source}_id': profile_id, f'{target}_id': tag_id})
+            for profile_id, tag_id in links
+        ], ignore_conflicts=True)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Interest, Skill, UserProfile, normalize_tag_name
+
+
+class Command(BaseCommand):
+    help = ('Set the normalized name of skills and interests saved before names were '
+            'normalized, merging the ones that differ only in case or whitespace')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would change')
+
+    def handle(self, *args, **options):
+        for model, through, field in ((Skill, UserProfile.skills.through, 'skill'),
+                                      (Interest, UserProfile.interests.through, 'interest')):
+            with transaction.atomic():
+                named, merged = self.backfill(model, through, field)
+                if options['dry_run']:
+                    transaction.set_rollback(True)
+            self.stdout.write(self.style.SUCCESS(
+                f'{"Would name" if options["dry_run"] else "Named"} {named} and '
+                f'merged {merged} {model._meta.verbose_name_plural}'))
+
+    def backfill(self, model, through, field):
+        named = merged = 0
+        kept = dict(model.objects.exclude(normalized_name__isnull=True)
+                    .values_list('normalized_name', 'pk'))
+        # the oldest spelling of a name is kept
+        pending = model.objects.filter(normalized_name__isnull=True, name__isnull=False).order_by('pk')
+        for pk, name in pending.values_list('pk', 'name'):
+            key = normalize_tag_name(name)
+            if key not in kept:
+                model.objects.filter(pk=pk).update(normalized_name=key)
+                kept[key] = pk
+                named += 1
+                continue
+            # profiles that have both keep one row, the duplicate's goes with it
+            profiles = through.objects.filter(**{f'{field}_id': kept[key]}).values('userprofile_id')
+            (through.objects.filter(**{f'{field}_id': pk})
+             .exclude(userprofile_id__in=profiles).update(**{f'{field}_id': kept[key]}))
+            model.objects.filter(pk=pk).delete()
+            merged += 1
+        return named, merged
@@ -0,0 +1,61 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importers import FORMATS, UserImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Create users with their profiles, skills and interests from a CSV or '
+            'JSON lines file, streamed in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads standard input')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format, guessed from the file extension by default')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows written per transaction')
+        parser.add_argument('--workers', type=int,
+                            help='Password hashing processes, 0 hashes in this process')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        if format is None:
+            raise CommandError('Cannot guess the format of the file, pass --format')
+
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding=options['encoding'], newline='')
+        else:
+            try:
+                stream = open(path, encoding=options['encoding'], newline='')
+            except OSError as error:
+                raise CommandError(error)
+
+        # row errors are written as they happen, not kept until the end
+        importer = UserImporter(
+            batch_size=options['batch_size'], workers=options['workers'], max_errors=0)
+        with stream:
+            report = importer.run(read_rows(stream, format), on_batch=self.write_batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} users, {report.failed} rows failed, '
+            f'in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)'))
+
+    def write_batch(self, report, errors):
+        for line, row_errors in errors:
+            for field, messages in row_errors.items():
+                self.stderr.write(f'line {line}: {field}: {self.format_messages(messages)}')
+        self.stdout.write(
+            f'{report.rows} rows: {report.created} created, {report.failed} failed '
+            f'({report.rows_per_second:.0f} rows/s)')
+
+    @staticmethod
+    def format_messages(messages):
+        if isinstance(messages, dict):
+            # errors of list items are keyed by their index
+            return ' '.join(f'[{index}] {" ".join(map(str, item))}'
+                            for index, item in messages.items())
+        return ' '.join(map(str, messages))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+from accounts.managers import normalize_phone
+from accounts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Normalize the stored phones of users saved before logins looked phones up '
+            'normalized, and list emails that several users share up to case')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users updated per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would change')
+
+    def handle(self, *args, **options):
+        batch, updated = [], 0
+        queryset = User.objects.exclude(phone__isnull=True).exclude(phone='').only('pk', 'phone')
+        for user in queryset.iterator(chunk_size=options['batch_size']):
+            phone = normalize_phone(user.phone)
+            if phone and phone != user.phone:
+                user.phone = phone
+                batch.append(user)
+            if len(batch) >= options['batch_size']:
+                updated += self.save_phones(batch, options['dry_run'])
+                batch = []
+        updated += self.save_phones(batch, options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would normalize" if options["dry_run"] else "Normalized"} {updated} phones'))
+
+        duplicates = (User.objects.exclude(email__isnull=True).exclude(email='')
+                      .values(email_upper=Upper('email'))
+                      .annotate(users=Count('pk')).filter(users__gt=1).order_by('email_upper'))
+        for duplicate in duplicates:
+            pks = list(User.objects.filter(email__iexact=duplicate['email_upper'])
+                       .order_by('pk').values_list('pk', flat=True))
+            # logins pick the exact match, then the oldest; merging is left to an admin
+            self.stdout.write(self.style.WARNING(
+                f'Email {duplicate["email_upper"].lower()} is shared by users {pks}'))
+
+    def save_phones(self, users, dry_run):
+        if users and not dry_run:
+            with transaction.atomic():
+                User.objects.bulk_update(users, ['phone'])
+        return len(users)
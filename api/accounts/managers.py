@@ -1,10 +1,34 @@
+import logging
+import re
+from datetime import timedelta
+
 from django.contrib.auth.models import UserManager
 from django.db.models import Q
+from django.db.models.functions import Upper
 from django.apps import apps
 from django.db import models
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['AccountManager', 'VerificationCodeQuerySet', 'normalize_phone']
+
 
+PHONE_RE = re.compile(r'^\+?[\d\s().-]{6,20}$')
 
-__all__ = ['AccountManager', 'VerificationCodeQuerySet']
+
+def normalize_phone(value):
+    """
+    Returns `value` as a leading `+` and digits if it looks like a phone
+    number, otherwise None.
+    """
+    if not value or not PHONE_RE.match(value):
+        return None
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return None
+    return f'+{digits}' if value.startswith('+') else digits
 
 
 class VerificationCodeQuerySet(models.QuerySet):
@@ -23,6 +47,20 @@ class VerificationCodeQuerySet(models.QuerySet):
     def email_verification_codes(self, **kwargs):
         return self.filter(**kwargs, code_type='email_verification')
 
+    def live(self):
+        # codes that have not reached their expiry time yet
+        from .models import get_password_reset_code_expiry_time
+        return self.filter(created_at__gt=timezone.now() - timedelta(
+            hours=get_password_reset_code_expiry_time()))
+
+    def get_live_or_create(self, user, code_type):
+        # re-use an unexpired code of the user instead of adding a row per request
+        code = self.filter(user=user, code_type=code_type).live().order_by(
+            '-created_at').first()
+        if code is None:
+            code = self.create(user=user, code_type=code_type)
+        return code
+
 
 class AccountQuerySet(models.QuerySet):
     def get_queryset(self):
@@ -46,8 +84,40 @@ class AccountManager(UserManager):
         return AccountQuerySet(self.model, using=self._db, hints=self._hints)
 
     def get_by_natural_key(self, username):
-        return self.get(
-            Q(**{self.model.USERNAME_FIELD: username}) |
-            Q(**{self.model.EMAIL_FIELD: username}) |
-            Q(**{self.model.PHONE_FIELD: username})
-        )
+        # Pick the lookup from the shape of the identifier so that every
+        # branch is answered by an index (see User.Meta.indexes) instead of
+        # an OR across username, email and phone.
+        if '@' in username:
+            # usernames cannot contain '@'; compare against the same
+            # expression as the UPPER(email) index
+            return self._get_one(self.alias(
+                email_upper=Upper(self.model.EMAIL_FIELD)
+            ).filter(email_upper=username.upper()), username, self.model.EMAIL_FIELD)
+
+        phone = normalize_phone(username)
+        if phone:
+            # digits only usernames are possible, so look at both columns
+            return self._get_one(self.filter(
+                Q(**{self.model.USERNAME_FIELD: username}) |
+                Q(**{f'{self.model.PHONE_FIELD}__in': {username, phone}})
+            ), username, self.model.PHONE_FIELD)
+        return self.get(**{self.model.USERNAME_FIELD: username})
+
+    def _get_one(self, queryset, identifier, field):
+        """
+        Returns the one user of `queryset`. Emails and phones are not
+        unique, rows saved before they were compared case-insensitively or
+        normalized can share one: the user whose value matches
+        `identifier` exactly wins, then the oldest, and the clash is logged
+        (`manage.py normalize_user_identifiers` lists them).
+        """
+        users = list(queryset.order_by('pk'))
+        if not users:
+            raise self.model.DoesNotExist(
+                '%s matching query does not exist.' % self.model._meta.object_name)
+        if len(users) > 1:
+            logger.warning('%d users share the %s %r, picked the first of %s',
+                           len(users), field, identifier, [user.pk for user in users])
+            exact = [user for user in users if getattr(user, field) == identifier]
+            return (exact or users)[0]
+        return users[0]
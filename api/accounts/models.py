@@ -1,4 +1,8 @@
+from asgiref.sync import sync_to_async
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
@@ -8,7 +12,8 @@ from core.models import BaseModel
 from core.utils import random_username, UsernameValidator
 from core.utils import random_digits
 
-from .managers import AccountManager, VerificationCodeQuerySet
+from . import hashing
+from .managers import AccountManager, VerificationCodeQuerySet, normalize_phone
 
 
 class User(AbstractUser):
@@ -21,6 +26,12 @@ class User(AbstractUser):
         ordering = ['id']
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        indexes = [
+            # serves AccountManager.get_by_natural_key and, on PostgreSQL,
+            # the UPPER(email::text) that `email__iexact` compiles to
+            models.Index(Upper('email'), name='accounts_user_email_upper_idx'),
+            models.Index(fields=['phone'], name='accounts_user_phone_idx'),
+        ]
 
     username_validator = UsernameValidator()
 
@@ -60,6 +71,37 @@ class User(AbstractUser):
     def __str__(self):
         return self.email if self.email else self.username
 
+    def save(self, *args, **kwargs):
+        # stored the way AccountManager.get_by_natural_key looks phones up
+        self.phone = normalize_phone(self.phone) or self.phone
+        super().save(*args, **kwargs)
+
+    # Passwords are hashed and checked in accounts.hashing's process pool.
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=["password"])
+        return hashing.check_password(raw_password, self.password, setter)
+
+    async def aset_password(self, raw_password):
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        is_correct, must_update = await hashing.acheck_password(raw_password, self.password)
+        if is_correct and must_update:
+            await self.aset_password(raw_password)
+            self._password = None
+            await sync_to_async(self.save)(update_fields=["password"])
+        return is_correct
+
 
 class UserProfile(BaseModel):
     class Meta:
@@ -90,6 +132,8 @@ class UserProfile(BaseModel):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, null=True, related_name='profile')
     avatar = models.URLField(blank=True, null=True)
+    # resized copies of the avatar, see core.images
+    avatar_variants = models.JSONField(default=dict, blank=True)
     first_name = models.CharField(max_length=255, blank=True, null=True)
     last_name = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
@@ -101,15 +145,29 @@ class UserProfile(BaseModel):
         return f'{self.first_name} {self.last_name}'
 
 
+def normalize_tag_name(name):
+    """
+    Returns the case and whitespace insensitive form of a skill or interest
+    name, which is unique per table
+    """
+    return ' '.join(str(name).split()).casefold()
+
+
 class Interest(BaseModel):
     """
     Interest model is used to store the interests of users.
     """
     name = models.CharField(max_length=255, blank=True, null=True)
+    normalized_name = models.CharField(
+        max_length=255, unique=True, null=True, editable=False)
 
     class Meta:
         ordering = ['created_at']
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = None if self.name is None else normalize_tag_name(self.name)
+        super(Interest, self).save(*args, **kwargs)
+
     def __str__(self) -> str:
         return self.name
 
@@ -119,11 +177,17 @@ class Skill(BaseModel):
     Skill model is used to store the skill of users.
     """
     name = models.CharField(max_length=255, blank=True, null=True)
+    normalized_name = models.CharField(
+        max_length=255, unique=True, null=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['created_at']
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = None if self.name is None else normalize_tag_name(self.name)
+        super(Skill, self).save(*args, **kwargs)
+
     def __str__(self) -> str:
         return self.name
 
@@ -147,6 +211,13 @@ class VerificationCode(BaseModel):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # VerificationCodeQuerySet filters: live codes of a user and code lookups
+            models.Index(fields=['code_type', 'user', 'created_at']),
+            models.Index(fields=['code_type', 'code']),
+            # expiry sweeps
+            models.Index(fields=['created_at']),
+        ]
 
     @staticmethod
     def generate_key():
@@ -162,6 +233,34 @@ class VerificationCode(BaseModel):
         return f'{self.code} for {self.user.email}'
 
 
+class UserImport(BaseModel):
+    """
+    UserImport model for an uploaded user file imported by a celery worker,
+    see accounts.tasks.run_user_import
+    """
+    class Meta:
+        ordering = ['-created_at']
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    # name of the upload in the import storage, deleted once imported
+    file = models.CharField(max_length=1024)
+    format = models.CharField(max_length=10)
+    # ImportReport.as_dict() of the rows imported so far
+    report = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    last_error = models.TextField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.file} ({self.status})'
+
+
 def get_password_reset_code_expiry_time():
     """
     Returns the password reset code expirty time in hours (default: 24)
@@ -181,12 +280,23 @@ def get_password_reset_lookup_field():
     return getattr(settings, 'PASSWORD_RESET_LOOKUP_FIELD', 'email')
 
 
-def clear_expired(expiry_time):
+def clear_expired(expiry_time, batch_size=1000):
     """
-    Remove all expired codes
+    Remove all expired codes in batches of `batch_size` rows so that no
+    single delete holds locks on a large part of the table
     :param expiry_time: Code expiration time
+    :param batch_size: Rows deleted per statement
+    :return: number of deleted codes
     """
-    VerificationCode.objects.filter(created_at__lte=expiry_time).delete()
+    deleted = 0
+    expired = VerificationCode.objects.filter(
+        created_at__lte=expiry_time).order_by('created_at')
+    while True:
+        pks = list(expired.values_list('pk', flat=True)[:batch_size])
+        if pks:
+            deleted += VerificationCode.objects.filter(pk__in=pks).delete()[0]
+        if len(pks) < batch_size:
+            return deleted
 
 
 def eligible_for_reset(self):
@@ -1,25 +1,162 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
 from rest_framework.serializers import RelatedField
 
-from .models import Skill, Interest
+from .models import Skill, Interest, normalize_tag_name
 
 
-class SkillRelatedField(RelatedField):
-    queryset = Skill.objects.all()
+class TagIdCache:
+    """
+    Bounded, thread safe LRU of normalized tag name -> primary key, kept per
+    process. Deleting a tag (see accounts.signals.forget_deleted_tag) bumps
+    a version in the Django cache, and every process that sees a new
+    version drops its entries, as one of them may be the deleted tag.
+    """
 
-    def to_representation(self, value):
-        return value.name
+    def __init__(self, version_key, maxsize=2048):
+        self.version_key = version_key
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        # called with the lock held
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 0, None)
+            version = cache.get(self.version_key, 0)
+        if version != self._version:
+            self._ids.clear()
+            self._version = version
+
+    def get_many(self, names):
+        found = {}
+        with self._lock:
+            self._sync()
+            for name in names:
+                if name in self._ids:
+                    self._ids.move_to_end(name)
+                    found[name] = self._ids[name]
+        return found
+
+    def set_many(self, ids):
+        with self._lock:
+            for name, pk in ids.items():
+                self._ids[name] = pk
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def discard(self, name):
+        """
+        Forget `name` here and make the other processes forget their entries.
+        """
+        with self._lock:
+            self._ids.pop(name, None)
+        cache.add(self.version_key, 0, None)
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # evicted just now, which changes the version as well
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+class TagManyRelatedField(ManyRelatedField):
+    """
+    Resolves the whole list of names at once instead of one
+    `get_or_create` per item.
+    """
 
     def to_internal_value(self, data):
-        skill, created = Skill.objects.get_or_create(name=data)
-        return skill
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.resolve_many(data)
 
 
-class InterestRelatedField(RelatedField):
-    queryset = Interest.objects.all()
+class TagRelatedField(RelatedField):
+    """
+    Represents a skill or interest by its name and creates missing ones.
+    Internal values are primary keys, which is what the related managers'
+    `add()` and `set()` need.
+    """
+    model = None
+    id_cache = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return TagManyRelatedField(**list_kwargs)
 
     def to_representation(self, value):
         return value.name
 
     def to_internal_value(self, data):
-        interest, created = Interest.objects.get_or_create(name=data)
-        return interest
+        return self.resolve_many([data])[0]
+
+    def resolve_many(self, names):
+        """
+        Returns the primary keys of the tags named `names`, in order, with at
+        most one select and one insert for the names that are not cached.
+        """
+        ids = self.resolve_names(names)
+        return list(OrderedDict.fromkeys(ids[normalize_tag_name(name)] for name in names))
+
+    def resolve_names(self, names):
+        """
+        Returns {normalized name: primary key} for the tags named `names`,
+        creating the missing ones.
+        """
+        names = [' '.join(str(name).split()) for name in names]
+        normalized = [normalize_tag_name(name) for name in names]
+
+        ids = self.id_cache.get_many(normalized)
+        missing = {}
+        for key, name in zip(normalized, names):
+            if key not in ids:
+                # the first spelling of a new tag becomes its name
+                missing.setdefault(key, name)
+        if missing:
+            ids.update(self._fetch_ids(missing))
+        missing = {key: name for key, name in missing.items() if key not in ids}
+        if missing:
+            # concurrent requests may create the same tag, the unique
+            # normalized_name makes the loser's insert a no-op
+            self.model.objects.bulk_create(
+                [self.model(name=name, normalized_name=key) for key, name in missing.items()],
+                ignore_conflicts=True)
+            ids.update(self._fetch_ids(missing))
+
+        # tags created in a transaction that rolls back must not be cached
+        transaction.on_commit(lambda: self.id_cache.set_many(ids))
+        return ids
+
+    def _fetch_ids(self, normalized):
+        return dict(self.model.objects.filter(
+            normalized_name__in=list(normalized)).values_list('normalized_name', 'pk'))
+
+
+class SkillRelatedField(TagRelatedField):
+    queryset = Skill.objects.all()
+    model = Skill
+    id_cache = TagIdCache('tag-ids:skill:version')
+
+
+class InterestRelatedField(TagRelatedField):
+    queryset = Interest.objects.all()
+    model = Interest
+    id_cache = TagIdCache('tag-ids:interest:version')
@@ -8,12 +8,20 @@ from django.utils.translation import gettext_lazy as _
 
 from rest_framework import exceptions, serializers
 
+from core.serializers import ImageURLField
+from core.utils import UsernameValidator
+
+from .managers import normalize_phone
 from .relations import InterestRelatedField, SkillRelatedField
 from .validators import RegisterValidateMixin
-from .models import User, UserProfile, VerificationCode, get_password_reset_code_expiry_time
+from .models import User, UserImport, UserProfile, VerificationCode, get_password_reset_code_expiry_time
 
 
 class UserMinimalSerializer(serializers.ModelSerializer):
+    # user lists show small avatars
+    avatar = ImageURLField(variants_source='avatar_variants', size='thumbnail',
+                           required=False, allow_null=True, allow_blank=True)
+
     class Meta:
         model = UserProfile
         fields = ('id', 'email', 'first_name', 'last_name', 'avatar')
@@ -28,6 +36,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(required=False)
     skills = SkillRelatedField(many=True, required=False)
     interests = InterestRelatedField(many=True, required=False)
+    avatar = ImageURLField(variants_source='avatar_variants', required=False,
+                           allow_null=True, allow_blank=True)
 
     class Meta:
         model = UserProfile
@@ -52,11 +62,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
         instance = super().update(instance, validated_data)
 
-        # create or update skills and interests
-        for skill in skills:
-            instance.skills.add(skill)
-        for interest in interests:
-            instance.interests.add(interest)
+        # add skills and interests, resolved to primary keys by the related fields
+        if skills:
+            instance.skills.add(*skills)
+        if interests:
+            instance.interests.add(*interests)
         return instance
 
 
@@ -75,13 +85,50 @@ class CustomUserSerializer(RegisterValidateMixin, serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        user = super().create(validated_data)
-        # set password
-        user.set_password(validated_data['password'])
+        # hash the password before the first save so the row is written once
+        password = validated_data.pop('password')
+        profile_defaults = validated_data.pop('profile_defaults', None)
+        user = User(**validated_data)
+        user.set_password(password)
+        if profile_defaults:
+            # picked up by accounts.signals.create_related_profile
+            user._profile_defaults = profile_defaults
         user.save()
         return user
 
 
+class UserImportSerializer(serializers.Serializer):
+    """
+    One row of a bulk user import. Uniqueness is checked for a whole batch
+    at once by accounts.importers.UserImporter instead of per row.
+    """
+    username = serializers.CharField(
+        max_length=150, required=False, validators=[UsernameValidator()])
+    email = serializers.EmailField(max_length=254)
+    password = serializers.CharField(required=False, write_only=True)
+    first_name = serializers.CharField(max_length=150, required=False)
+    last_name = serializers.CharField(max_length=150, required=False)
+    phone = serializers.CharField(max_length=20, required=False)
+    country_code = serializers.CharField(max_length=10, required=False)
+    location = serializers.CharField(max_length=255, required=False)
+    nationality = serializers.CharField(max_length=255, required=False)
+    skills = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False)
+    interests = serializers.ListField(
+        child=serializers.CharField(max_length=255), required=False)
+
+    def validate_phone(self, value):
+        # bulk_create skips User.save, which stores phones normalized
+        return normalize_phone(value) or value
+
+
+class UserImportStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = ('id', 'status', 'format', 'report', 'last_error', 'created_at', 'finished_at')
+        read_only_fields = fields
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     class Meta(object):
         fields = ('old_password', 'new_password')
@@ -1,13 +1,15 @@
 import django.dispatch
 from django.urls import reverse
 from django.dispatch import receiver
-from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives, get_connection
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.conf import settings
 
-from .models import UserProfile
+from core import images
+from core.mail import queue_email
+
+from .models import Interest, Skill, UserProfile
 from .models import User
+from .relations import InterestRelatedField, SkillRelatedField
 
 
 DEBUG = getattr(settings, "DEBUG", True)
@@ -19,6 +21,8 @@ __all__ = [
     'pre_password_reset',
     'post_password_reset',
     'create_related_profile',
+    'forget_deleted_tag',
+    'derive_avatar',
 ]
 
 
@@ -29,12 +33,31 @@ def create_related_profile(sender, instance, created, *args, **kwargs):
     # this signal to be run was an update action, we know the user already
     # has a profile.
     if instance and created:
-        instance.profile = UserProfile.objects.create(pk=instance.pk, user=instance)
-        instance.profile.first_name = instance.first_name
-        instance.profile.last_name = instance.last_name
-        instance.profile.email = instance.email
-        instance.profile.phone = instance.phone
-        instance.profile.save()
+        # Profile fields given at signup (see CustomUserSerializer.create) are
+        # written with the same insert.
+        fields = dict(getattr(instance, '_profile_defaults', None) or {})
+        fields.setdefault('first_name', instance.first_name)
+        fields.setdefault('last_name', instance.last_name)
+        fields['email'] = instance.email
+        fields['phone'] = instance.phone
+        instance.profile = UserProfile.objects.create(
+            pk=instance.pk, user=instance, **fields)
+
+
+@receiver(post_save, sender=UserProfile)
+def derive_avatar(sender, instance, *args, **kwargs):
+    # a new avatar no longer matches the source its derivatives were made of
+    if images.needs_derivatives(instance.avatar, instance.avatar_variants):
+        images.enqueue_derivatives(instance)
+
+
+@receiver(post_delete, sender=Skill)
+@receiver(post_delete, sender=Interest)
+def forget_deleted_tag(sender, instance, *args, **kwargs):
+    # drop the deleted tag from the per-process name -> id cache
+    field = SkillRelatedField if sender is Skill else InterestRelatedField
+    if instance.normalized_name is not None:
+        field.id_cache.discard(instance.normalized_name)
 
 
 reset_password_code_created = django.dispatch.Signal(
@@ -51,7 +74,7 @@ user_signed_up = django.dispatch.Signal(providing_args=["user"])
 def verify_user_email(sender, instance, verification_code, *args, **kwargs):
     """
     Handles email verification codes
-    When a code is created, an e-mail needs to be sent to the user for verification
+    When a code is created, an e-mail for verification is queued in the outbox
     :param sender: View Class that sent the signal
     :param instance: View Instance that sent the signal
     :param verification_code: Code Model Object
@@ -60,14 +83,11 @@ def verify_user_email(sender, instance, verification_code, *args, **kwargs):
     :return:
     """
     EMAIL_HOST_USER = getattr(settings, "EMAIL_HOST_USER", None)
-    DEFAULT_FROM_EMAIL = getattr(settings, "DEFAULT_FROM_EMAIL", None)
 
     if not EMAIL_HOST_USER:
         return
 
-    connection = get_connection(
-        username=EMAIL_HOST_USER, fail_silently=not DEBUG)
-    # send an e-mail to the user
+    # queue an e-mail to the user
     context = {
         'current_user': verification_code.user,
         'username': verification_code.user.username,
@@ -79,35 +99,25 @@ def verify_user_email(sender, instance, verification_code, *args, **kwargs):
             verification_code.code)
     }
 
-    # render email text
-    email_html_message = render_to_string(
-        'email/verify_email.html', context)
-    email_plaintext_message = render_to_string(
-        'email/verify_email.txt', context)
-
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         "Verify your email, {title}".format(
             title=verification_code.user.first_name or "Sir/Madam"),
-        # message:
-        email_plaintext_message,
-        # from:
-        "Support <support@gmail.com>",
+        # template:
+        'email/verify_email',
+        context,
         # to:
         [verification_code.user.email],
-        # connection
-        connection=connection
+        # from:
+        "Support <support@gmail.com>",
     )
-    msg.attach_alternative(email_html_message, "text/html")
-    msg.send()
-
 
 
 @receiver(reset_password_code_created)
 def password_reset_code_created(sender, instance, reset_password_code, *args, **kwargs):
     """
     Handles password reset codes
-    When a code is created, an e-mail needs to be sent to the user
+    When a code is created, an e-mail is queued in the outbox for the user
     :param sender: View Class that sent the signal
     :param instance: View Instance that sent the signal
     :param reset_password_code: Code Model Object
@@ -116,14 +126,11 @@ def password_reset_code_created(sender, instance, reset_password_code, *args, **
     :return:
     """
     EMAIL_HOST_USER = getattr(settings, "EMAIL_HOST_USER", None)
-    DEFAULT_FROM_EMAIL = getattr(settings, "DEFAULT_FROM_EMAIL", None)
 
     if not EMAIL_HOST_USER:
         return
 
-    connection = get_connection(
-        username=EMAIL_HOST_USER, fail_silently=not DEBUG)
-    # send an e-mail to the user
+    # queue an e-mail to the user
     context = {
         'current_user': reset_password_code.user,
         'username': reset_password_code.user.username,
@@ -135,24 +142,15 @@ def password_reset_code_created(sender, instance, reset_password_code, *args, **
             reset_password_code.code)
     }
 
-    # render email text
-    email_html_message = render_to_string(
-        'email/user_reset_password.html', context)
-    email_plaintext_message = render_to_string(
-        'email/user_reset_password.txt', context)
-
-    msg = EmailMultiAlternatives(
+    queue_email(
         # title:
         "Password Reset for {title}".format(
             title=reset_password_code.user.first_name or "Sir/Madam"),
-        # message:
-        email_plaintext_message,
-        # from:
-        "Support <support@gmail.com>",
+        # template:
+        'email/user_reset_password',
+        context,
         # to:
         [reset_password_code.user.email],
-        # connection
-        connection=connection
+        # from:
+        "Support <support@gmail.com>",
     )
-    msg.attach_alternative(email_html_message, "text/html")
-    msg.send()
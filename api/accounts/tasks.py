@@ -0,0 +1,79 @@
+import io
+import logging
+import multiprocessing
+from datetime import timedelta
+
+from celery import shared_task
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .importers import UserImporter, get_import_storage, get_user_import_max_reported_errors, read_rows
+from .models import UserImport, clear_expired, get_password_reset_code_expiry_time
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_verification_code_sweep_batch_size():
+    """
+    Returns the number of expired codes deleted per statement (default: 1000)
+    Set Django SETTINGS.VERIFICATION_CODE_SWEEP_BATCH_SIZE to overwrite this
+    """
+    return getattr(settings, 'VERIFICATION_CODE_SWEEP_BATCH_SIZE', 1000)
+
+
+@shared_task
+def sweep_expired_verification_codes():
+    """
+    Delete all codes where created_at < now - expiry hours
+    :return: number of deleted codes
+    """
+    expiry_time = timezone.now() - timedelta(
+        hours=get_password_reset_code_expiry_time())
+    return clear_expired(
+        expiry_time, batch_size=get_verification_code_sweep_batch_size())
+
+
+@shared_task
+def run_user_import(import_id):
+    """
+    Import the uploaded file of a pending UserImport, its report is saved
+    after every batch so that clients can poll the progress
+    :return: number of created users
+    """
+    with transaction.atomic():
+        # a job picked up by another worker is skipped
+        user_import = (UserImport.objects.select_for_update(skip_locked=True)
+                       .filter(pk=import_id, status='pending').first())
+        if user_import is None:
+            return 0
+        user_import.status = 'running'
+        user_import.save(update_fields=['status'])
+
+    def save_progress(report, errors):
+        UserImport.objects.filter(pk=user_import.pk).update(report=report.as_dict())
+
+    # processes of the prefork pool are daemons, which cannot start the
+    # hashing pool, their passwords are hashed in the task's process
+    workers = 0 if multiprocessing.current_process().daemon else None
+    importer = UserImporter(workers=workers, max_errors=get_user_import_max_reported_errors())
+    storage = get_import_storage()
+    try:
+        with storage.open(user_import.file, 'rb') as upload:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            report = importer.run(read_rows(stream, user_import.format), on_batch=save_progress)
+    except Exception as exc:
+        # batches written before the error stay imported
+        logger.exception('User import %s failed', user_import.pk)
+        user_import.status = 'failed'
+        user_import.last_error = str(exc)
+        user_import.report = UserImport.objects.values_list('report', flat=True).get(pk=user_import.pk)
+    else:
+        user_import.status = 'completed'
+        user_import.report = report.as_dict()
+    user_import.finished_at = timezone.now()
+    user_import.save(update_fields=['status', 'last_error', 'report', 'finished_at'])
+    storage.delete(user_import.file)
+    return user_import.report.get('created', 0)
@@ -1,8 +1,37 @@
-from django.urls import reverse
+import importlib
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-from core.tests import BaseAPITestCase
+from asgiref.sync import async_to_sync
 
-from .models import VerificationCode
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from core.models import OutboxEmail
+from core.planning import get_queryset_plan
+from core.tests import BaseAPITestCase, BaseTestCaseMixin
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, hashing, urls
+from .importers import UserImporter, read_rows
+from .managers import normalize_phone
+from .models import Interest, Skill, User, UserImport, UserProfile, VerificationCode, clear_expired
+from .relations import SkillRelatedField
+from .serializers import UserProfileSerializer
+from .tasks import run_user_import, sweep_expired_verification_codes
+from .views import UserViewSet
 
 
 class AccountsAPITestCase(BaseAPITestCase):
@@ -187,3 +216,599 @@ class AccountsAPITestCase(BaseAPITestCase):
         self.assertEqual(resposne.status_code, 404)
         self.assertEqual(resposne.json().get(
             'detail'), 'The OTP password entered is not valid. Please check and try again.')
+
+    @override_settings(EMAIL_HOST_USER='support@gmail.com',
+                       EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_reset_password_queues_email_in_outbox(self):
+        url = reverse('user-reset-password')
+        payload = {"email": self.roger_user.email}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, payload)
+        self.assertEqual(response.status_code, 200)
+        # nothing is sent within the request, delivery is enqueued on commit
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(callbacks), 1)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, [self.roger_user.email])
+        code = VerificationCode.objects.password_reset_codes(
+            user=self.roger_user).get()
+        self.assertIn(code.code, email.body)
+
+
+class ProfileQueryCountAPITestCase(BaseAPITestCase):
+    """
+    Profile endpoints load the user, skills and interests up front instead
+    of one query per relation.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for name in ('Python', 'Django', 'Public Speaking'):
+            self.roger_profile.skills.add(Skill.objects.create(name=name))
+        for name in ('Football', 'Reading'):
+            self.roger_profile.interests.add(Interest.objects.create(name=name))
+
+    def test_profile_serializer_plan(self):
+        self.assertEqual(get_queryset_plan(UserProfileSerializer, UserProfile),
+                         (['user'], ['interests', 'skills']))
+
+    def test_retrieve_query_count(self):
+        url = reverse('user-detail', args=[self.roger_user.id])
+        with self.assertNumQueries(3):
+            response = self.sally_client.get(url)
+        self.assertEqual(len(response.json().get('data').get('skills')), 3)
+
+    def test_profile_query_count(self):
+        url = reverse('user-profile', args=[self.roger_user.id])
+        with self.assertNumQueries(3):
+            response = self.sally_client.get(url)
+        self.assertEqual(len(response.json().get('data').get('interests')), 2)
+
+    def test_me_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.roger_client.get(reverse('user-me'))
+        self.assertEqual(response.json().get('data').get('isActive'), True)
+
+    def test_retrieve_missing_profile(self):
+        url = reverse('user-detail', args=[0])
+        response = self.sally_client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_pk_is_not_found(self):
+        response = self.client.get(reverse('user-detail', args=['abc']))
+        self.assertEqual(response.status_code, 404)
+        response = self.sally_client.get(reverse('user-profile', args=['abc']))
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamingExportAPITestCase(BaseAPITestCase):
+
+    def read_stream(self, response):
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_admin_can_export_profiles(self):
+        self.roger_profile.skills.add(Skill.objects.create(name='Python'))
+        response = self.admin_client.get(reverse('user-export'))
+        self.assertEqual(response.status_code, 200)
+        body = self.read_stream(response)
+        self.assertEqual(body['status'], 'Success')
+        results = body['data']['results']
+        self.assertEqual(len(results), 4)
+        roger = next(item for item in results if item['id'] == self.roger_profile.id)
+        self.assertEqual(roger['skills'], ['Python'])
+        self.assertIn('isEmailVerified', roger)
+
+    def test_user_cannot_export_profiles(self):
+        response = self.roger_client.get(reverse('user-export'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_can_be_streamed(self):
+        response = self.admin_client.get(reverse('user-list'), {'stream': 'true'})
+        results = self.read_stream(response)['data']['results']
+        self.assertEqual([user['id'] for user in results], sorted(
+            [self.admin_user.id, self.sally_user.id, self.roger_user.id, self.james_user.id]))
+        self.assertIn('dateJoined', results[0])
+
+    def test_only_staff_can_stream_the_list(self):
+        response = self.client.get(reverse('user-list'), {'stream': 'true'})
+        self.assertEqual(response.status_code, 401)
+        response = self.roger_client.get(reverse('user-list'), {'stream': 'true'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.streaming)
+
+
+class VerificationCodeAPITestCase(BaseAPITestCase):
+
+    def create_code(self, hours_old, **kwargs):
+        code = VerificationCode.objects.create(**kwargs)
+        VerificationCode.objects.filter(pk=code.pk).update(
+            created_at=timezone.now() - timedelta(hours=hours_old))
+        return code
+
+    def test_sweeper_deletes_only_expired_codes(self):
+        for _ in range(3):
+            self.create_code(25, user=self.roger_user)
+        live = self.create_code(1, user=self.roger_user)
+        self.assertEqual(sweep_expired_verification_codes(), 3)
+        self.assertQuerysetEqual(
+            VerificationCode.objects.all(), [live.pk], transform=lambda code: code.pk)
+
+    def test_clear_expired_deletes_in_batches(self):
+        for _ in range(5):
+            self.create_code(25, user=self.sally_user)
+        # one select and one delete per batch
+        with self.assertNumQueries(3 * 2):
+            self.assertEqual(clear_expired(timezone.now() - timedelta(hours=24), batch_size=2), 5)
+        self.assertFalse(VerificationCode.objects.exists())
+
+    def test_verify_email_reuses_live_code(self):
+        url = reverse('user-verify-email')
+        for _ in range(2):
+            response = self.roger_client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(VerificationCode.objects.email_verification_codes(
+            user=self.roger_user).count(), 1)
+
+    def test_reset_password_replaces_expired_code(self):
+        expired = self.create_code(25, user=self.roger_user)
+        url = reverse('user-reset-password')
+        for _ in range(2):
+            response = self.client.post(url, {"email": self.roger_user.email})
+            self.assertEqual(response.status_code, 200)
+        live = VerificationCode.objects.password_reset_codes(
+            user=self.roger_user).live()
+        self.assertEqual(live.count(), 1)
+        self.assertNotEqual(live.get().pk, expired.pk)
+
+
+class NaturalKeyTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'roger', 'Roger@asdf.com', '2424df22', phone='+9779860479861')
+
+    def get_where_clause(self, identifier):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(User.objects.get_by_natural_key(identifier), self.user)
+        sql = queries.captured_queries[0]['sql']
+        return sql[sql.index('WHERE'):]
+
+    def test_username(self):
+        where = self.get_where_clause('roger')
+        self.assertIn('"username"', where)
+        self.assertNotIn(' OR ', where)
+
+    def test_email_is_case_insensitive(self):
+        where = self.get_where_clause('roger@ASDF.com')
+        self.assertIn('"email"', where)
+        self.assertNotIn(' OR ', where)
+
+    def test_phone_is_normalized(self):
+        where = self.get_where_clause('+977 986-047-9861')
+        self.assertIn('"phone"', where)
+        self.assertNotIn('"email"', where)
+
+    def test_unknown_identifier(self):
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key('nobody@asdf.com')
+
+    def test_case_duplicate_emails(self):
+        # saved before emails were compared case-insensitively
+        other = User.objects.create_user('roger2', 'roger@asdf.com', '2424df22')
+        with self.assertLogs('accounts.managers', 'WARNING'):
+            self.assertEqual(User.objects.get_by_natural_key('roger@asdf.com'), other)
+        with self.assertLogs('accounts.managers', 'WARNING'):
+            self.assertEqual(User.objects.get_by_natural_key('ROGER@asdf.com'), self.user)
+        stdout = io.StringIO()
+        call_command('normalize_user_identifiers', stdout=stdout)
+        self.assertIn(f'roger@asdf.com is shared by users {[self.user.pk, other.pk]}', stdout.getvalue())
+
+    def test_stored_phones_are_normalized(self):
+        user = User.objects.create_user('sally', 'sally@asdf.com', '12345678', phone='(986) 047-0000')
+        self.assertEqual(user.phone, '9860470000')
+        User.objects.filter(pk=user.pk).update(phone='986 047 0000')
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key('986-047-0000')
+        call_command('normalize_user_identifiers', stdout=io.StringIO())
+        self.assertEqual(User.objects.get_by_natural_key('986-047-0000'), user)
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone('(986) 047-9861'), '9860479861')
+        self.assertEqual(normalize_phone('+977 9860479861'), '+9779860479861')
+        self.assertIsNone(normalize_phone('roger'))
+        self.assertIsNone(normalize_phone('------'))
+
+
+class TagResolutionAPITestCase(BaseAPITestCase):
+
+    def put_skills(self, skills):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.roger_client.put(
+                reverse('user-me'), {"skills": skills}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json().get('data')
+
+    def test_many_skills_are_resolved_in_bulk(self):
+        skills = [f'Skill {i}' for i in range(30)]
+        # profile (3), missing names: select, insert, select (3), profile
+        # update (1), m2m add (1), skills reload (1)
+        with self.assertNumQueries(9):
+            data = self.put_skills(skills)
+        self.assertEqual(sorted(data['skills']), sorted(skills))
+        self.assertEqual(Skill.objects.count(), 30)
+
+    def test_cached_names_are_not_queried_again(self):
+        skills = ['Python', 'Django']
+        self.put_skills(skills)
+        self.roger_profile.skills.clear()
+        # profile (3), profile update (1), m2m add (1), skills reload (1)
+        with self.assertNumQueries(6):
+            self.put_skills(skills)
+
+    def test_names_are_normalized(self):
+        Skill.objects.create(name='Public Speaking')
+        data = self.put_skills(['public  speaking', 'Python', 'PYTHON'])
+        self.assertEqual(data['skills'], ['Public Speaking', 'Python'])
+        self.assertEqual(Skill.objects.count(), 2)
+
+    def test_rolled_back_tags_are_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                SkillRelatedField(many=True).to_internal_value(['Python'])
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(SkillRelatedField.id_cache.get_many(['python']), {})
+
+    def test_deleted_tags_are_forgotten(self):
+        self.put_skills(['Python'])
+        Skill.objects.all().delete()
+        data = self.put_skills(['Python'])
+        self.assertEqual(data['skills'], ['Python'])
+
+    def test_tags_deleted_by_another_process_are_forgotten(self):
+        self.put_skills(['Python'])
+        # another process deletes the tag, this one keeps the stale id until
+        # it sees the version bumped by the delete
+        SkillRelatedField.id_cache.set_many({'python': 999999})
+        SkillRelatedField.id_cache.discard('django')
+        data = self.put_skills(['Python'])
+        self.assertEqual(data['skills'], ['Python'])
+
+    def test_backfill_names_and_merges_tags(self):
+        python = Skill.objects.create(name='Python')
+        Skill.objects.filter(pk=python.pk).update(normalized_name=None)
+        for name in ('python ', 'PYTHON'):
+            Skill.objects.filter(pk=Skill.objects.create(name='x').pk).update(
+                name=name, normalized_name=None)
+        duplicate = Skill.objects.get(name='PYTHON')
+        self.roger_profile.skills.add(python, duplicate)
+        self.sally_user.profile.skills.add(duplicate)
+
+        stdout = io.StringIO()
+        call_command('backfill_tag_names', stdout=stdout)
+        self.assertIn('Named 1 and merged 2 skills', stdout.getvalue())
+        self.assertEqual(list(Skill.objects.values_list('pk', 'normalized_name')),
+                         [(python.pk, 'python')])
+        self.assertEqual(list(self.roger_profile.skills.all()), [python])
+        self.assertEqual(list(self.sally_user.profile.skills.all()), [python])
+
+
+class SignupWritesAPITestCase(BaseAPITestCase):
+
+    def test_signup_writes_each_row_once(self):
+        payload = {
+            "username": "newuser",
+            "password": "somepassword1",
+            "firstName": "New",
+            "email": "newuser@asdf.com",
+            "location": "Kathmandu, Nepal",
+            "interests": ["Football", "Reading"],
+            "skills": ["Public Speaking"],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('user-list'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([sql for sql in statements if sql.startswith('UPDATE')])
+        tables = sorted(sql.split(' INTO ', 1)[1].split()[0].strip('"')
+                        for sql in statements if sql.startswith('INSERT'))
+        self.assertEqual(tables, sorted([
+            'accounts_user', 'accounts_userprofile', 'accounts_skill', 'accounts_interest',
+            'accounts_userprofile_skills', 'accounts_userprofile_interests',
+            'accounts_verificationcode',
+        ]))
+
+        user = User.objects.get(username='newuser')
+        self.assertTrue(user.check_password('somepassword1'))
+        self.assertEqual(user.profile.location, 'Kathmandu, Nepal')
+        self.assertEqual(user.profile.first_name, 'New')
+
+    def test_failed_signup_writes_nothing(self):
+        payload = {
+            "username": "newuser",
+            "password": "somepassword1",
+            "email": self.roger_user.email,
+            "skills": ["Public Speaking"],
+        }
+        response = self.client.post(reverse('user-list'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='newuser').exists())
+        self.assertFalse(Skill.objects.exists())
+
+
+IMPORT_CSV = """username,email,password,firstName,location,skills,interests
+alice,alice@example.com,alicepassword,Alice,Kathmandu,Tennis;public  speaking,Reading
+bob,bob@example.com,,Bob,,Tennis,
+sally2,SALLY@asdf.com,somepassword,,,,
+carol,not-an-email,somepassword,,,,
+alice,alice2@example.com,somepassword,,,,
+"""
+
+
+class UserImportTestCase(BaseAPITestCase):
+
+    def import_csv(self, text, **kwargs):
+        kwargs.setdefault('workers', 0)
+        importer = UserImporter(**kwargs)
+        return importer.run(read_rows(io.StringIO(text), 'csv'))
+
+    def test_import_creates_users_profiles_and_tags(self):
+        Skill.objects.create(name='Public Speaking')
+        report = self.import_csv(IMPORT_CSV)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.failed, 3)
+        self.assertEqual([error['line'] for error in report.errors], [4, 5, 6])
+        self.assertIn('email', report.errors[0]['errors'])
+        self.assertIn('email', report.errors[1]['errors'])
+        self.assertIn('username', report.errors[2]['errors'])
+
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('alicepassword'))
+        self.assertEqual(alice.profile.pk, alice.pk)
+        self.assertEqual(alice.profile.first_name, 'Alice')
+        self.assertEqual(alice.profile.email, 'alice@example.com')
+        self.assertEqual(alice.profile.location, 'Kathmandu')
+        self.assertEqual(sorted(alice.profile.skills.values_list('name', flat=True)),
+                         ['Public Speaking', 'Tennis'])
+        self.assertEqual(list(alice.profile.interests.values_list('name', flat=True)),
+                         ['Reading'])
+        self.assertEqual(Skill.objects.count(), 2)
+
+        bob = User.objects.get(username='bob')
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(list(bob.profile.skills.values_list('name', flat=True)), ['Tennis'])
+
+    def test_import_writes_each_table_once_per_batch(self):
+        rows = ''.join(f'user{i},user{i}@example.com,password{i},,,Tennis,Reading\n'
+                       for i in range(20))
+        with CaptureQueriesContext(connection) as queries:
+            report = self.import_csv(
+                'username,email,password,firstName,location,skills,interests\n' + rows,
+                batch_size=10)
+        self.assertEqual(report.created, 20)
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        # users, profiles, skills, skill links, interests, interest links
+        self.assertEqual(len(inserts), 2 * 6 - 2)
+        self.assertEqual(UserProfile.objects.filter(skills__name='Tennis').count(), 20)
+
+    def test_import_normalizes_phones(self):
+        User.objects.create_user('dave', 'dave@example.com', '12345678', phone='9860470000')
+        report = self.import_csv(
+            'username,email,phone\n'
+            'erin,erin@example.com,(986) 047-1111\n'
+            'frank,frank@example.com,986 047 0000\n'
+            'grace,grace@example.com,986-047-1111\n')
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error['line'] for error in report.errors], [3, 4])
+        self.assertEqual(report.errors[0]['errors'], {'phone': ['Phone already exists']})
+        erin = User.objects.get(username='erin')
+        self.assertEqual(erin.phone, '9860471111')
+        self.assertEqual(erin.profile.phone, '9860471111')
+
+    def test_import_jsonl_reports_malformed_lines(self):
+        text = '\n'.join([
+            json.dumps({'username': 'dave', 'email': 'dave@example.com',
+                        'lastName': 'Grohl', 'skills': ['Drums']}),
+            '{"username": ',
+            '',
+            '["not", "an", "object"]',
+        ])
+        report = UserImporter(workers=0).run(read_rows(io.StringIO(text), 'jsonl'))
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error['line'] for error in report.errors], [2, 4])
+        self.assertEqual(User.objects.get(username='dave').profile.last_name, 'Grohl')
+
+    def test_import_hashes_passwords_in_worker_processes(self):
+        report = self.import_csv(IMPORT_CSV, workers=2)
+        self.assertEqual(report.created, 2)
+        self.assertTrue(User.objects.get(username='alice').check_password('alicepassword'))
+
+    def test_import_command(self):
+        path = self.tmp_file('users.csv', IMPORT_CSV)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_users', path, '--workers', '0', stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 2 users, 3 rows failed', stdout.getvalue())
+        self.assertIn('line 4: email: Email already exists', stderr.getvalue())
+
+    def tmp_file(self, name, text):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = f'{directory.name}/{name}'
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    @override_settings(USER_IMPORT_HASHING_WORKERS=0)
+    def test_import_endpoint_is_admin_only(self):
+        upload = SimpleUploadedFile('users.csv', IMPORT_CSV.encode('utf-8'), 'text/csv')
+        response = self.roger_client.post(
+            reverse('user-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.filter(username='alice').exists())
+
+    @override_settings(USER_IMPORT_HASHING_WORKERS=0)
+    def test_import_endpoint(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        upload = SimpleUploadedFile('users.csv', IMPORT_CSV.encode('utf-8'), 'text/csv')
+        with override_settings(MEDIA_ROOT=media_root.name), \
+                mock.patch.object(run_user_import, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.admin_client.post(
+                    reverse('user-import'), {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 202)
+            import_id = response.data['data']['id']
+            self.assertEqual(response.data['data']['status'], 'pending')
+            apply_async.assert_called_once_with(args=(import_id,), retry=False)
+            # nothing is imported in the request
+            self.assertFalse(User.objects.filter(username='alice').exists())
+
+            self.assertEqual(run_user_import(import_id), 2)
+            # a job is run once
+            self.assertEqual(run_user_import(import_id), 0)
+            self.assertEqual(os.listdir(f'{media_root.name}/imports'), [])
+
+        response = self.admin_client.get(reverse('user-import-detail', args=[import_id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(data['report']['created'], 2)
+        self.assertEqual(data['report']['failed'], 3)
+        self.assertEqual(len(data['report']['errors']), 3)
+        self.assertTrue(User.objects.filter(username='bob').exists())
+
+    def test_failed_import_is_reported(self):
+        user_import = UserImport.objects.create(file='imports/missing.csv', format='csv')
+        with override_settings(MEDIA_ROOT=tempfile.gettempdir()), \
+                self.assertLogs('accounts.tasks', 'ERROR'):
+            self.assertEqual(run_user_import(user_import.pk), 0)
+        user_import.refresh_from_db()
+        self.assertEqual(user_import.status, 'failed')
+        self.assertTrue(user_import.last_error)
+        self.assertIsNotNone(user_import.finished_at)
+
+    def test_import_status_is_admin_only(self):
+        user_import = UserImport.objects.create(file='imports/users.csv', format='csv')
+        url = reverse('user-import-detail', args=[user_import.pk])
+        self.assertEqual(self.roger_client.get(url).status_code, 403)
+        self.assertEqual(self.admin_client.get(url).status_code, 200)
+        response = self.admin_client.get(reverse('user-import-detail', args=[user_import.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=1)
+class PasswordHashingTestCase(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(hashing.shutdown_executor)
+
+    def test_set_and_check_password_in_pool(self):
+        self.roger_user.set_password('new password')
+        self.assertIsNotNone(hashing.get_executor())
+        self.assertTrue(self.roger_user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.roger_user.check_password('new password'))
+        self.assertFalse(self.roger_user.check_password('wrong password'))
+
+    def test_check_password_upgrades_outdated_hash(self):
+        self.roger_user.password = make_password('old hasher', hasher='pbkdf2_sha1')
+        self.roger_user.save()
+        self.assertTrue(self.roger_user.check_password('old hasher'))
+        self.roger_user.refresh_from_db()
+        self.assertTrue(self.roger_user.password.startswith('pbkdf2_sha256$'))
+
+    def test_async_variants(self):
+        async_to_sync(self.roger_user.aset_password)('async password')
+        self.assertTrue(async_to_sync(self.roger_user.acheck_password)('async password'))
+        self.assertFalse(async_to_sync(self.roger_user.acheck_password)('wrong password'))
+
+    def test_login_and_signup(self):
+        response = self.client.post(
+            reverse('jwt-create'), {'username': 'roger', 'password': '2424df22'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('user-list'), {
+            'username': 'pooled', 'email': 'pooled@asdf.com', 'password': 'pooledpassword',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(username='pooled').check_password('pooledpassword'))
+
+
+class AsyncReadViewsTestCase(BaseTestCaseMixin, TransactionTestCase):
+    """
+    The async views query from worker threads of their own, which only see
+    committed rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        self.roger_profile.skills.add(Skill.objects.create(name='Python'))
+        self.token = f'Bearer {AccessToken.for_user(self.roger_user)}'
+
+    def call(self, view, method='get', data=None, **kwargs):
+        headers = {'authorization': self.token} if self.token else {}
+        request = getattr(self.factory, method)(
+            '/', data, content_type='application/json', **headers)
+        response = async_to_sync(view)(request, **kwargs)
+        return response.status_code, json.loads(response.content)
+
+    def test_me(self):
+        status_code, body = self.call(async_views.me)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body['detail'], 'User data fetched successfully')
+        self.assertEqual(body['data']['email'], self.roger_user.email)
+        self.assertEqual(body['data']['skills'], ['Python'])
+
+    def test_me_requires_a_token(self):
+        self.token = ''
+        status_code, body = self.call(async_views.me)
+        self.assertEqual(status_code, 401)
+        self.assertEqual(body['status'], 'Error')
+        self.assertEqual(body['statusCode'], 401)
+
+    def test_me_update_uses_viewset(self):
+        status_code, body = self.call(async_views.me, 'put', {'firstName': 'Rog'})
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body['detail'], 'User profile updated successfully')
+        self.assertEqual(UserProfile.objects.get(pk=self.roger_profile.pk).first_name, 'Rog')
+
+    def test_profile_and_retrieve(self):
+        status_code, body = self.call(async_views.profile, pk=str(self.roger_user.pk))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body['data']['email'], self.roger_user.email)
+        self.token = ''
+        status_code, body = self.call(async_views.retrieve, pk=str(self.roger_user.pk))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body['detail'], 'Successfully fetched user profile')
+
+    @override_settings(ASGI_READ_VIEWS=True)
+    def test_async_routes_leave_list_actions_to_the_viewset(self):
+        # the routes are chosen when the module is imported
+        urlconf = importlib.reload(urls)
+        self.addCleanup(importlib.reload, urls)
+        self.assertEqual(resolve(f'/users/{self.roger_user.pk}/', urlconf).func, async_views.retrieve)
+        self.assertEqual(resolve(f'/users/{self.roger_user.pk}/profile/', urlconf).func,
+                         async_views.profile)
+        for name in ('export', 'import', 'verify-email', 'reset-password', 'change-password'):
+            match = resolve(reverse(f'user-{name}', urlconf), urlconf)
+            self.assertIs(match.func.cls, UserViewSet, name)
+
+    def test_lookup_is_shared_with_the_viewset(self):
+        # malformed pks are missing profiles, as in UserViewSet.get_profile
+        status_code, body = self.call(async_views.retrieve, pk='not-a-pk')
+        self.assertEqual(status_code, 404)
+        with mock.patch.object(UserViewSet, 'check_object_permissions') as check:
+            status_code, _ = self.call(async_views.profile, pk=self.roger_user.pk)
+        self.assertEqual(status_code, 200)
+        request, user = check.call_args.args
+        self.assertEqual(user, self.roger_user)
+        self.assertEqual(request.user, self.roger_user)
+
+    def test_retrieve_missing_profile(self):
+        status_code, body = self.call(async_views.retrieve, pk='0')
+        self.assertEqual(status_code, 404)
+        self.assertEqual(body['detail'], 'User Profile does not exist for this user')
@@ -1,7 +1,9 @@
-from django.urls import re_path, include
+from django.conf import settings
+from django.urls import path, re_path, include
 
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import UserViewSet
 
 accounts_router = DefaultRouter()
@@ -9,4 +11,13 @@ accounts_router.register(r'users', UserViewSet)
 
 urlpatterns = [
     re_path(r"", include(accounts_router.urls)),
-]
\ No newline at end of file
+]
+
+if settings.ASGI_READ_VIEWS:
+    # ahead of the router, which still serves every other route, primary
+    # keys are numbers so that users/export/ and the like reach the router
+    urlpatterns[:0] = [
+        path('users/me/', async_views.me, name='user-me'),
+        path('users/<int:pk>/profile/', async_views.profile, name='user-profile'),
+        path('users/<int:pk>/', async_views.retrieve, name='user-detail'),
+    ]
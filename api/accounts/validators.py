@@ -12,7 +12,7 @@ class RegisterValidateMixin:
 
         # check email uniqueness
         if email:
-            if User.objects.filter(email=email).exists():
+            if User.objects.filter(email__iexact=email).exists():
                 raise exceptions.ParseError(detail=_('Email already exists'))
 
         # check phone uniqueness
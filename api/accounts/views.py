@@ -1,47 +1,85 @@
-from datetime import timedelta
+import logging
+import os
 
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password, get_password_validators
 
 from rest_framework import viewsets
 from rest_framework import exceptions
 from rest_framework.decorators import action, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 
+from core.pagination import EstimatedCountPagination
+from core.planning import QuerysetPlanningMixin, plan_queryset
+from core.streaming import StreamingListMixin
 from core.utils import success_response
 
-from .models import User, UserProfile, VerificationCode, clear_expired, get_password_reset_code_expiry_time, get_password_reset_lookup_field
-from .serializers import ChangePasswordSerializer, CustomUserSerializer, EmailCodeSerializer, EmailSerializer, PasswordCodeSerializer, UserProfileSerializer
+from .importers import FORMATS, get_import_storage, guess_format
+from .models import User, UserImport, UserProfile, VerificationCode, get_password_reset_lookup_field
+from .serializers import ChangePasswordSerializer, CustomUserSerializer, EmailCodeSerializer, EmailSerializer, PasswordCodeSerializer, UserImportStatusSerializer, UserProfileSerializer
 from .signals import reset_password_code_created, pre_password_reset, post_password_reset, user_signed_up
+from .tasks import run_user_import
 
 
-class UserViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+
+def fetch_profile(view, detail='User profile does not exist', **lookup):
+    """
+    Returns the profile matching `lookup` for `view`, a UserViewSet, with
+    everything UserProfileSerializer reads. Shared by the viewset and
+    accounts.async_views so that both answer a request the same way.
+    """
+    queryset = plan_queryset(UserProfile.objects.all(), UserProfileSerializer)
+    try:
+        profile = queryset.get(**lookup)
+    # a malformed pk is as missing as an unknown one, like get_object_or_404
+    except (UserProfile.DoesNotExist, ValueError, TypeError, ValidationError):
+        raise exceptions.NotFound(detail=detail)
+    # permissions check the user, the object get_object() would return
+    view.check_object_permissions(view.request, profile.user)
+    return profile
+
+
+class UserViewSet(StreamingListMixin, QuerysetPlanningMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    pagination_class = EstimatedCountPagination
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+    def get_profile(self, detail='User profile does not exist', **lookup):
+        return fetch_profile(self, detail, **lookup)
+
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
+        # Signup is one transaction that writes every row once: the user (with
+        # its hashed password), its profile, the tag links and the code.
         data = request.data
-        # create user
         user_serializer = self.serializer_class(
             data=data, context=self.get_serializer_context())
         user_serializer.is_valid(raise_exception=True)
-        user = user_serializer.save()
-        # update user profile
+        # validate profile fields before anything is written
         serializer = UserProfileSerializer(
-            user.profile, data=request.data, context={'user': user})
+            data=data, context=self.get_serializer_context())
         serializer.is_valid(raise_exception=True)
-        if serializer.is_valid():
-            serializer.save()
-        else:
-            raise exceptions.ParseError(detail=serializer.errors)
+        profile_defaults = dict(serializer.validated_data)
+        skills = profile_defaults.pop('skills', [])
+        interests = profile_defaults.pop('interests', [])
+
+        # create user, the profile is inserted by the post_save receiver
+        user = user_serializer.save(profile_defaults=profile_defaults)
+        profile = user.profile
+        if skills:
+            profile.skills.add(*skills)
+        if interests:
+            profile.interests.add(*interests)
 
         # no code exists, generate a new code
         code = VerificationCode.objects.create(
@@ -49,50 +87,85 @@ class UserViewSet(viewsets.ModelViewSet):
             code_type="email_verification"
         )
         # send a signal that the verification code was created
-        # let whoever receives this signal handle sending the email for the password reset
+        # let whoever receives this signal queue the verification email, it is
+        # only handed to celery once this transaction commits
         if settings.SEND_EMAIL_ON_SIGNUP:
             user_signed_up.send(
                 sender=self.__class__, instance=self, verification_code=code)
 
+        serializer = UserProfileSerializer(profile)
         return success_response(detail="User Profile created and verification email has been sent successfully.", code=201, **serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        if not instance.profile:
-            raise exceptions.ParseError(detail="User Profile does not exist.")
-        profile = instance.profile
-        try:
-            serializer = UserProfileSerializer(
-                profile, context={'request': self.request})
-            return success_response(detail='Successfully fetched user profile', **serializer.data)
-        except UserProfile.DoesNotExist:
-            raise exceptions.NotFound(
-                detail='User Profile does not exist for this user')
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        profile = self.get_profile(
+            detail='User Profile does not exist for this user',
+            **{f'user__{self.lookup_field}': kwargs[lookup_url_kwarg]})
+        serializer = UserProfileSerializer(
+            profile, context={'request': self.request})
+        return success_response(detail='Successfully fetched user profile', **serializer.data)
 
     @action(detail=False, permission_classes=[IsAuthenticated], methods=['get', 'put'])
     def me(self, request):
+        profile = self.get_profile(user=request.user)
         if request.method == 'GET':
-            try:
-                serializer = UserProfileSerializer(request.user.profile)
-                return success_response(detail="User data fetched successfully", **serializer.data)
-            except UserProfile.DoesNotExist:
-                raise exceptions.NotFound(detail="User profile does not exist")
+            serializer = UserProfileSerializer(profile)
+            return success_response(detail="User data fetched successfully", **serializer.data)
         elif request.method == 'PUT':
-            try:
-                serializer = UserProfileSerializer(
-                    request.user.profile, data=request.data, context={'user': request.user})
-                serializer.is_valid(raise_exception=True)
-                serializer.save()
-                return success_response(detail="User profile updated successfully", **serializer.data)
-            except UserProfile.DoesNotExist:
-                raise exceptions.NotFound(detail="User profile does not exist")
+            serializer = UserProfileSerializer(
+                profile, data=request.data, context={'user': request.user})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return success_response(detail="User profile updated successfully", **serializer.data)
 
     @action(detail=True, permission_classes=[IsAuthenticated], methods=['get'])
     def profile(self, request, pk=None):
-        instance = self.get_object()
-        serializer = UserProfileSerializer(instance.profile)
+        profile = self.get_profile(**{f'user__{self.lookup_field}': pk})
+        serializer = UserProfileSerializer(profile)
         return success_response(detail="Profile data fetched successfully", **serializer.data)
 
+    @action(detail=False, permission_classes=[IsAdminUser], methods=['get'])
+    def export(self, request):
+        queryset = plan_queryset(UserProfile.objects.all(), UserProfileSerializer)
+        return self.stream_response(
+            queryset, UserProfileSerializer, detail="Exported all user profiles")
+
+    @action(detail=False, permission_classes=[IsAdminUser], methods=['post'],
+            url_path='import', url_name='import')
+    def import_users(self, request):
+        # the upload is imported by a celery worker, in batches, rows that
+        # fail are listed in the import's report and do not stop it
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise exceptions.ParseError(detail="File not provided")
+        format = request.data.get('format') or guess_format(upload.name, upload.content_type)
+        if format not in FORMATS:
+            raise exceptions.ParseError(detail="Upload a .csv or .jsonl file")
+
+        storage = get_import_storage()
+        name = storage.save(f'imports/{storage.get_valid_name(os.path.basename(upload.name))}', upload)
+        user_import = UserImport.objects.create(file=name, format=format, created_by=request.user)
+
+        def enqueue():
+            try:
+                run_user_import.apply_async(args=(user_import.pk,), retry=False)
+            except Exception:
+                logger.exception('Could not enqueue user import %s', user_import.pk)
+        transaction.on_commit(enqueue)
+
+        serializer = UserImportStatusSerializer(user_import)
+        return success_response(detail="Users are being imported", code=202, **serializer.data)
+
+    @action(detail=False, permission_classes=[IsAdminUser], methods=['get'],
+            url_path=r'import/(?P<import_id>[0-9]+)', url_name='import-detail')
+    def import_status(self, request, import_id=None):
+        try:
+            user_import = UserImport.objects.get(pk=import_id)
+        except UserImport.DoesNotExist:
+            raise exceptions.NotFound(detail='User import does not exist')
+        serializer = UserImportStatusSerializer(user_import)
+        return success_response(detail="User import fetched successfully", **serializer.data)
+
     @action(detail=False, permission_classes=[IsAuthenticated], methods=['post'])
     def change_password(self, request):
         data = request.data
@@ -104,16 +177,16 @@ class UserViewSet(viewsets.ModelViewSet):
         return success_response(detail='Password changed successfully')
 
     @action(detail=False, permission_classes=[AllowAny], methods=['post', 'get'])
+    @transaction.atomic
     def verify_email(self, request):
         if request.method == 'GET':
             if isinstance(request.user, User):
                 if request.user.is_email_verified:
                     return success_response(detail="User is already verified")
                 else:
-                    # no code exists, generate a new code
-                    code = VerificationCode.objects.create(
-                        user=request.user, code_type='email_verification'
-                    )
+                    # re-use a live code or generate a new one
+                    code = VerificationCode.objects.get_live_or_create(
+                        user=request.user, code_type='email_verification')
                     # send a signal that the password code was created
                     # let whoever receives this signal handle sending the email for the password reset
                     user_signed_up.send(
@@ -132,10 +205,9 @@ class UserViewSet(viewsets.ModelViewSet):
                 if user.is_email_verified:
                     return success_response(detail="User is already verified")
 
-                 # no code exists, generate a new code
-                code = VerificationCode.objects.create(
-                    user=user, code_type='email_verification'
-                )
+                # re-use a live code or generate a new one
+                code = VerificationCode.objects.get_live_or_create(
+                    user=user, code_type='email_verification')
                 # send a signal that the password code was created
                 # let whoever receives this signal handle sending the email for the password reset
                 user_signed_up.send(
@@ -161,21 +233,12 @@ class UserViewSet(viewsets.ModelViewSet):
             return success_response(detail='Your email has been verified successfully.')
 
     @action(detail=False, permission_classes=[AllowAny], methods=['post'])
+    @transaction.atomic
     def reset_password(self, request):
         serializer = EmailSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         email = serializer.validated_data.get('email')
 
-        # before we continue, delete all existing expired codes
-        password_reset_code_validation_time = get_password_reset_code_expiry_time()
-
-        # datetime.now minus expiry hours
-        now_minus_expiry_time = timezone.now(
-        ) - timedelta(hours=password_reset_code_validation_time)
-
-        # delete all codes where created_at < now - 24 hours
-        clear_expired(now_minus_expiry_time)
-
         # find a user by email address (case insensitive search)
         users = User.objects.filter(
             **{'{}__iexact'.format(get_password_reset_lookup_field()): email})
@@ -201,19 +264,10 @@ class UserViewSet(viewsets.ModelViewSet):
         # and create a Reset Password Code and send a signal with the created code
         for user in users:
             if user.eligible_for_reset():
-                # define the code as none for now
-                code = None
-
-                # check if the user already has a code
-                if user.verification_codes.get_queryset().password_reset_codes().count() > 0:
-                    # yes, already has a code, re-use this code
-                    code = user.verification_codes.get_queryset().password_reset_codes()[
-                        0]
-                else:
-                    # no code exists, generate a new code
-                    code = VerificationCode.objects.create(
-                        user=user
-                    )
+                # re-use a live code or generate a new one, expired codes are
+                # removed by the accounts.tasks.sweep_expired_verification_codes task
+                code = VerificationCode.objects.get_live_or_create(
+                    user=user, code_type='password_reset')
                 # send a signal that the password code was created
                 # let whoever receives this signal handle sending the email for the password reset
                 reset_password_code_created.send(
@@ -9,3 +9,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', env('DJANGO_SETTINGS_MODULE', de
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ProtocolTypeRouter  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+})
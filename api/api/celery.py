@@ -2,8 +2,13 @@ import os
 
 import celery
 
+from api.settings.base import env
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api.settings.local")
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", env("DJANGO_SETTINGS_MODULE", default="api.settings.local"))
+# prefork pool processes are daemons and cannot start the password hashing
+# pool (accounts.hashing), passwords are hashed in the task's process
+os.environ.setdefault("PASSWORD_HASHING_WORKERS", "0")
 
 
 app = celery.Celery(__name__)
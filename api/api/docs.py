@@ -1,14 +1,177 @@
+"""
+API documentation.
+
+The OpenAPI schema is generated by `manage.py build_schema` into
+API_SCHEMA_DIR when the app is deployed and served from there with an ETag
+and cache headers. Only with DEBUG on is it regenerated on every request,
+so changes to serializers and views show up right away.
+"""
+import hashlib
+import logging
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+
 from rest_framework import permissions
 
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
+logger = logging.getLogger(__name__)
+
+API_VERSION = 'v1'
+
+# drf_yasg's YAML codec needs a ruamel.yaml older than the one installed,
+# only JSON is built and served
+FORMATS = {
+    'json': 'application/json',
+}
+
+
+def get_api_schema_dir():
+    """
+    Returns the directory `build_schema` writes the schema files to (default: api/schema)
+    Set Django SETTINGS.API_SCHEMA_DIR to overwrite this
+    """
+    return getattr(settings, 'API_SCHEMA_DIR', os.path.join(settings.BASE_DIR, 'schema'))
+
+
+def get_api_schema_max_age():
+    """
+    Returns for how many seconds clients may cache the schema (default: 86400)
+    Set Django SETTINGS.API_SCHEMA_MAX_AGE to overwrite this time
+    """
+    return getattr(settings, 'API_SCHEMA_MAX_AGE', 86400)
+
+
+def get_api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+       title="API",
+       default_version=API_VERSION
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_view():
+    """
+    Returns the drf_yasg schema view class, importing drf_yasg the first
+    time it is needed instead of when the URLconf loads.
+    """
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+       get_api_info(),
+       public=True,
+       permission_classes=(permissions.AllowAny,),
+    )
+
+
+def schema_ui_view(renderer, **kwargs):
+    """
+    `schema_view.with_ui(renderer, **kwargs)`, built on its first request.
+    """
+    @lru_cache(maxsize=None)
+    def get_view():
+        return get_schema_view().with_ui(renderer, **kwargs)
+
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return get_view()(request, *args, **kwargs)
+    return view
+
+
+def generate_schema(format):
+    """
+    Returns the schema of every public endpoint encoded as `format`.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    if format not in FORMATS:
+        raise ValueError(f'Unknown schema format {format!r}, expected one of {list(FORMATS)}')
+    schema = OpenAPISchemaGenerator(get_api_info(), API_VERSION).get_schema(None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def schema_path(format):
+    return os.path.join(get_api_schema_dir(), f'openapi-{API_VERSION}.{format}')
+
+
+def write_schema(format):
+    """
+    Generate the schema file of `format`, returns its path and ETag.
+    """
+    content = generate_schema(format)
+    path = schema_path(format)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # replace the file in one step, running processes never read half of it
+    with open(f'{path}.tmp', 'wb') as schema_file:
+        schema_file.write(content)
+    os.replace(f'{path}.tmp', path)
+    return path, make_etag(content)
+
+
+def make_etag(content):
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+@lru_cache(maxsize=None)
+def load_schema(format):
+    """
+    Returns the content and ETag of the built schema, read once per process.
+    """
+    try:
+        with open(schema_path(format), 'rb') as schema_file:
+            content = schema_file.read()
+    except FileNotFoundError:
+        logger.warning('%s is missing, generating the schema in this process, '
+                       'run `manage.py build_schema` when deploying', schema_path(format))
+        content = generate_schema(format)
+    return content, make_etag(content)
+
+
+def schema_file_view(format):
+    """
+    Serves the built schema with an ETag (If-None-Match gets a 304) and
+    cache headers.
+    """
+    @condition(etag_func=lambda request, *args, **kwargs: load_schema(format)[1])
+    def view(request, *args, **kwargs):
+        response = HttpResponse(load_schema(format)[0], content_type=FORMATS[format])
+        patch_cache_control(response, public=True, max_age=get_api_schema_max_age())
+        return response
+    return view
+
+
+def docs_view(**kwargs):
+    """
+    The ReDoc page, which fetches its schema from `?format=openapi`.
+    """
+    ui_view = schema_ui_view('redoc', **kwargs)
+    json_view = schema_file_view('json')
+
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        if request.GET.get('format') == 'openapi' and not settings.DEBUG:
+            return json_view(request, *args, **kwargs)
+        return ui_view(request, *args, **kwargs)
+    return view
+
+
+def schema_view(format):
+    """
+    The schema as a file, generated per request when DEBUG is on.
+    """
+    file_view = schema_file_view(format)
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="API",
-      default_version='v1'
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        if settings.DEBUG:
+            return HttpResponse(generate_schema(format), content_type=FORMATS[format])
+        return file_view(request, *args, **kwargs)
+    return view
@@ -0,0 +1,75 @@
+"""
+Gunicorn settings, `gunicorn -c api/gunicorn_conf.py api.wsgi:application`.
+
+The application is imported and warmed up once in the master, then the
+heap is frozen so the forked workers share its pages instead of each
+importing Django, DRF, drf_yasg, boto3 and every app on its own. Workers
+are replaced after a number of requests or once they outgrow a memory
+budget. Every value can be overridden with the GUNICORN_* variables below.
+"""
+import gc
+import os
+
+from envparse import env
+
+
+def cpu_count():
+    # the CPUs this container may run on, not the host's
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def rss_megabytes():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # peak rather than current RSS, in kilobytes on Linux and bytes on macOS
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** (20 if sys.platform == 'darwin' else 10)
+
+
+bind = env('GUNICORN_BIND', default=':8000')
+workers = env('GUNICORN_WORKERS', default=2 * cpu_count() + 1, cast=int)
+# more than one thread runs the gthread worker
+threads = env('GUNICORN_THREADS', default=1, cast=int)
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+preload_app = True
+
+# recycle workers, the jitter keeps them from restarting all at once
+max_requests = env('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+# a worker above this RSS exits after its current request, 0 disables it
+max_worker_memory = env('GUNICORN_MAX_WORKER_MEMORY_MB', default=512, cast=int)
+
+capture_output = True
+loglevel = env('GUNICORN_LOG_LEVEL', default='info')
+
+# split the cores between the password hashing pools of all workers
+# (accounts.hashing) instead of one pool per core in every worker. A sync
+# worker waits for its one request either way, it hashes inline rather
+# than pay for a pool process and the round trip to it.
+os.environ.setdefault('PASSWORD_HASHING_WORKERS', str(max(1, cpu_count() // workers)) if threads > 1 else '0')
+
+
+def when_ready(server):
+    # the preloaded application is imported, load what its first requests
+    # would and keep it out of the collector so refcount updates of a full
+    # collection never copy the shared pages into a worker
+    from core.warmup import warm_up
+
+    warm_up()
+    gc.collect()
+    gc.freeze()
+    server.log.info('Warmed up and froze %s objects before forking', gc.get_freeze_count())
+
+
+def post_request(worker, req, environ, resp):
+    if max_worker_memory and rss_megabytes() > max_worker_memory:
+        worker.log.info('Worker %s uses %.0f MB, over the %s MB budget, restarting',
+                        worker.pid, rss_megabytes(), max_worker_memory)
+        worker.alive = False
@@ -107,6 +107,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'api.wsgi.application'
 ASGI_APPLICATION = "api.asgi.application"
 
+# Serve the user and upload read endpoints and logins with the async views in
+# accounts.async_views, core.views and authentication.async_views, for
+# deployments behind an ASGI server.
+ASGI_READ_VIEWS = env('ASGI_READ_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -119,6 +124,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# A cache shared by every process, e.g. redis://redis:6379/1. Without it every
+# process has a local memory cache of its own and the JWT blacklist
+# (authentication.blacklist) asks the database instead.
+CACHE_URL = env('CACHE_URL', default='')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -143,29 +165,42 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 SEND_EMAIL_ON_SIGNUP = True
 
+# Emails are written to core.models.OutboxEmail and delivered by celery.
+EMAIL_OUTBOX_BATCH_SIZE = env('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+
+EMAIL_OUTBOX_MAX_ATTEMPTS = env('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+
+# Bulk user imports (accounts.importers) commit this many rows at a time.
+USER_IMPORT_BATCH_SIZE = env('USER_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
 
 # Custom application settings, everything above here are django settings.
 
 TEST_MODE = sys.argv[1:2] == ['test']
 
+# Passwords are hashed and checked in a pool of this many processes
+# (accounts.hashing), 0 hashes in the request thread.
+PASSWORD_HASHING_WORKERS = env(
+    'PASSWORD_HASHING_WORKERS', default=0 if TEST_MODE else os.cpu_count() or 1, cast=int)
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'core.pagination.DefaultResultsSetPagination',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
     'DEFAULT_RENDERER_CLASSES': (
-        'djangorestframework_camel_case.render.CamelCaseJSONRenderer',
-        'djangorestframework_camel_case.render.CamelCaseBrowsableAPIRenderer',
+        'core.renderers.CamelCaseJSONRenderer',
+        'core.renderers.CamelCaseBrowsableAPIRenderer',
     ),
     'DEFAULT_PARSER_CLASSES': (
-        'djangorestframework_camel_case.parser.CamelCaseFormParser',
-        'djangorestframework_camel_case.parser.CamelCaseMultiPartParser',
-        'djangorestframework_camel_case.parser.CamelCaseJSONParser',
+        'core.parsers.CamelCaseFormParser',
+        'core.parsers.CamelCaseMultiPartParser',
+        'core.parsers.CamelCaseJSONParser',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'EXCEPTION_HANDLER': 'core.exceptions.custom_exception_handler'
@@ -190,3 +225,33 @@ SIMPLE_JWT = {
     'ISSUER': None,
     'JTI_CLAIM': 'jti',
 }
+
+# Periodic tasks are stored by django_celery_beat, entries below are synced
+# into its tables when beat starts.
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+CELERY_BEAT_SCHEDULE = {
+    # picks up outbox emails whose on-commit enqueueing did not reach the broker
+    'deliver-outbox-emails': {
+        'task': 'core.tasks.deliver_outbox_emails',
+        'schedule': datetime.timedelta(minutes=1),
+    },
+    'sweep-expired-verification-codes': {
+        'task': 'accounts.tasks.sweep_expired_verification_codes',
+        'schedule': datetime.timedelta(minutes=15),
+    },
+    'prune-expired-tokens': {
+        'task': 'authentication.tasks.prune_expired_tokens',
+        'schedule': datetime.timedelta(hours=1),
+    },
+    'abort-abandoned-multipart-uploads': {
+        'task': 'core.tasks.abort_abandoned_multipart_uploads',
+        'schedule': datetime.timedelta(hours=1),
+    },
+}
+
+# Resizing images is CPU bound, it gets a worker of its own (the `images`
+# service) so that it never delays emails
+CELERY_TASK_ROUTES = {
+    'core.tasks.generate_image_derivatives': {'queue': 'images'},
+}
@@ -1,12 +1,97 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
 from storages.backends.s3boto3 import S3Boto3Storage
 
+
 class PublicMediaStorage(S3Boto3Storage):
     location = 'media'
     default_acl = 'public-read'
     file_overwrite = False
 
 
-class PrivateMediaStorage(S3Boto3Storage):
+class SignedURLCacheMixin:
+    """
+    Reuses signed URLs instead of signing a new one on every `url()` call.
+
+    Time is cut into buckets of AWS_SIGNED_URL_BUCKET_SECONDS counted from
+    the epoch, so every process agrees on them. A URL signed during a bucket
+    is handed out until the bucket ends and stays valid for
+    AWS_SIGNED_URL_MIN_VALIDITY seconds after that, the margin a client has
+    to use it. Within a bucket a file has one URL, kept in this process and
+    in the Django cache for the other processes, which browsers and CDNs can
+    cache.
+    """
+    signed_url_cache_prefix = 'signed-url'
+    # past this many files the URLs kept in the process are dropped
+    max_local_signed_urls = 10000
+
+    def get_signed_url_bucket_seconds(self):
+        """
+        Returns for how many seconds a file keeps the same URL (default: 900)
+        Set Django SETTINGS.AWS_SIGNED_URL_BUCKET_SECONDS to overwrite this
+        """
+        return getattr(settings, 'AWS_SIGNED_URL_BUCKET_SECONDS', 900)
+
+    def get_signed_url_min_validity(self):
+        """
+        Returns for how many seconds a handed out URL is valid at least
+        (default: AWS_QUERYSTRING_EXPIRE)
+        Set Django SETTINGS.AWS_SIGNED_URL_MIN_VALIDITY to overwrite this
+        """
+        return getattr(settings, 'AWS_SIGNED_URL_MIN_VALIDITY', self.querystring_expire)
+
+    def _local_signed_urls(self, bucket):
+        local = getattr(self, '_signed_urls', None)
+        if local is None or local[0] != bucket or len(local[1]) > self.max_local_signed_urls:
+            # one bucket at a time, URLs of past buckets are never handed out again
+            local = self._signed_urls = (bucket, {})
+        return local[1]
+
+    def _signed_url_cache_key(self, name, bucket):
+        digest = hashlib.sha1(f'{self.bucket_name}/{self.location}/{name}'.encode()).hexdigest()
+        return f'{self.signed_url_cache_prefix}:{bucket}:{digest}'
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or expire is not None or http_method or not self.querystring_auth:
+            return super().url(name, parameters, expire, http_method)
+        return self.urls([name])[name]
+
+    def urls(self, names):
+        """
+        Returns {name: signed URL} for every one of `names`, looking the ones
+        this process does not have up in the Django cache at once.
+        """
+        now = time.time()
+        bucket_seconds = self.get_signed_url_bucket_seconds()
+        bucket = int(now // bucket_seconds)
+        bucket_end = (bucket + 1) * bucket_seconds
+        local = self._local_signed_urls(bucket)
+
+        missing = {self._signed_url_cache_key(name, bucket): name
+                   for name in set(names) if name not in local}
+        if missing:
+            for key, url in cache.get_many(list(missing)).items():
+                local[missing.pop(key)] = url
+        if missing:
+            # rounded up, SigV2 URLs (Expires=now + expire) of a bucket then all
+            # expire at the same second and are identical even across processes
+            expire = math.ceil(bucket_end + self.get_signed_url_min_validity() - now)
+            timeout = int(bucket_end - now) + 1
+            for key, name in missing.items():
+                url = super().url(name, expire=expire)
+                # another process signing the same file first wins, all hand out its URL
+                if not cache.add(key, url, timeout):
+                    url = cache.get(key) or url
+                local[name] = url
+        return {name: local[name] for name in names}
+
+
+class PrivateMediaStorage(SignedURLCacheMixin, S3Boto3Storage):
     location = 'media'
     default_acl = 'private'
     file_overwrite = False
@@ -16,4 +101,4 @@ class PrivateMediaStorage(S3Boto3Storage):
 class StaticStorage(S3Boto3Storage):
     location = 'static'
     default_acl = 'public-read'
-    file_overwrite = False
\ No newline at end of file
+    file_overwrite = False
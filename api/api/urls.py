@@ -4,10 +4,10 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic.base import RedirectView
 
-from core.views import FileUploadView
+from core.views import ContentUploadView, FileUploadBatchView, FileUploadView, StreamUploadView, file_upload
 
 from .routers import router
-from .docs import schema_view
+from .docs import docs_view, schema_view
 
 
 # Prefix to be used on all v1 API urls
@@ -24,10 +24,16 @@ urlpatterns = ([
     path('', RedirectView.as_view(url='admin/')),
 
     # API urls
-    path(v1_url('upload/'), FileUploadView.as_view(), name='upload'),
-    path(v1_url('docs/'), schema_view.with_ui('redoc', cache_timeout=0),
-         name='api-docs'),
+    path(v1_url('upload/'),
+         file_upload if settings.ASGI_READ_VIEWS else FileUploadView.as_view(),
+         name='upload'),
+    path(v1_url('upload/batch/'), FileUploadBatchView.as_view(), name='upload-batch'),
+    path(v1_url('upload/content/'), ContentUploadView.as_view(), name='upload-content'),
+    path(v1_url('upload/stream/'), StreamUploadView.as_view(), name='upload-stream'),
+    path(v1_url('docs/'), docs_view(cache_timeout=0), name='api-docs'),
+    path(v1_url('docs/openapi.json'), schema_view('json'), name='api-schema-json'),
     path(f'{v1_prefix}auth/', include('authentication.urls')),
+    path(f'{v1_prefix}', include('core.urls')),
     path(f'{v1_prefix}', include('accounts.urls')),
     # path(v1_prefix, include(router.urls)),
 ]
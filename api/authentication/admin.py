@@ -6,6 +6,11 @@ from rest_framework_simplejwt.token_blacklist.admin import OutstandingTokenAdmin
 
 
 class CustomThirdPartyAdmin(OutstandingTokenAdmin):
+    # newest first through the primary key instead of sorting the whole
+    # table by user, and no second COUNT(*) for the unfiltered total
+    ordering = ('-id',)
+    show_full_result_count = False
+
     # Read-only behavior defined below
     actions = []
 
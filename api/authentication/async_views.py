@@ -0,0 +1,71 @@
+"""
+Async login, routed in place of TokenObtainPairView when ASGI_READ_VIEWS
+is set. The password is checked by awaiting the hashing pool
+(accounts.hashing), so a login never blocks the event loop or a thread
+of the executor for the 100-300 ms a hash costs.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+
+from rest_framework import exceptions
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts import hashing
+from core.async_views import async_api_view, async_success_response, run_sync
+
+from .serializers import TokenObtainPairSerializer
+
+
+def parse_credentials(request):
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as error:
+            raise exceptions.ParseError(detail=f'JSON parse error - {error}')
+    else:
+        data = request.POST
+    if not hasattr(data, 'get'):
+        raise exceptions.ParseError(detail='Expected a JSON object')
+    username_field = get_user_model().USERNAME_FIELD
+    errors = {field: ['This field is required.'] for field in (username_field, 'password')
+              if not data.get(field)}
+    if errors:
+        raise exceptions.ValidationError(errors)
+    return data[username_field], data['password']
+
+
+def get_active_user(username):
+    # the lookup of django.contrib.auth.backends.ModelBackend
+    User = get_user_model()
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        return None
+    return user if getattr(user, 'is_active', True) else None
+
+
+def issue_tokens(request, user):
+    refresh = TokenObtainPairSerializer(context={'request': request}).get_token(user)
+    if api_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+@async_api_view(methods=('POST',))
+async def token_obtain(request):
+    username, password = parse_credentials(request)
+    user = await run_sync(get_active_user)(username)
+    if user is None:
+        # hash anyway, unknown users take as long as wrong passwords
+        await hashing.amake_password(password)
+        is_correct = False
+    else:
+        is_correct = await user.acheck_password(password)
+    if not is_correct:
+        raise exceptions.AuthenticationFailed(
+            detail=TokenObtainPairSerializer.default_error_messages['no_active_account'],
+            code='no_active_account')
+    data = await run_sync(issue_tokens)(request, user)
+    return async_success_response(detail="Successfully created jwt tokens", **data)
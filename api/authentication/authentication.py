@@ -0,0 +1,133 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist_cache_is_shared
+
+
+__all__ = ['CachedJWTAuthentication', 'UserCache', 'invalidate_cached_user']
+
+
+def get_user_cache_timeout():
+    """
+    Returns for how many seconds an authenticated user is served from memory (default: 60)
+    Set Django SETTINGS.JWT_USER_CACHE_TIMEOUT to overwrite this time
+    """
+    return getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60)
+
+
+def get_user_cache_size():
+    """
+    Returns how many users every process keeps in memory (default: 1024)
+    Set Django SETTINGS.JWT_USER_CACHE_SIZE to overwrite this
+    """
+    return getattr(settings, 'JWT_USER_CACHE_SIZE', 1024)
+
+
+def _version_key(user_id):
+    return f'jwt-user-version:{user_id}'
+
+
+def get_user_version(user_id):
+    """
+    Returns the current version of `user_id`'s row, shared by every process
+    through the Django cache.
+    """
+    return cache.get_or_set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def invalidate_cached_user(user_id):
+    """
+    Makes every process load `user_id` from the database again.
+    """
+    cache.delete(_version_key(user_id))
+    CachedJWTAuthentication.user_cache.discard(user_id)
+
+
+class UserCache:
+    """
+    Bounded, thread safe LRU of user id -> (version, user) whose entries
+    expire after `timeout` seconds.
+    """
+
+    def __init__(self, maxsize=None, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            entry_version, expires_at, user = entry
+            if entry_version != version or expires_at <= time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, version, user):
+        timeout = get_user_cache_timeout() if self.timeout is None else self.timeout
+        maxsize = get_user_cache_size() if self.maxsize is None else self.maxsize
+        with self._lock:
+            self._users[user_id] = (version, time.monotonic() + timeout, user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > maxsize:
+                self._users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication serving the user of a token from a per-process cache
+    instead of a query per request. Entries are keyed by the user's
+    version, which the User post_save/post_delete receivers in
+    authentication.signals reset, so changes made by any process are seen
+    on the next request. That needs a Django cache every process shares,
+    with a process-local one the user is loaded on every request.
+    """
+    user_cache = UserCache()
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            # let JWTAuthentication raise its error
+            return super().get_user(validated_token)
+
+        if not blacklist_cache_is_shared():
+            # a version reset by another process would never reach this one
+            return super().get_user(validated_token)
+
+        version = get_user_version(user_id)
+        user = self.user_cache.get(user_id, version)
+        if user is None:
+            # inactive or missing users raise and are not cached
+            user = super().get_user(validated_token)
+            self.user_cache.set(user_id, version, user)
+        return self.copy_user(user)
+
+    @staticmethod
+    def copy_user(user):
+        # every request gets its own instance so related objects it loads
+        # or attributes it sets do not leak into the next one
+        user = copy.copy(user)
+        user._state.fields_cache = {}
+        user.__dict__.pop('_prefetched_objects_cache', None)
+        return user
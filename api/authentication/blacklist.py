@@ -0,0 +1,215 @@
+"""
+Token blacklist lookups that rarely reach the database.
+
+The simplejwt token_blacklist tables stay the durable source of truth.
+Every JTI that gets blacklisted is also
+
+- kept in the Django cache until its token expires, and
+- appended to a short revocation log in the cache, from which every
+  process adds it to an in-process Bloom filter.
+
+A JTI the Bloom filter has never seen is not blacklisted, which answers
+almost every check with one cache read (the log position). The few JTIs
+the filter may contain are looked up in the cache and, when the cache has
+lost them, in the database.
+
+This only holds while every process shares the cache. With a cache of
+its own (the local memory or dummy cache) a process never sees the
+revocations of the others, so every check asks the database.
+"""
+import hashlib
+import math
+import threading
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+__all__ = ['BloomFilter', 'is_blacklisted', 'remember_blacklisted']
+
+
+SEQUENCE_KEY = 'jwt-blacklist:seq'
+
+
+def get_blacklist_bloom_capacity():
+    """
+    Returns how many JTIs the Bloom filter is sized for (default: 100000)
+    Set Django SETTINGS.JWT_BLACKLIST_BLOOM_CAPACITY to overwrite this
+    """
+    return getattr(settings, 'JWT_BLACKLIST_BLOOM_CAPACITY', 100000)
+
+
+def get_blacklist_bloom_error_rate():
+    """
+    Returns the false positive rate of the Bloom filter at capacity (default: 0.001)
+    Set Django SETTINGS.JWT_BLACKLIST_BLOOM_ERROR_RATE to overwrite this
+    """
+    return getattr(settings, 'JWT_BLACKLIST_BLOOM_ERROR_RATE', 0.001)
+
+
+def get_blacklist_log_timeout():
+    """
+    Returns for how many seconds revocation log entries are kept (default: 86400)
+    Set Django SETTINGS.JWT_BLACKLIST_LOG_TIMEOUT to overwrite this time,
+    a process that falls further behind reloads the blacklist
+    """
+    return getattr(settings, 'JWT_BLACKLIST_LOG_TIMEOUT', 86400)
+
+
+def get_blacklist_negative_timeout():
+    """
+    Returns for how many seconds a JTI the database had not blacklisted is
+    cached as such (default: 60)
+    Set Django SETTINGS.JWT_BLACKLIST_NEGATIVE_TIMEOUT to overwrite this time
+    """
+    return getattr(settings, 'JWT_BLACKLIST_NEGATIVE_TIMEOUT', 60)
+
+
+def blacklist_cache_is_shared():
+    """
+    Returns whether every process shares the Django cache (default: False for
+    the local memory and dummy caches, True otherwise)
+    Set Django SETTINGS.JWT_BLACKLIST_SHARED_CACHE to overwrite this
+    """
+    shared = getattr(settings, 'JWT_BLACKLIST_SHARED_CACHE', None)
+    if shared is None:
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+    return shared
+
+
+def _jti_key(jti):
+    return f'jwt-blacklist:jti:{jti}'
+
+
+def _log_key(position):
+    return f'jwt-blacklist:log:{position}'
+
+
+class BloomFilter:
+    """
+    Set membership with false positives but no false negatives, in
+    `capacity * -log2(error_rate) * 1.44` bits.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # double hashing over two halves of one digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+class BlacklistFilter:
+    """
+    The Bloom filter of one process, kept in step with the revocation log.
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.position = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        position = cache.get(SEQUENCE_KEY)
+        if position is not None and position == self.position:
+            return self.bloom
+        with self._lock:
+            if position is None or self.position is None or position < self.position:
+                self.reload()
+            elif position > self.position:
+                entries = cache.get_many(
+                    [_log_key(n) for n in range(self.position + 1, position + 1)])
+                if (len(entries) != position - self.position
+                        or self.bloom.count + len(entries) > self.bloom.capacity):
+                    # entries expired or the filter is full
+                    self.reload()
+                else:
+                    for jti in entries.values():
+                        self.bloom.add(jti)
+                    self.position = position
+            return self.bloom
+
+    def reload(self):
+        # read the position first, revocations logged while the table is
+        # read are applied again by the next sync
+        cache.add(SEQUENCE_KEY, 0, None)
+        position = cache.get(SEQUENCE_KEY, 0)
+        jtis = BlacklistedToken.objects.filter(
+            token__expires_at__gt=timezone.now()).values_list('token__jti', flat=True)
+        jtis = list(jtis.iterator())
+        bloom = BloomFilter(max(get_blacklist_bloom_capacity(), 2 * len(jtis)),
+                            get_blacklist_bloom_error_rate())
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom, self.position = bloom, position
+
+    def add(self, jti):
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def clear(self):
+        with self._lock:
+            self.bloom = self.position = None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def is_blacklisted(jti):
+    """
+    Returns whether the token with `jti` is blacklisted.
+    """
+    if not blacklist_cache_is_shared():
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if jti not in blacklist_filter.sync():
+        return False
+    cached = cache.get(_jti_key(jti))
+    if cached is not None:
+        return cached
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    if blacklisted:
+        cache.set(_jti_key(jti), True, get_blacklist_log_timeout())
+    else:
+        # add, a revocation mirrored since the query must not be overwritten
+        cache.add(_jti_key(jti), False, get_blacklist_negative_timeout())
+    return blacklisted
+
+
+def remember_blacklisted(jti, expires_at):
+    """
+    Mirror a committed blacklist entry into the cache and the revocation log.
+    """
+    timeout = (expires_at - timezone.now()).total_seconds()
+    if timeout <= 0:
+        return
+    cache.set(_jti_key(jti), True, timeout)
+    cache.add(SEQUENCE_KEY, 0, None)
+    try:
+        position = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # the sequence was evicted just now, every process reloads
+        return
+    cache.set(_log_key(position), jti, get_blacklist_log_timeout())
+
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+INDEX_NAME = 'token_outstanding_expires_idx'
+
+
+def get_index(apps):
+    OutstandingToken = apps.get_model('token_blacklist', 'OutstandingToken')
+    return OutstandingToken, models.Index(fields=['expires_at'], name=INDEX_NAME)
+
+
+def create_index(apps, schema_editor):
+    OutstandingToken, index = get_index(apps)
+    if schema_editor.connection.vendor == 'postgresql':
+        # built without blocking the logins that insert tokens
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} '
+            f'ON {OutstandingToken._meta.db_table} (expires_at)')
+    else:
+        schema_editor.add_index(OutstandingToken, index)
+
+
+def drop_index(apps, schema_editor):
+    OutstandingToken, index = get_index(apps)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}')
+    else:
+        schema_editor.remove_index(OutstandingToken, index)
+
+
+class Migration(migrations.Migration):
+    """
+    Index token_blacklist's OutstandingToken.expires_at, which the pruning
+    in authentication.tasks walks. The table belongs to simplejwt, so the
+    index lives in this app's migrations.
+    """
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('token_blacklist', '0011_linearizes_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
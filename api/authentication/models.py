@@ -1,3 +1,44 @@
+import logging
+import time
+
+from django.db import transaction
+
 from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+logger = logging.getLogger(__name__)
+
 
-# write your models here
\ No newline at end of file
+def clear_expired_tokens(expiry_time, batch_size=1000, pause=0):
+    """
+    Remove outstanding tokens that expired before `expiry_time`, with their
+    blacklist entries, one transaction per batch of `batch_size` tokens.
+    Batches are picked through the expires_at index so every transaction
+    only locks the rows it deletes.
+    :param expiry_time: Token expiration time
+    :param batch_size: Tokens deleted per transaction
+    :param pause: Seconds to wait between two batches
+    :return: dict of deleted outstanding and blacklisted tokens, batches
+        and seconds taken
+    """
+    started = time.perf_counter()
+    metrics = {'outstanding': 0, 'blacklisted': 0, 'batches': 0}
+    expired = OutstandingToken.objects.filter(
+        expires_at__lt=expiry_time).order_by('expires_at')
+    while True:
+        with transaction.atomic():
+            pks = list(expired.values_list('pk', flat=True)[:batch_size])
+            if pks:
+                _, deleted = OutstandingToken.objects.filter(pk__in=pks).delete()
+                metrics['outstanding'] += deleted.get(OutstandingToken._meta.label, 0)
+                metrics['blacklisted'] += deleted.get(BlacklistedToken._meta.label, 0)
+                metrics['batches'] += 1
+        if pks:
+            logger.info('Removed %(outstanding)d expired tokens (%(blacklisted)d '
+                        'blacklisted) in %(batches)d batches', metrics)
+        if len(pks) < batch_size:
+            metrics['seconds'] = round(time.perf_counter() - started, 3)
+            return metrics
+        if pause:
+            time.sleep(pause)
@@ -1,10 +1,15 @@
 from django.utils.translation import gettext_lazy as _
 
 from rest_framework_simplejwt import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import TokenError, UntypedToken
 from rest_framework import serializers
 
+from .blacklist import is_blacklisted
+from .tokens import RefreshToken
+
+
 class TokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
@@ -24,6 +29,38 @@ class TokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
+class TokenRefreshSerializer(TokenRefreshSerializer):
+
+    def validate(self, attrs):
+        # same as simplejwt's but with the cached blacklist check
+        refresh = RefreshToken(attrs['refresh'])
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+class TokenVerifySerializer(TokenVerifySerializer):
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+
+        if api_settings.BLACKLIST_AFTER_ROTATION:
+            if is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+                raise serializers.ValidationError(_('Token is blacklisted'))
+
+        return {}
+
+
 class TokenRevokeSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
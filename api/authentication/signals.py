@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from accounts.models import User
+
+from .authentication import invalidate_cached_user
+from .blacklist import blacklist_filter, remember_blacklisted
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, *args, **kwargs):
+    """
+    Drop the user from the CachedJWTAuthentication caches whenever its row
+    changes, e.g. when it is deactivated or loses staff status.
+    """
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def mirror_blacklisted_token(sender, instance, created, *args, **kwargs):
+    """
+    Publish a new blacklist entry to authentication.blacklist once it is
+    committed, whichever code path (revoke, rotation, admin) created it.
+    There is no post_delete counterpart: it would turn the cascading
+    deletes of expired tokens into one query per row, and a removed entry
+    only keeps its token rejected until it expires.
+    """
+    if created:
+        token = instance.token
+        # this process knows right away, the others once it is committed
+        blacklist_filter.add(token.jti)
+        transaction.on_commit(
+            lambda: remember_blacklisted(token.jti, token.expires_at))
+
@@ -0,0 +1,34 @@
+from celery import shared_task
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import clear_expired_tokens
+
+
+def get_token_prune_batch_size():
+    """
+    Returns the number of expired tokens deleted per transaction (default: 1000)
+    Set Django SETTINGS.TOKEN_PRUNE_BATCH_SIZE to overwrite this
+    """
+    return getattr(settings, 'TOKEN_PRUNE_BATCH_SIZE', 1000)
+
+
+def get_token_prune_batch_pause():
+    """
+    Returns the seconds waited between two batches (default: 0.1)
+    Set Django SETTINGS.TOKEN_PRUNE_BATCH_PAUSE to overwrite this time
+    """
+    return getattr(settings, 'TOKEN_PRUNE_BATCH_PAUSE', 0.1)
+
+
+@shared_task
+def prune_expired_tokens():
+    """
+    Delete expired outstanding tokens and their blacklist entries
+    :return: dict of deleted outstanding and blacklisted tokens, batches
+        and seconds taken
+    """
+    return clear_expired_tokens(
+        timezone.now(), batch_size=get_token_prune_batch_size(),
+        pause=get_token_prune_batch_pause())
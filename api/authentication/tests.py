@@ -1,6 +1,30 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.tests import BaseAPITestCase, BaseTestCaseMixin
+
+from accounts import hashing
+from accounts.models import User
 
-from core.tests import BaseAPITestCase
+from . import async_views
+from .authentication import CachedJWTAuthentication, _version_key
+from .blacklist import BloomFilter, _jti_key, blacklist_cache_is_shared, blacklist_filter, is_blacklisted
+from .models import clear_expired_tokens
+from .tasks import prune_expired_tokens
+from .tokens import RefreshToken
 
 
 class AuthenticationAPITestCase(BaseAPITestCase):
@@ -109,3 +133,273 @@ class AuthenticationAPITestCase(BaseAPITestCase):
             self.assertIn(key, response.data)
             self.assertEqual(response.data.get('detail'), 'Successfully revoked token')
 
+    def test_user_can_login_with_email_in_any_case(self):
+        """
+        Test that the email lookup is case insensitive
+        """
+        url = reverse('jwt-create')
+        data = {
+            "username": self.roger_user.email.upper(),
+            "password": "2424df22"
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_can_login_with_formatted_phone(self):
+        """
+        Test that a formatted phone number resolves to the stored one
+        """
+        self.roger_user.phone = '8090872323'
+        self.roger_user.save()
+
+        url = reverse('jwt-create')
+        data = {
+            "username": '809-087 2323',
+            "password": "2424df22"
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+# the local memory cache of the test process stands in for a shared one
+@override_settings(JWT_BLACKLIST_SHARED_CACHE=True)
+class CachedJWTAuthenticationAPITestCase(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        CachedJWTAuthentication.user_cache.clear()
+        self.token_client = APIClient()
+        self.token_client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.roger_user)}')
+
+    def test_user_is_served_from_cache(self):
+        url = reverse('user-me')
+        # user and the three profile queries of the endpoint
+        with self.assertNumQueries(4):
+            response = self.token_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(3):
+            response = self.token_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['email'], self.roger_user.email)
+
+    def test_every_request_gets_its_own_user(self):
+        authentication = CachedJWTAuthentication()
+        token = AccessToken.for_user(self.roger_user)
+        first = authentication.get_user(token)
+        first.profile
+        second = authentication.get_user(token)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.pk, second.pk)
+        self.assertFalse(second._state.fields_cache)
+
+    def test_deactivated_user_is_rejected(self):
+        url = reverse('user-me')
+        self.assertEqual(self.token_client.get(url).status_code, 200)
+        self.roger_user.is_active = False
+        self.roger_user.save()
+        self.assertEqual(self.token_client.get(url).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        url = reverse('user-me')
+        self.assertEqual(self.token_client.get(url).status_code, 200)
+        self.roger_user.delete()
+        self.assertEqual(self.token_client.get(url).status_code, 401)
+
+    @override_settings(JWT_BLACKLIST_SHARED_CACHE=None)
+    def test_process_local_cache_is_not_used(self):
+        url = reverse('user-me')
+        self.assertEqual(self.token_client.get(url).status_code, 200)
+        # another process demotes the user, this one would never hear of it
+        with self.assertNumQueries(4):
+            response = self.token_client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_made_by_another_process_is_seen(self):
+        authentication = CachedJWTAuthentication()
+        token = AccessToken.for_user(self.roger_user)
+        self.assertFalse(authentication.get_user(token).is_staff)
+        # another process saves the user: its receiver only resets the
+        # shared version, this process' entry is left behind
+        User.objects.filter(pk=self.roger_user.pk).update(is_staff=True)
+        cache.delete(_version_key(self.roger_user.pk))
+        self.assertTrue(authentication.get_user(token).is_staff)
+
+
+# the local memory cache of the test process stands in for a shared one
+@override_settings(JWT_BLACKLIST_SHARED_CACHE=True)
+class TokenBlacklistAPITestCase(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        blacklist_filter.clear()
+        self.refresh = RefreshToken.for_user(self.roger_user)
+
+    def post_refresh(self, token):
+        return self.client.post(reverse('jwt-refresh'), {'refresh': str(token)}, format='json')
+
+    def revoke(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('jwt-revoke'), {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_skips_database_for_tokens_never_revoked(self):
+        self.assertEqual(self.post_refresh(self.refresh).status_code, 200)
+        token = RefreshToken.for_user(self.sally_user)
+        with self.assertNumQueries(0):
+            response = self.post_refresh(token)
+        self.assertEqual(response.status_code, 200)
+
+    def test_revoked_token_is_rejected(self):
+        self.assertEqual(self.post_refresh(self.refresh).status_code, 200)
+        self.revoke(self.refresh)
+        with self.assertNumQueries(0):
+            response = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(
+            reverse('jwt-verify'), {'token': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_revocation_reaches_other_processes(self):
+        # warm this "process" up, then revoke from "another" one whose
+        # receiver can only reach this process through the cache
+        self.assertFalse(is_blacklisted(self.refresh['jti']))
+        bloom = blacklist_filter.bloom
+        self.revoke(self.refresh)
+        blacklist_filter.bloom = bloom
+        with self.assertNumQueries(0):
+            self.assertTrue(is_blacklisted(self.refresh['jti']))
+
+    def test_database_answers_when_cache_is_lost(self):
+        self.revoke(self.refresh)
+        cache.clear()
+        blacklist_filter.clear()
+        self.assertTrue(is_blacklisted(self.refresh['jti']))
+        self.assertFalse(is_blacklisted(RefreshToken.for_user(self.sally_user)['jti']))
+
+    def test_blacklist_rows_stay_the_source_of_truth(self):
+        self.revoke(self.refresh)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=self.refresh['jti']).exists())
+
+    def test_negative_never_overwrites_a_revocation(self):
+        jti = self.refresh['jti']
+        blacklist_filter.sync().add(jti)
+
+        def exists():
+            # the revocation commits and is mirrored right after the query
+            cache.set(_jti_key(jti), True)
+            return False
+        with mock.patch.object(BlacklistedToken.objects, 'filter') as filter:
+            filter.return_value.exists.side_effect = exists
+            self.assertFalse(is_blacklisted(jti))
+        self.assertTrue(is_blacklisted(jti))
+
+    @override_settings(JWT_BLACKLIST_NEGATIVE_TIMEOUT=0)
+    def test_negatives_are_cached_for_the_negative_timeout(self):
+        jti = self.refresh['jti']
+        blacklist_filter.sync().add(jti)
+        self.assertFalse(is_blacklisted(jti))
+        self.assertIsNone(cache.get(_jti_key(jti)))
+
+    @override_settings(JWT_BLACKLIST_SHARED_CACHE=None)
+    def test_process_local_cache_asks_the_database(self):
+        self.assertFalse(blacklist_cache_is_shared())
+        self.assertFalse(is_blacklisted(self.refresh['jti']))
+        bloom = blacklist_filter.bloom
+        self.revoke(self.refresh)
+        # a revocation by another process never reaches this one's cache
+        blacklist_filter.bloom = bloom
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_blacklisted(self.refresh['jti']))
+
+
+class BloomFilterTestCase(TestCase):
+
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        members = [f'member-{i}' for i in range(1000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class ClearExpiredTokensTestCase(BaseAPITestCase):
+
+    def create_tokens(self, count, expires_in):
+        expires_at = timezone.now() + timedelta(days=expires_in)
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(user=self.roger_user, jti=f'{expires_in}-{i}', token='token',
+                             expires_at=expires_at)
+            for i in range(count)
+        ])
+        return tokens
+
+    def test_expired_tokens_are_removed_in_batches(self):
+        self.create_tokens(5, expires_in=-1)
+        live = self.create_tokens(2, expires_in=1)
+        for token in OutstandingToken.objects.filter(jti__in=['-1-0', '-1-1', '1-0']):
+            BlacklistedToken.objects.create(token=token)
+
+        metrics = clear_expired_tokens(timezone.now(), batch_size=2)
+        self.assertEqual(metrics['outstanding'], 5)
+        self.assertEqual(metrics['blacklisted'], 2)
+        self.assertEqual(metrics['batches'], 3)
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('jti', flat=True)),
+                         sorted(token.jti for token in live))
+        self.assertEqual(BlacklistedToken.objects.get().token.jti, '1-0')
+
+    def test_task_prunes_expired_tokens(self):
+        self.create_tokens(3, expires_in=-1)
+        metrics = prune_expired_tokens()
+        self.assertEqual(metrics['outstanding'], 3)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_expires_at_is_indexed(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, OutstandingToken._meta.db_table)
+        self.assertIn(['expires_at'], [constraint['columns'] for constraint in constraints.values()
+                                       if constraint['index']])
+
+
+class AsyncLoginTestCase(BaseTestCaseMixin, TransactionTestCase):
+    """
+    The async login looks users up from worker threads of their own, which
+    only see committed rows.
+    """
+
+    def login(self, data):
+        request = AsyncRequestFactory().post('/', data, content_type='application/json')
+        response = async_to_sync(async_views.token_obtain)(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_login_awaits_the_password_check(self):
+        with mock.patch('accounts.hashing.acheck_password', wraps=hashing.acheck_password) as acheck:
+            status_code, body = self.login({'username': 'roger', 'password': '2424df22'})
+        self.assertEqual(status_code, 200)
+        acheck.assert_called_once()
+        access = AccessToken(body['data']['access'])
+        self.assertEqual(access['user_id'], self.roger_user.pk)
+        self.assertEqual(access['name'], f'{self.roger_user.first_name} {self.roger_user.last_name}')
+        self.assertTrue(OutstandingToken.objects.filter(user=self.roger_user).exists())
+        self.roger_user.refresh_from_db()
+        self.assertIsNotNone(self.roger_user.last_login)
+
+    def test_wrong_credentials_are_rejected(self):
+        status_code, body = self.login({'username': 'roger', 'password': 'wrong'})
+        self.assertEqual(status_code, 401)
+        self.assertEqual(body['status'], 'Error')
+        status_code, _ = self.login({'username': 'nobody', 'password': '2424df22'})
+        self.assertEqual(status_code, 401)
+        User.objects.filter(pk=self.roger_user.pk).update(is_active=False)
+        status_code, _ = self.login({'username': 'roger', 'password': '2424df22'})
+        self.assertEqual(status_code, 401)
+
+    def test_credentials_are_required(self):
+        status_code, body = self.login({'username': 'roger'})
+        self.assertEqual(status_code, 400)
+        self.assertIn('password', body)
@@ -1,12 +1,14 @@
+from django.conf import settings
 from django.urls import re_path
 
-from rest_framework_simplejwt import views
-
-from .views import TokenObtainPairView, TokenRevokeView, TokenRefreshView
+from . import async_views
+from .views import TokenObtainPairView, TokenRevokeView, TokenRefreshView, TokenVerifyView
 
 urlpatterns = [
-    re_path(r"^jwt/create/?", TokenObtainPairView.as_view(), name="jwt-create"),
+    re_path(r"^jwt/create/?",
+            async_views.token_obtain if settings.ASGI_READ_VIEWS else TokenObtainPairView.as_view(),
+            name="jwt-create"),
     re_path(r"^jwt/refresh/?", TokenRefreshView.as_view(), name="jwt-refresh"),
     re_path(r"^jwt/revoke/?", TokenRevokeView.as_view(), name="jwt-revoke"),
-    re_path(r"^jwt/verify/?", views.TokenVerifyView.as_view(), name="jwt-verify"),
+    re_path(r"^jwt/verify/?", TokenVerifyView.as_view(), name="jwt-verify"),
 ]
@@ -2,13 +2,12 @@
 from rest_framework import exceptions
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
-from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
 from core.utils import success_response
 
-from .serializers import TokenObtainPairSerializer, TokenRevokeSerializer
+from .serializers import TokenObtainPairSerializer, TokenRefreshSerializer, TokenRevokeSerializer, TokenVerifySerializer
 
 
 class TokenObtainPairView(TokenObtainPairView):
@@ -46,6 +45,10 @@ class TokenRefreshView(TokenRefreshView):
         return success_response(detail="Successfully refreshed access token", **serializer.validated_data)
 
 
+class TokenVerifyView(TokenVerifyView):
+    serializer_class = TokenVerifySerializer
+
+
 class TokenRevokeView(APIView):
     permission_classes = (AllowAny,)
     serializer_class = TokenRevokeSerializer
@@ -0,0 +1,135 @@
+"""
+Micro and load benchmarks for the API hot paths.
+
+Run them from the `api` directory, e.g. `python -m benchmarks.camel_case`.
+They are not collected by `manage.py test`.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(settings_module='api.settings.local'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Run the block against a freshly created test database so benchmarks
+    never touch real data.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def server_environment(**settings):
+    """
+    Returns the environment for running servers and `manage.py` against a
+    migrated SQLite database in a temporary directory, with `settings`
+    overriding the local ones.
+    """
+    directory = tempfile.mkdtemp()
+    settings = {
+        'DATABASES': {'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+            'OPTIONS': {'timeout': 60},
+        }},
+        **settings,
+    }
+    with open(os.path.join(directory, 'benchmark_settings.py'), 'w') as module:
+        module.write('from api.settings.local import *\n')
+        for name, value in settings.items():
+            module.write(f'{name} = {value!r}\n')
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmark_settings',
+               PYTHONPATH=os.pathsep.join([directory, API_DIR]))
+    manage(env, 'migrate', '--run-syncdb', '--noinput')
+    return env
+
+
+def manage(env, *command):
+    """
+    Runs `manage.py command` with `env` and returns its output.
+    """
+    return subprocess.run([sys.executable, 'manage.py', *command], cwd=API_DIR, env=env,
+                          check=True, capture_output=True, text=True).stdout
+
+
+def best_of(func, repeat=5, number=1):
+    """
+    Returns the best wall time in seconds of `number` calls of `func`.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def report(title, rows):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    baseline = rows[0][1]
+    for name, seconds in rows:
+        print(f'  {name:<{width}}  {seconds * 1000:9.2f} ms  x{baseline / seconds:5.2f}')
+
+
+def child_pids(pid):
+    """
+    Returns the pids of the direct children of `pid` (Linux only).
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                parent = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(entry))
+    return children
+
+
+def process_tree(pid):
+    return [pid] + [child for direct in child_pids(pid) for child in process_tree(direct)]
+
+
+def process_memory(pid):
+    """
+    Returns the Rss, Pss and private memory of `pid` in MB (Linux only).
+    Pss splits every shared page between the processes sharing it, so the
+    Pss of a server's processes adds up to what the server really uses.
+    """
+    fields = {'Rss': 0, 'Pss': 0, 'Private_Clean': 0, 'Private_Dirty': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return {
+        'rss': fields['Rss'] / 1024,
+        'pss': fields['Pss'] / 1024,
+        'private': (fields['Private_Clean'] + fields['Private_Dirty']) / 1024,
+    }
@@ -0,0 +1,106 @@
+"""
+GET /v1/users/me/ served by the docker-compose deployment (gunicorn, 2 sync
+workers) and by daphne with ASGI_READ_VIEWS, at growing concurrency.
+
+    python -m benchmarks.asgi_reads [--requests 400] [--concurrency 8 32 64] [--delay 0.05]
+
+Both servers run against a migrated SQLite copy in a temporary directory.
+`--delay` adds REQUEST_TIME_DELAY seconds of waiting to every request
+(core.middleware.TimeDelayMiddleware), standing in for a slow database or
+upstream: sync workers serve one waiting request each, the event loop
+serves all of them. Memory is the summed RSS of every server process after
+the run, so throughput is compared at the memory each deployment needs.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import textwrap
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from . import API_DIR, manage, process_memory, process_tree, server_environment
+
+
+PORT = 8765
+
+
+def rss_megabytes(pid):
+    return sum(process_memory(process)['rss'] for process in process_tree(pid))
+
+
+def request(url, token, json_content):
+    headers = {'Authorization': f'Bearer {token}'}
+    if json_content:
+        # the content type TimeDelayMiddleware delays
+        headers['Content-Type'] = 'application/json'
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60) as response:
+        return response.status
+
+
+def wait_until_serving(url):
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 64])
+    parser.add_argument('--delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    env = server_environment(PASSWORD_HASHING_WORKERS=0, REQUEST_TIME_DELAY=args.delay)
+    token = manage(env, 'shell', '-c', textwrap.dedent("""
+        from rest_framework_simplejwt.tokens import AccessToken
+        from accounts.models import User
+        user = User.objects.create_user('benchmark', 'benchmark@example.com', 'password')
+        print(AccessToken.for_user(user))
+    """)).strip().splitlines()[-1]
+
+    servers = [
+        ('gunicorn, 2 sync workers', {},
+         ['gunicorn', 'api.wsgi:application', '-w', '2', '-b', f'127.0.0.1:{PORT}']),
+        ('daphne, async read views', {'ASGI_READ_VIEWS': 'true'},
+         ['daphne', '-b', '127.0.0.1', '-p', str(PORT), 'api.asgi:application']),
+    ]
+    url = f'http://127.0.0.1:{PORT}/v1/users/me/'
+    print(f'GET /v1/users/me/, {args.requests} requests, {args.delay * 1000:.0f} ms '
+          f'waiting per request ({os.cpu_count()} cores)')
+    results = {}
+    for label, extra_env, command in servers:
+        server = subprocess.Popen(command, cwd=API_DIR, env=dict(env, **extra_env),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_serving(url)
+            # warm up every worker, imports and the user cache
+            request(url, token, False)
+            for concurrency in args.concurrency:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as pool:
+                    statuses = list(pool.map(
+                        lambda _: request(url, token, args.delay > 0), range(args.requests)))
+                elapsed = time.perf_counter() - start
+                assert set(statuses) == {200}, statuses
+                rss = rss_megabytes(server.pid)
+                results[label, concurrency] = rate = args.requests / elapsed
+                print(f'  {label:<26} {concurrency:3d} clients  {rate:7.1f} req/s  '
+                      f'{rss:6.1f} MB  {rate / rss * 100:6.1f} req/s per 100 MB')
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+    print(json.dumps({f'{label} @{concurrency}': round(rate, 1)
+                      for (label, concurrency), rate in results.items()}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Render and parse a 1000 item profile page with djangorestframework_camel_case
+and with the memoized translation in core.camel_case.
+
+    python -m benchmarks.camel_case [--items 1000]
+"""
+import argparse
+import json
+
+from . import best_of, report, setup_django
+
+
+def profile_page(items):
+    results = [{
+        'id': i,
+        'first_name': f'First {i}',
+        'last_name': f'Last {i}',
+        'avatar': f'https://cdn.example.com/media/public/avatar_{i}.png',
+        'is_active': True,
+        'is_email_verified': i % 2 == 0,
+        'location': 'Kathmandu, Nepal',
+        'email': f'user{i}@example.com',
+        'phone': f'98{i:08d}',
+        'nationality': 'Nepalese',
+        'skills': ['Software Development', 'Public Speaking', 'Python'],
+        'interests': ['Football', 'Reading', 'Coding'],
+        'country_code': '+977',
+    } for i in range(items)]
+    return {
+        'status': 'Success',
+        'detail': 'Fetched all records',
+        'data': {'count': items, 'next': None, 'previous': None, 'results': results},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    setup_django()
+    from io import BytesIO
+
+    from djangorestframework_camel_case.parser import CamelCaseJSONParser as LibraryParser
+    from djangorestframework_camel_case.render import CamelCaseJSONRenderer as LibraryRenderer
+
+    from accounts.serializers import UserProfileSerializer
+    from core.camel_case import serializer_key_map
+    from core.parsers import CamelCaseJSONParser
+    from core.renderers import CamelCaseJSONRenderer
+
+    serializer_key_map(UserProfileSerializer)
+    page = profile_page(args.items)
+    body = LibraryRenderer().render(page)
+    assert CamelCaseJSONRenderer().render(page) == body
+
+    report(f'render {args.items} profiles', [
+        ('djangorestframework_camel_case', best_of(lambda: LibraryRenderer().render(page), args.repeat)),
+        ('core.renderers', best_of(lambda: CamelCaseJSONRenderer().render(page), args.repeat)),
+    ])
+
+    payload = json.dumps(json.loads(body)['data']['results']).encode('utf-8')
+    report(f'parse {args.items} profiles', [
+        ('djangorestframework_camel_case', best_of(lambda: LibraryParser().parse(BytesIO(payload)), args.repeat)),
+        ('core.parsers', best_of(lambda: CamelCaseJSONParser().parse(BytesIO(payload)), args.repeat)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Memory per gunicorn worker, without and with the preloading config in
+api/gunicorn_conf.py.
+
+    python -m benchmarks.gunicorn_memory [--workers 2] [--requests 50]
+
+Each server gets `--requests` requests per endpoint below so every worker
+has imported and served them, then Rss, Pss and private memory of the
+master and every worker are read from /proc (Linux only). Rss counts
+pages shared with the master in full, Pss and private memory show what a
+worker really adds.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import textwrap
+import time
+import urllib.error
+import urllib.request
+
+from . import API_DIR, child_pids, manage, process_memory, server_environment
+
+
+PORT = 8767
+
+ENDPOINTS = ('/v1/users/me/', '/v1/users/', '/v1/docs/?format=openapi')
+
+
+def get(url, token):
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def wait_until_serving(url):
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    env = server_environment(PASSWORD_HASHING_WORKERS=0)
+    token = manage(env, 'shell', '-c', textwrap.dedent("""
+        from rest_framework_simplejwt.tokens import AccessToken
+        from accounts.models import User
+        user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'password')
+        print(AccessToken.for_user(user))
+    """)).strip().splitlines()[-1]
+
+    bind = f'127.0.0.1:{PORT}'
+    servers = [
+        ('gunicorn -w', {}, ['gunicorn', 'api.wsgi:application', '-w', str(args.workers), '-b', bind]),
+        ('gunicorn_conf.py', {'GUNICORN_WORKERS': str(args.workers), 'GUNICORN_BIND': bind},
+         ['gunicorn', '-c', 'api/gunicorn_conf.py', 'api.wsgi:application']),
+    ]
+    print(f'MB after {args.requests} requests to each of {", ".join(ENDPOINTS)}')
+    for label, extra_env, command in servers:
+        server = subprocess.Popen(command, cwd=API_DIR, env=dict(env, **extra_env),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_serving(f'http://{bind}/')
+            for endpoint in ENDPOINTS:
+                for _ in range(args.requests):
+                    status = get(f'http://{bind}{endpoint}', token)
+                    assert status == 200, (endpoint, status)
+
+            master = process_memory(server.pid)
+            workers = [process_memory(pid) for pid in child_pids(server.pid)]
+            total = master['pss'] + sum(worker['pss'] for worker in workers)
+            print(f'{label}')
+            print(f'  master              rss {master["rss"]:6.1f}  pss {master["pss"]:6.1f}  '
+                  f'private {master["private"]:6.1f}')
+            for worker in workers:
+                print(f'  worker              rss {worker["rss"]:6.1f}  pss {worker["pss"]:6.1f}  '
+                      f'private {worker["private"]:6.1f}')
+            print(f'  total pss {total:6.1f}, {total / len(workers):6.1f} per worker')
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
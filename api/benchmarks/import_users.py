@@ -0,0 +1,64 @@
+"""
+Import users from a generated JSON lines file with the import command
+machinery, hashing passwords in the importing process and in a process
+pool, against signing the same users up one POST at a time.
+
+    python -m benchmarks.import_users [--rows 2000] [--workers N]
+
+Passwords are hashed with the configured (production) hasher.
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+from . import setup_django, test_database
+
+
+def make_rows(count, prefix):
+    for i in range(count):
+        yield json.dumps({
+            'username': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com',
+            'password': f'password-{i}', 'firstName': 'Imported',
+            'skills': ['Tennis', f'Skill {i % 50}'], 'interests': ['Reading'],
+        }) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--signups', type=int, default=50,
+                        help='rows signed up one POST at a time')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from accounts.importers import UserImporter, read_rows
+
+    def import_rows(prefix, workers):
+        stream = io.StringIO(''.join(make_rows(args.rows, prefix)))
+        report = UserImporter(workers=workers).run(read_rows(stream, 'jsonl'))
+        assert report.created == args.rows, report.errors[:5]
+        return report.rows_per_second
+
+    def sign_up():
+        client = APIClient()
+        start = time.perf_counter()
+        for row in make_rows(args.signups, 'signup'):
+            response = client.post(reverse('user-list'), json.loads(row), format='json')
+            assert response.status_code == 201, response.content
+        return args.signups / (time.perf_counter() - start)
+
+    with test_database() as connection:
+        print(f'rows per second ({connection.vendor}, {os.cpu_count()} cores)')
+        print(f'  POST /users/ per row          {sign_up():9.1f}')
+        print(f'  import, hashing inline        {import_rows("inline", 0):9.1f}')
+        print(f'  import, {args.workers} hashing processes  {import_rows("pool", args.workers):9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Resolve login identifiers against a large user table with the former
+username/email/phone OR query and with AccountManager.get_by_natural_key.
+
+    python -m benchmarks.login_lookup [--users 1000000]
+
+Point DJANGO_SETTINGS_MODULE at a PostgreSQL settings module to measure the
+production planner; the default local settings use SQLite.
+"""
+import argparse
+import random
+
+from . import best_of, report, setup_django, test_database
+
+
+def create_users(count, batch_size=10000):
+    from django.contrib.auth.hashers import make_password
+
+    from accounts.models import User
+
+    password = make_password('2424df22')
+    for start in range(0, count, batch_size):
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'User{i}@example.com',
+                 phone=f'98{i:08d}', password=password)
+            for i in range(start, min(start + batch_size, count))
+        ], batch_size=batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+
+    from accounts.models import User
+
+    def legacy_get_by_natural_key(username):
+        return User.objects.get(
+            Q(username=username) | Q(email=username) | Q(phone=username))
+
+    with test_database() as connection:
+        create_users(args.users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        picks = [random.randrange(args.users) for _ in range(args.lookups)]
+        identifiers = {
+            'username': [f'user{i}' for i in picks],
+            'email': [f'User{i}@example.com' for i in picks],
+            'phone': [f'98{i:08d}' for i in picks],
+        }
+        for kind, values in identifiers.items():
+            report(f'{args.lookups} logins by {kind}, {args.users} users ({connection.vendor})', [
+                ('username OR email OR phone', best_of(
+                    lambda: [legacy_get_by_natural_key(value) for value in values], repeat=3)),
+                ('get_by_natural_key', best_of(
+                    lambda: [User.objects.get_by_natural_key(value) for value in values], repeat=3)),
+            ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Concurrent logins and signups with passwords hashed in the request thread
+(PASSWORD_HASHING_WORKERS=0) and in the hashing process pool.
+
+    python -m benchmarks.password_hashing [--threads 8] [--requests 64]
+
+Requests are issued from `--threads` threads, like a threaded gunicorn
+worker serving them. Passwords use the configured (production) hasher.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connections
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from accounts import hashing
+    from accounts.models import User
+
+    def concurrently(func, threads):
+        def call(index):
+            try:
+                return func(index)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            statuses = list(pool.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+        assert set(statuses) == {200} or set(statuses) == {201}, statuses
+        return args.requests / elapsed
+
+    def login(index):
+        response = APIClient().post(reverse('jwt-create'), {
+            'username': 'benchmark', 'password': 'benchmark password'}, format='json')
+        return response.status_code
+
+    def signup(prefix):
+        def post(index):
+            response = APIClient().post(reverse('user-list'), {
+                'username': f'{prefix}{index}', 'email': f'{prefix}{index}@example.com',
+                'password': 'benchmark password'}, format='json')
+            return response.status_code
+        return post
+
+    database = connections.databases['default']
+    signup_threads = args.threads
+    if database['ENGINE'].endswith('sqlite3'):
+        # the in-memory test database locks tables between threads, a file
+        # waits for the lock instead; signup transactions read before they
+        # write, which SQLite cannot run concurrently
+        signup_threads = 1
+        directory = tempfile.mkdtemp()
+        database.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        database.setdefault('OPTIONS', {})['timeout'] = 60
+
+    with test_database() as connection:
+        User.objects.create_user('benchmark', 'benchmark@example.com', 'benchmark password')
+        print(f'requests per second, {args.threads} threads for logins, {signup_threads} '
+              f'for signups ({connection.vendor}, {os.cpu_count()} cores)')
+        for workers in (0, args.workers):
+            with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                label = f'{workers} hashing processes' if workers else 'hashing in request thread'
+                # start the pool outside of the timings
+                hashing.make_password('warm up')
+                logins = concurrently(login, args.threads)
+                signups = concurrently(signup(f'w{workers}x'), signup_threads)
+                print(f'  {label:<28} logins {logins:7.1f}   signups {signups:7.1f}')
+                hashing.shutdown_executor()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Presigning a gallery of uploads: one GET /v1/upload/ per file with a new
+S3 client per request (as before), with the shared client, and one
+POST /v1/upload/batch/ for all of them.
+
+    python -m benchmarks.s3_presign [--files 20] [--endpoint-url http://127.0.0.1:9000] [--upload]
+
+Presigning is local signing, no network is needed: the client points at
+`--endpoint-url` with dummy credentials unless AWS_ACCESS_KEY_ID is set.
+`--upload` also posts a file with the first presigned form to that
+endpoint, for a local S3 stand-in (minio, `moto_server`) whose bucket
+exists, to check the signatures are accepted.
+"""
+import argparse
+import os
+
+from . import best_of, report, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--endpoint-url', default='http://127.0.0.1:9000')
+    parser.add_argument('--bucket', default='benchmark')
+    parser.add_argument('--upload', action='store_true')
+    options = parser.parse_args()
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark-secret')
+    setup_django()
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+
+    import boto3
+    from botocore.client import Config
+
+    from core import s3
+    from core.utils import success_response
+    from core.views import FileUploadBatchView, FileUploadView
+
+    class NewClientFileUploadView(FileUploadView):
+        # the view before the shared client
+        def retrieve(self, request, *args, **kwargs):
+            client = boto3.client('s3', endpoint_url=options.endpoint_url, config=Config(
+                signature_version='s3v4', region_name='us-east-1'))
+            upload_details = s3.presign_upload(request.GET['file'], client)
+            return success_response(detail="Generated pre-signed post", **upload_details)
+
+    factory = APIRequestFactory()
+    files = [f'gallery/{index}.jpg' for index in range(options.files)]
+    single_view = FileUploadView.as_view()
+    new_client_view = NewClientFileUploadView.as_view()
+    batch_view = FileUploadBatchView.as_view()
+
+    def singles(view):
+        def run():
+            for name in files:
+                response = view(factory.get('/v1/upload/', {'file': name}))
+                assert response.status_code == 200, response.data
+        return run
+
+    def batch():
+        response = batch_view(factory.post('/v1/upload/batch/', {'files': files}, format='json'))
+        assert response.status_code == 200, response.data
+        return response
+
+    with override_settings(AWS_STORAGE_BUCKET_NAME=options.bucket, AWS_S3_REGION_NAME='us-east-1',
+                           AWS_S3_ENDPOINT_URL=options.endpoint_url,
+                           UPLOAD_PRESIGN_BATCH_SIZE=max(options.files, 50)):
+        batch()
+        report(f'presigning {options.files} files', [
+            (f'{options.files} requests, new client each', best_of(singles(new_client_view), 3)),
+            (f'{options.files} requests, shared client', best_of(singles(single_view))),
+            ('1 batch request, shared client', best_of(batch)),
+        ])
+
+        if options.upload:
+            import urllib3
+
+            upload = batch().data['data']['uploads'][0]
+            response = urllib3.PoolManager().request('POST', upload['url'], fields={
+                **upload['fields'], 'file': ('0.jpg', b'\xff\xd8\xff benchmark', 'image/jpeg')})
+            print(f'upload with the first presigned form: HTTP {response.status}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+POST signups to the user endpoint with the former view (user saved twice,
+profile inserted then updated, every statement in autocommit) and with the
+current single-transaction view.
+
+    python -m benchmarks.signup [--signups 100]
+
+The test database of the local settings is an in-memory SQLite database
+where a commit costs nothing; on a durable database every autocommitted
+write of the former view pays for its own commit as well.
+"""
+import argparse
+
+from . import best_of, report, setup_django, test_database
+
+
+PAYLOAD = {
+    'password': 'somepassword1',
+    'firstName': 'Roger',
+    'lastName': 'Federer',
+    'location': 'Basel, Switzerland',
+    'skills': ['Public Speaking', 'Tennis', 'Volleying'],
+    'interests': ['Football', 'Reading'],
+}
+
+
+def legacy_view():
+    from accounts.models import VerificationCode
+    from accounts.serializers import CustomUserSerializer, UserProfileSerializer
+    from accounts.views import UserViewSet
+    from core.utils import success_response
+
+    class LegacyUserSerializer(CustomUserSerializer):
+
+        def create(self, validated_data):
+            user = super(CustomUserSerializer, self).create(validated_data)
+            user.set_password(validated_data['password'])
+            user.save()
+            return user
+
+    class LegacyUserViewSet(UserViewSet):
+
+        def create(self, request, *args, **kwargs):
+            user_serializer = LegacyUserSerializer(
+                data=request.data, context=self.get_serializer_context())
+            user_serializer.is_valid(raise_exception=True)
+            user = user_serializer.save()
+            serializer = UserProfileSerializer(
+                user.profile, data=request.data, context={'user': user})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            VerificationCode.objects.create(user=user, code_type="email_verification")
+            return success_response(detail="created", code=201, **serializer.data)
+
+    return LegacyUserViewSet.as_view({'post': 'create'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--signups', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from rest_framework.test import APIRequestFactory
+
+    from accounts.models import VerificationCode
+    from accounts.views import UserViewSet
+
+    factory = APIRequestFactory()
+    views = [
+        ('former signup view', legacy_view()),
+        ('UserViewSet.create', UserViewSet.as_view({'post': 'create'})),
+    ]
+
+    def signups(view, prefix, count):
+        counter = iter(range(10 ** 9))
+
+        def run():
+            # codes are 6 random digits, keep collisions out of the timings
+            VerificationCode.objects.all().delete()
+            for _ in range(count):
+                index = next(counter)
+                request = factory.post('/api/v1/users/', dict(
+                    PAYLOAD, username=f'{prefix}{index}', email=f'{prefix}{index}@example.com'),
+                    format='json')
+                response = view(request)
+                assert response.status_code == 201, response.data
+        return run
+
+    # a cheap hasher keeps the comparison about the database writes
+    with test_database(), override_settings(
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+        rows = []
+        for number, (name, view) in enumerate(views):
+            with CaptureQueriesContext(connection) as queries:
+                signups(view, f'q{number}x', 1)()
+            statements = [query['sql'].split()[0] for query in queries.captured_queries]
+            writes = sum(sql in ('INSERT', 'UPDATE') for sql in statements)
+            print(f'  {name}: {len(statements)} queries, {writes} writes per signup')
+            rows.append((name, best_of(signups(view, f'u{number}x', args.signups), repeat=3)))
+        report(f'{args.signups} signups ({connection.vendor})', rows)
+
+
+if __name__ == '__main__':
+    main()
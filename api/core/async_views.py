@@ -0,0 +1,119 @@
+"""
+Helpers for native async read endpoints served under ASGI.
+
+Django 3.2 has no async ORM and DRF views are synchronous, so these views
+are plain `async def` Django views: database work runs through
+`database_sync_to_async(thread_sensitive=False)`, in the executor's thread
+pool rather than queued behind the single thread-sensitive thread, and
+responses use the same envelope and camelCase rendering as the DRF views.
+"""
+import functools
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+
+from channels.db import database_sync_to_async
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .renderers import CamelCaseJSONRenderer
+
+
+__all__ = ['run_sync', 'async_api_view', 'async_success_response']
+
+
+def run_sync(func):
+    """
+    Wrap `func` so it can be awaited: it runs in a worker thread of its
+    own and closes stale database connections around the call.
+    """
+    return database_sync_to_async(func, thread_sensitive=False)
+
+
+def render(data, code):
+    return HttpResponse(CamelCaseJSONRenderer().render(data), status=code,
+                        content_type='application/json')
+
+
+def async_success_response(detail, code=200, **kwargs):
+    """
+    `core.utils.success_response` for async views.
+    """
+    return render({'status': 'Success', 'detail': detail, 'data': {**kwargs}}, code)
+
+
+def error_response(exc, authenticators):
+    # the body core.exceptions.custom_exception_handler produces
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = authenticators[0].authenticate_header(None) if authenticators else None
+        if header:
+            exc.auth_header = header
+        else:
+            exc.status_code = status.HTTP_403_FORBIDDEN
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    if not isinstance(data, dict):
+        data = {'detail': data}
+    response = render({**data, 'status_code': exc.status_code, 'status': 'Error'}, exc.status_code)
+    if getattr(exc, 'auth_header', None):
+        response['WWW-Authenticate'] = exc.auth_header
+    return response
+
+
+def get_authenticators():
+    # session authentication needs a DRF request and its CSRF checks, async
+    # views accept the bearer tokens of the default JWT authentication only
+    return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            if issubclass(auth, JWTAuthentication)]
+
+
+def authenticate(request, authenticators):
+    for authenticator in authenticators:
+        result = authenticator.authenticate(request)
+        if result is not None:
+            return result[0]
+    return AnonymousUser()
+
+
+def call_sync_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def async_api_view(methods=('GET',), authenticated=False, fallback=None):
+    """
+    Decorate an `async def view(request, *args, **kwargs)`.
+
+    `request.user` is set from the request's bearer token,
+    `authenticated=True` rejects anonymous requests and APIExceptions
+    become error responses. Requests with another method are handed to the
+    synchronous `fallback` view when given.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                if fallback is not None:
+                    return await database_sync_to_async(call_sync_view)(
+                        fallback, request, *args, **kwargs)
+                return error_response(exceptions.MethodNotAllowed(request.method), [])
+
+            authenticators = get_authenticators()
+            try:
+                if 'HTTP_AUTHORIZATION' in request.META:
+                    request.user = await run_sync(authenticate)(request, authenticators)
+                else:
+                    request.user = AnonymousUser()
+                if authenticated and not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc, authenticators)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+"""
+camelCase <-> snake_case key translation with memoized keys.
+
+Same output as `djangorestframework_camel_case.util` but every distinct key
+goes through the regular expression only once: the key vocabulary of an API
+is the set of serializer field names, so translations are kept in a bounded
+cache instead of being recomputed for every key of every object.
+"""
+import re
+from functools import lru_cache
+
+from django.core.files import File
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+
+from djangorestframework_camel_case.util import camelize_re, get_underscoreize_re, underscore_to_camel
+from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+
+__all__ = ['camelize', 'underscoreize', 'serializer_key_map']
+
+
+KEY_CACHE_SIZE = 4096
+
+_underscoreize_res = {
+    True: get_underscoreize_re({'no_underscore_before_number': True}),
+    False: get_underscoreize_re({'no_underscore_before_number': False}),
+}
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def camelize_key(key):
+    if '_' not in key:
+        return key
+    return camelize_re.sub(underscore_to_camel, key)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def underscoreize_key(key, no_underscore_before_number=False):
+    return _underscoreize_res[bool(no_underscore_before_number)].sub(r'\1_\2', key).lower()
+
+
+def serializer_key_map(serializer_class):
+    """
+    Returns the {field_name: camelCaseName} map of `serializer_class`,
+    including nested serializers, and warms the key cache with it.
+    """
+    return _serializer_key_map(serializer_class)
+
+
+@lru_cache(maxsize=None)
+def _serializer_key_map(serializer_class):
+    key_map = {}
+    pending = [serializer_class()]
+    while pending:
+        serializer = pending.pop()
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        for name, field in serializer.fields.items():
+            key_map[name] = camelize_key(name)
+            underscoreize_key(key_map[name])
+            if isinstance(field, serializers.BaseSerializer):
+                pending.append(field)
+    return key_map
+
+
+def camelize(data, **options):
+    ignore_fields = options.get('ignore_fields') or ()
+    if isinstance(data, Promise):
+        data = force_str(data)
+    if isinstance(data, dict):
+        if isinstance(data, ReturnDict):
+            new_dict = ReturnDict(serializer=data.serializer)
+        else:
+            new_dict = {}
+        for key, value in data.items():
+            if isinstance(key, Promise):
+                key = force_str(key)
+            new_key = camelize_key(key) if isinstance(key, str) else key
+            if ignore_fields and (key in ignore_fields or new_key in ignore_fields):
+                new_dict[new_key] = value
+            else:
+                new_dict[new_key] = camelize(value, **options)
+        return new_dict
+    if isinstance(data, (list, tuple)):
+        return [camelize(item, **options) for item in data]
+    if isinstance(data, (str, bytes, int, float, bool)) or data is None:
+        return data
+    if _is_iterable(data):
+        return [camelize(item, **options) for item in data]
+    return data
+
+
+def underscoreize(data, **options):
+    ignore_fields = options.get('ignore_fields') or ()
+    no_underscore_before_number = bool(options.get('no_underscore_before_number'))
+    if isinstance(data, dict):
+        if type(data) == MultiValueDict:
+            new_data = MultiValueDict()
+            for key in data:
+                new_data.setlist(
+                    underscoreize_key(key, no_underscore_before_number), data.getlist(key))
+            return new_data
+
+        new_dict = {}
+        items = data.lists() if isinstance(data, QueryDict) else data.items()
+        for key, value in items:
+            new_key = underscoreize_key(
+                key, no_underscore_before_number) if isinstance(key, str) else key
+            if ignore_fields and (key in ignore_fields or new_key in ignore_fields):
+                new_dict[new_key] = value
+            else:
+                new_dict[new_key] = underscoreize(value, **options)
+
+        if isinstance(data, QueryDict):
+            new_query = QueryDict(mutable=True)
+            for key, value in new_dict.items():
+                new_query.setlist(key, value)
+            return new_query
+        return new_dict
+    if isinstance(data, (str, bytes, int, float, bool, File)) or data is None:
+        return data
+    if _is_iterable(data):
+        return [underscoreize(item, **options) for item in data]
+    return data
+
+
+def _is_iterable(obj):
+    try:
+        iter(obj)
+    except TypeError:
+        return False
+    return True
@@ -0,0 +1,175 @@
+"""
+Resized WebP derivatives of uploaded images.
+
+Avatars and image FileUploads are stored as uploaded, often several
+megapixels. Once one is saved, core.tasks.generate_image_derivatives (routed
+to the `images` queue, whose prefork worker is the process pool) decodes it
+once and writes a WebP of every IMAGE_DERIVATIVE_SIZES next to it in the
+default storage. The row records them with the URL they were made from:
+
+    {'source': <url>, 'sizes': {'thumbnail': {'url': ..., 'width': 96, 'height': 72}, ...}}
+
+and core.serializers.ImageURLField returns the size a client asks for.
+Pillow is optional, without it no derivatives are generated and the
+originals are served.
+"""
+import io
+import logging
+import os
+from urllib.parse import unquote
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['available', 'derivatives_of', 'needs_derivatives', 'render_derivatives',
+           'generate_derivatives', 'enqueue_derivatives']
+
+# model label: (URL field, derivatives field)
+IMAGE_FIELDS = {
+    'core.fileuploads': ('url', 'variants'),
+    'accounts.userprofile': ('avatar', 'avatar_variants'),
+}
+
+
+def get_image_derivative_sizes():
+    """
+    Returns the derivatives made of every image, name: longest side in pixels
+    (default: thumbnail 96, small 320, medium 960)
+    Set Django SETTINGS.IMAGE_DERIVATIVE_SIZES to overwrite this, empty
+    turns derivatives off
+    """
+    return getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {'thumbnail': 96, 'small': 320, 'medium': 960})
+
+
+def get_image_derivative_quality():
+    """
+    Returns the WebP quality of derivatives (default: 80)
+    Set Django SETTINGS.IMAGE_DERIVATIVE_QUALITY to overwrite this
+    """
+    return getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+
+
+def available():
+    return Image is not None and bool(get_image_derivative_sizes())
+
+
+def derivatives_of(url, variants):
+    """
+    Returns the {size: {url, width, height}} made of `url`, empty when the
+    recorded ones were made of a previous URL or none were made yet.
+    """
+    if not url or not variants or variants.get('source') != url:
+        return {}
+    return variants.get('sizes') or {}
+
+
+def needs_derivatives(url, variants):
+    return bool(url) and (variants or {}).get('source') != url and available()
+
+
+def storage_name(url):
+    """
+    Returns the name of `url` in the default storage, None for files stored
+    elsewhere (e.g. a Gravatar avatar).
+    """
+    base_url = default_storage.url('')
+    if not url or not url.startswith(base_url):
+        return None
+    return unquote(url[len(base_url):].split('?', 1)[0])
+
+
+def derivative_name(name, size):
+    return f'{os.path.splitext(name)[0]}.{size}.webp'
+
+
+def render_derivatives(content, sizes=None, quality=None):
+    """
+    Returns {size: (webp bytes, width, height)} for the image `content`.
+    Images are never enlarged.
+    """
+    sizes = get_image_derivative_sizes() if sizes is None else sizes
+    quality = get_image_derivative_quality() if quality is None else quality
+    image = Image.open(io.BytesIO(content))
+    # JPEGs are decoded at the smallest scale still larger than needed
+    largest = max(sizes.values())
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    rendered = {}
+    # each size is scaled down from the previous one instead of the original
+    for size, pixels in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((pixels, pixels), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'WEBP', quality=quality, method=4)
+        rendered[size] = (output.getvalue(), image.width, image.height)
+    return rendered
+
+
+def generate_derivatives(url):
+    """
+    Writes the derivatives of the image at `url` to the default storage,
+    returns what a row records for them. Sizes are empty for files outside
+    the storage and for files that are not images.
+    """
+    variants = {'source': url, 'sizes': {}}
+    name = storage_name(url)
+    if name is None or not default_storage.exists(name):
+        return variants
+    with default_storage.open(name, 'rb') as image_file:
+        content = image_file.read()
+    try:
+        rendered = render_derivatives(content)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('No derivatives of %s: %s', url, exc)
+        return variants
+
+    for size, (webp, width, height) in rendered.items():
+        path = derivative_name(name, size)
+        # regenerated derivatives replace the old ones instead of getting a suffix
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        path = default_storage.save(path, ContentFile(webp))
+        variants['sizes'][size] = {'url': default_storage.url(path), 'width': width, 'height': height}
+    return variants
+
+
+def save_derivatives(model, pk, url, variants):
+    """
+    Records `variants` on the row unless its image changed in the meantime.
+    """
+    url_field, variants_field = IMAGE_FIELDS[model._meta.label_lower]
+    return model.objects.filter(pk=pk, **{url_field: url}).update(**{variants_field: variants})
+
+
+def enqueue_derivatives(instance):
+    """
+    Ask the images worker for the derivatives of `instance` once it is
+    committed. A broker that is down must not fail the save, the
+    `build_image_derivatives` command catches up.
+    """
+    from .tasks import generate_image_derivatives
+
+    def enqueue():
+        try:
+            generate_image_derivatives.apply_async(args=(instance._meta.label_lower, instance.pk), retry=False)
+        except Exception:
+            logger.exception('Could not enqueue derivatives of %s %s', instance._meta.label, instance.pk)
+    transaction.on_commit(enqueue)
+
+
+def setup_worker():
+    # spawned (not forked) pool workers start without configured apps
+    django.setup()
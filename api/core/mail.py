@@ -0,0 +1,46 @@
+import logging
+
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .models import OutboxEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, template_name, context, to, from_email=None):
+    """
+    Render `template_name`.txt and `template_name`.html with `context` and
+    write the message to the outbox in the current transaction. Delivery is
+    handed over to celery only once that transaction commits.
+    :param subject: Email subject
+    :param template_name: Template path without extension
+    :param context: Template context
+    :param to: List of recipient addresses
+    :param from_email: Sender address
+    :return: OutboxEmail Model Object
+    """
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=render_to_string(f'{template_name}.txt', context),
+        html_body=render_to_string(f'{template_name}.html', context),
+        from_email=from_email,
+        to=list(to),
+    )
+    transaction.on_commit(lambda: enqueue_outbox_delivery([email.pk]))
+    return email
+
+
+def enqueue_outbox_delivery(ids):
+    """
+    Ask a celery worker to deliver the given outbox emails. A broker that is
+    down must not fail the request, the periodic delivery task picks up any
+    email left pending.
+    """
+    from .tasks import deliver_outbox_emails
+
+    try:
+        deliver_outbox_emails.apply_async(args=(ids,), retry=False)
+    except Exception:
+        logger.exception('Could not enqueue outbox emails %s', ids)
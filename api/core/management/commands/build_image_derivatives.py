@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = ('Generate the missing resized derivatives of image uploads and avatars in a '
+            'process pool, e.g. for images saved before derivatives or while the broker was down')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes resizing images, 0 resizes in this one')
+        parser.add_argument('--force', action='store_true',
+                            help='Also regenerate the derivatives of images that have them')
+
+    def get_pending(self, force):
+        """
+        Yields (model, pk, url) of every image that needs derivatives.
+        """
+        for label, (url_field, variants_field) in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            queryset = model.objects.exclude(**{f'{url_field}__isnull': True}).exclude(**{url_field: ''})
+            if label == 'core.fileuploads':
+                queryset = queryset.filter(file_type='image')
+            for pk, url, variants in queryset.values_list('pk', url_field, variants_field).iterator():
+                if force or images.needs_derivatives(url, variants):
+                    yield model, pk, url
+
+    def handle(self, *args, **options):
+        if not images.available():
+            raise CommandError('Install Pillow and set IMAGE_DERIVATIVE_SIZES to generate derivatives')
+        pending = list(self.get_pending(options['force']))
+        urls = [url for _, _, url in pending]
+
+        pool = None
+        if options['workers']:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=images.setup_worker)
+        try:
+            results = pool.map(images.generate_derivatives, urls) if pool else map(images.generate_derivatives, urls)
+            generated = 0
+            for (model, pk, url), variants in zip(pending, results):
+                images.save_derivatives(model, pk, url, variants)
+                generated += len(variants['sizes'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {generated} derivatives of {len(pending)} images'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.docs import FORMATS, write_schema
+
+
+class Command(BaseCommand):
+    help = ('Generate the OpenAPI schema files served by /v1/docs/, run it whenever '
+            'the API changes, e.g. next to collectstatic when deploying')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, action='append',
+                            help='Schema format to write, json by default')
+
+    def handle(self, *args, **options):
+        for format in options['format'] or ['json']:
+            path, etag = write_schema(format)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {path} (ETag {etag})'))
@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter, this process has imported everything already.
+PHASES_SCRIPT = textwrap.dedent("""
+    import json
+    import sys
+    import time
+
+    phases = []
+    start = last = time.perf_counter()
+
+    def phase(name):
+        global last
+        now = time.perf_counter()
+        phases.append((name, now - last))
+        last = now
+
+    import django
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    phase('settings')
+    django.setup(set_prefix=False)
+    phase('apps')
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+    phase('urlconf')
+    from django.core.handlers.wsgi import WSGIHandler
+    handler = WSGIHandler()
+    phase('middleware')
+    path = sys.argv[1]
+    if path:
+        from django.test import Client
+        Client(raise_request_exception=False).get(path)
+        phase('first request')
+    phases.append(('total', time.perf_counter() - start))
+    print(json.dumps({'phases': phases, 'modules': sorted(sys.modules)}))
+""")
+
+
+def parse_importtime(output):
+    """
+    Returns [(module, self seconds, cumulative seconds, depth)] from the
+    `python -X importtime` lines of `output`.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+class Command(BaseCommand):
+    help = ('Start the project in a new interpreter and report how long Django setup '
+            'phases and imports take')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='',
+                            help='Also time a first GET request to this path')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of packages and modules listed')
+        parser.add_argument('--json', action='store_true',
+                            help='Write the report as JSON')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PHASES_SCRIPT, options['path']],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+                os.getcwd(), os.environ.get('PYTHONPATH')]))),
+            capture_output=True, text=True)
+        try:
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            raise CommandError(f'Profiling failed:\n{result.stderr[-2000:]}')
+        imports = parse_importtime(result.stderr)
+
+        # self time of every module, summed per top level package
+        packages = defaultdict(float)
+        for name, self_seconds, _, _ in imports:
+            packages[name.split('.')[0]] += self_seconds
+        packages = sorted(packages.items(), key=lambda item: -item[1])[:options['limit']]
+        modules = sorted(imports, key=lambda item: -item[2])[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'phases': dict(report['phases']),
+                'packages': dict(packages),
+                'modules': {name: cumulative for name, _, cumulative, _ in modules},
+                'imported_modules': len(report['modules']),
+            }, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Setup phases'))
+        for name, seconds in report['phases']:
+            self.stdout.write(f'  {name:<16} {seconds * 1000:8.1f} ms')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Import time by package ({len(report["modules"])} modules imported)'))
+        for name, seconds in packages:
+            self.stdout.write(f'  {name:<32} {seconds * 1000:8.1f} ms')
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest imports, with what they import'))
+        for name, _, cumulative, depth in modules:
+            self.stdout.write(f'  {"  " * depth}{name:<{48 - 2 * depth}} {cumulative * 1000:8.1f} ms')
@@ -1,17 +1,25 @@
+import asyncio
 import time
 from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
 
 
-class TimeDelayMiddleware(object):
+@sync_and_async_middleware
+def TimeDelayMiddleware(get_response):
     """
     Set a delay for API requests giving a more realistic frontend development experience.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-        self.delay = float(settings.REQUEST_TIME_DELAY)
+    delay = float(settings.REQUEST_TIME_DELAY)
 
-    def __call__(self, request):
-        if request.content_type == 'application/json' and self.delay > 0:
-            time.sleep(self.delay)
-        response = self.get_response(request)
-        return response
+    if asyncio.iscoroutinefunction(get_response):
+        # under ASGI, sleep without holding up the event loop
+        async def middleware(request):
+            if request.content_type == 'application/json' and delay > 0:
+                await asyncio.sleep(delay)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            if request.content_type == 'application/json' and delay > 0:
+                time.sleep(delay)
+            return get_response(request)
+    return middleware
@@ -21,6 +21,8 @@ class FileUploads(BaseModel):
         ordering = ['-created_at']
 
     url = models.URLField()
+    # sha256 hex digest of uploads stored by content, see core.views.ContentUploadView
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     FILE_TYPE_CHOICES = (
         ('image', 'Image'),
         ('video', 'Video'),
@@ -31,6 +33,71 @@ class FileUploads(BaseModel):
     file_type = models.CharField(
         max_length=10, choices=FILE_TYPE_CHOICES, default='image')
     description = models.TextField(blank=True, null=True)
+    # resized copies of images, see core.images
+    variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.file_type
+
+
+class OutboxEmail(BaseModel):
+    '''
+    OutboxEmail Model for emails written in the same transaction as the
+    request that produced them and delivered later by a celery worker
+    '''
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    to = models.JSONField(default=list)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.subject} to {", ".join(self.to)}'
+
+
+class MultipartUpload(BaseModel):
+    '''
+    MultipartUpload Model for S3 multipart uploads in flight, the FileUploads
+    row is created when the upload is completed
+    '''
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    STATUS_CHOICES = (
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+        ('aborted', 'Aborted'),
+    )
+    status = models.CharField(
+        max_length=12, choices=STATUS_CHOICES, default='in_progress')
+    key = models.CharField(max_length=1024)
+    upload_id = models.CharField(max_length=1024)
+    filename = models.CharField(max_length=255)
+    file_type = models.CharField(
+        max_length=10, choices=FileUploads.FILE_TYPE_CHOICES, default='video')
+    description = models.TextField(blank=True, null=True)
+    file_upload = models.OneToOneField(
+        FileUploads, on_delete=models.SET_NULL, null=True, blank=True, related_name='multipart_upload')
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.status})'
@@ -1,18 +1,288 @@
+import json
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 
 from core.utils import success_response
 
+
+def get_count_cache_timeout():
+    """
+    Returns for how many seconds an exact list count is cached (default: 60)
+    Set Django SETTINGS.PAGINATION_COUNT_CACHE_TIMEOUT to overwrite this time
+    """
+    return getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+
+
+def get_count_estimate_threshold():
+    """
+    Returns the row count from which PostgreSQL's planner estimate is served
+    instead of an exact count (default: 100000)
+    Set Django SETTINGS.PAGINATION_COUNT_ESTIMATE_THRESHOLD to overwrite this
+    """
+    return getattr(settings, 'PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+
+
+def _count_version_key(model):
+    return f'pagination-count:{model._meta.label_lower}'
+
+
+def invalidate_cached_counts(model):
+    """
+    Drop every count cached for `model` by moving its cache version on.
+    """
+    try:
+        cache.incr(_count_version_key(model))
+    except ValueError:
+        # nothing has been counted for this model yet
+        pass
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose `count` avoids a `COUNT(*)` per request. Unfiltered
+    querysets on large PostgreSQL tables are counted from `pg_class.reltuples`,
+    anything else is counted exactly once and cached for
+    `PAGINATION_COUNT_CACHE_TIMEOUT` seconds or until a row of the model is
+    created or deleted.
+    """
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return len(queryset)
+
+        estimate = self.estimate_count(queryset)
+        if estimate is not None:
+            self.count_is_estimate = True
+            return estimate
+
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        digest = hashlib.md5(f'{sql}{params}'.encode('utf-8')).hexdigest()
+        version_key = _count_version_key(queryset.model)
+        version = cache.get_or_set(version_key, 1, None)
+        key = f'{version_key}:{version}:{digest}'
+
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_estimate = True
+            return count
+        count = queryset.count()
+        cache.set(key, count, get_count_cache_timeout())
+        return count
+
+    def estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        query = queryset.query
+        if (connection.vendor != 'postgresql' or query.where
+                or query.distinct or query.is_sliced):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+                [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+        # reltuples is coarse on small or never analyzed tables
+        if not row or row[0] < get_count_estimate_threshold():
+            return None
+        return int(row[0])
+
+
+class KeysetResultsSetPagination(pagination.BasePagination):
+    """
+    Keyset (seek) pagination on `(created_at, id)` or `id`.
+
+    Instead of an OFFSET every page filters on the ordering values of the
+    last row seen, which the index on those columns answers directly, so a
+    deep page costs the same as the first one. No count is computed.
+    Views may set `keyset_ordering` to choose the ordering fields.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+    display_page_controls = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-'))
+                       for name in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._invert(name) for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        # fetch one extra row to know whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.next_position = self._position(results[-1]) if results else position
+        self.previous_position = self._position(results[0]) if results else position
+        return results
+
+    def get_paginated_response(self, data, detail="Fetched all records"):
+        return success_response(detail=detail, **OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return pagination._positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None)
+        if ordering:
+            return list(ordering)
+        try:
+            queryset.model._meta.get_field('created_at')
+        except FieldDoesNotExist:
+            return ['id']
+        return ['created_at', 'id']
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        token = json.dumps({'p': position, 'r': int(reverse)},
+                           separators=(',', ':'))
+        encoded = urlsafe_b64encode(token.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if len(token['p']) != len(self.fields):
+                raise ValueError('Cursor does not match the ordering')
+            position = [field.to_python(value)
+                        for field, value in zip(self.fields, token['p'])]
+            reverse = bool(token.get('r', 0))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _position(self, instance):
+        position = []
+        for field in self.fields:
+            value = field.value_from_object(instance)
+            position.append(value if isinstance(value, (int, str)) or value is None
+                            else field.value_to_string(instance))
+        return position
+
+    def _seek(self, ordering, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            name = name.lstrip('-')
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    @staticmethod
+    def _invert(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+
+
 class DefaultResultsSetPagination(pagination.PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 1000
+    # `?pagination=cursor` (or any `?cursor=`) switches to keyset pagination
+    pagination_query_param = 'pagination'
+    keyset_class = KeysetResultsSetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (request.query_params.get(self.pagination_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param in request.query_params):
+            self.keyset = self.keyset_class()
+            self.display_page_controls = False
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data, detail="Fetched all records"):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data, detail=detail)
+        return success_response(detail=detail, **OrderedDict([
+            ('count', self.page.paginator.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class EstimatedCountPagination(DefaultResultsSetPagination):
+    """
+    Page number pagination serving an estimated or cached `count`, flagged
+    by `count_is_approximate` in the response.
+    """
+    django_paginator_class = EstimatedCountPaginator
 
     def get_paginated_response(self, data, detail="Fetched all records"):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data, detail=detail)
         return success_response(detail=detail, **OrderedDict([
             ('count', self.page.paginator.count),
+            ('count_is_approximate', self.page.paginator.count_is_estimate),
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
             ('results', data)
-        ]))
\ No newline at end of file
+        ]))
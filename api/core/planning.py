@@ -0,0 +1,80 @@
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import serializers
+
+
+__all__ = ['get_queryset_plan', 'plan_queryset', 'QuerysetPlanningMixin']
+
+
+_plans = {}
+
+
+def _walk(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                _walk(field, model, prefix, in_prefetch, select, prefetch)
+            continue
+
+        path = prefix
+        current_model = model
+        many = in_prefetch
+        for attr in field.source.split('.'):
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # a property or method, nothing to load up front
+                break
+            if not model_field.is_relation:
+                break
+
+            path = f'{path}__{attr}' if path else attr
+            if model_field.many_to_many or model_field.one_to_many:
+                many = True
+            if many:
+                prefetch.add(path)
+            else:
+                select.add(path)
+            current_model = model_field.related_model
+        else:
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if isinstance(field, serializers.BaseSerializer) and path:
+                _walk(field, current_model, path, many, select, prefetch)
+
+
+def get_queryset_plan(serializer_class, model):
+    """
+    Returns the `select_related` and `prefetch_related` paths needed to
+    serialize `model` instances with `serializer_class` without a query per
+    row. Plans are computed once per serializer and model.
+    :return: tuple of (select_related paths, prefetch_related paths)
+    """
+    key = (serializer_class, model)
+    if key not in _plans:
+        select, prefetch = set(), set()
+        _walk(serializer_class(), model, '', False, select, prefetch)
+        _plans[key] = (sorted(select), sorted(prefetch))
+    return _plans[key]
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Apply the `select_related`/`prefetch_related` calls that
+    `serializer_class` needs to the given queryset.
+    """
+    select, prefetch = get_queryset_plan(serializer_class, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class QuerysetPlanningMixin:
+    """
+    Plans `get_queryset()` for the serializer class of the current action.
+    """
+
+    def get_queryset(self):
+        return plan_queryset(super().get_queryset(), self.get_serializer_class())
@@ -0,0 +1,25 @@
+from rest_framework.renderers import BrowsableAPIRenderer
+
+from djangorestframework_camel_case.settings import api_settings
+
+from .camel_case import camelize
+
+
+class CamelCaseJSONRenderer(api_settings.RENDERER_CLASS):
+    """
+    `djangorestframework_camel_case` renderer using the memoized key
+    translation from `core.camel_case`.
+    """
+    json_underscoreize = api_settings.JSON_UNDERSCOREIZE
+
+    def render(self, data, *args, **kwargs):
+        return super().render(
+            camelize(data, **self.json_underscoreize), *args, **kwargs
+        )
+
+
+class CamelCaseBrowsableAPIRenderer(BrowsableAPIRenderer):
+    def render(self, data, *args, **kwargs):
+        return super().render(
+            camelize(data, **api_settings.JSON_UNDERSCOREIZE), *args, **kwargs
+        )
@@ -0,0 +1,249 @@
+"""
+A process-wide S3 client, presigned uploads, uploads stored by content
+and multipart uploads.
+
+Building a boto3 client loads and validates the S3 service model, which
+costs far more than signing a request with it. Clients are thread safe, so
+every thread of a process shares one per configuration; processes forked
+from one that built a client build their own.
+"""
+import base64
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+
+
+__all__ = ['S3Error', 'get_s3_client', 'presign_upload', 'presign_uploads', 'upload_key', 'object_url',
+           'content_key', 'presign_content_upload', 'content_stored',
+           'create_multipart_upload', 'presign_upload_parts', 'list_uploaded_parts',
+           'complete_multipart_upload', 'abort_multipart_upload']
+
+
+def get_upload_presign_batch_size():
+    """
+    Returns how many files one batch presign request may ask for (default: 50)
+    Set Django SETTINGS.UPLOAD_PRESIGN_BATCH_SIZE to overwrite this
+    """
+    return getattr(settings, 'UPLOAD_PRESIGN_BATCH_SIZE', 50)
+
+
+def get_upload_url_expiry():
+    """
+    Returns for how many seconds a presigned content upload URL is valid (default: 3600)
+    Set Django SETTINGS.UPLOAD_URL_EXPIRY to overwrite this time
+    """
+    return getattr(settings, 'UPLOAD_URL_EXPIRY', 3600)
+
+
+def get_upload_part_url_expiry():
+    """
+    Returns for how many seconds a presigned part upload URL is valid (default: 3600)
+    Set Django SETTINGS.UPLOAD_PART_URL_EXPIRY to overwrite this time
+    """
+    return getattr(settings, 'UPLOAD_PART_URL_EXPIRY', 3600)
+
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Returns the S3 client of this process for the current AWS_S3_* settings.
+    AWS_S3_ENDPOINT_URL points it at an S3 compatible server (minio, moto).
+    """
+    global _clients_pid
+
+    key = (settings.AWS_S3_REGION_NAME,
+           getattr(settings, 'AWS_S3_SIGNATURE_VERSION', 's3v4'),
+           getattr(settings, 'AWS_S3_ENDPOINT_URL', None))
+    client = _clients.get(key) if _clients_pid == os.getpid() else None
+    if client is not None:
+        return client
+
+    # boto3 is only imported by processes that talk to S3
+    import boto3
+    from botocore.client import Config
+
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        if key not in _clients:
+            region_name, signature_version, endpoint_url = key
+            # the default session is not thread safe, build with one of our own
+            _clients[key] = boto3.session.Session().client(
+                's3', endpoint_url=endpoint_url, config=Config(
+                    signature_version=signature_version, region_name=region_name))
+        return _clients[key]
+
+
+def clear_s3_clients():
+    with _clients_lock:
+        _clients.clear()
+
+
+class S3Error(Exception):
+    """
+    An S3 request failed, `code` is S3's error code (e.g. NoSuchUpload).
+    """
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _call(operation, **params):
+    # botocore is loaded by get_s3_client
+    from botocore.exceptions import ClientError
+
+    try:
+        return getattr(get_s3_client(), operation)(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME, **params)
+    except ClientError as exc:
+        error = exc.response.get('Error', {})
+        raise S3Error(error.get('Code'), error.get('Message') or str(exc))
+
+
+def upload_key(filename):
+    return f'media/public/{filename}'
+
+
+def object_url(key):
+    """
+    Returns the public URL of the object at `key`.
+    """
+    custom_domain = getattr(settings, 'AWS_S3_CUSTOM_DOMAIN', None)
+    if custom_domain:
+        return f'https://{custom_domain}/{key}'
+    return f'{get_s3_client().meta.endpoint_url}/{settings.AWS_STORAGE_BUCKET_NAME}/{key}'
+
+
+def presign_upload(filename, client=None):
+    """
+    Returns the presigned POST (url and form fields) that uploads
+    `filename` to the public media folder.
+    """
+    client = client or get_s3_client()
+    return client.generate_presigned_post(
+        settings.AWS_STORAGE_BUCKET_NAME, upload_key(filename), Fields={"acl": "public-read", }, Conditions=[
+            {"acl": "public-read"},
+        ])
+
+
+def presign_uploads(filenames):
+    """
+    Returns a presigned POST for every one of `filenames`, in order.
+    """
+    client = get_s3_client()
+    return [{'file': filename, **presign_upload(filename, client)} for filename in filenames]
+
+
+def content_key(content_hash):
+    """
+    Returns the key of the object with the sha256 hex digest `content_hash`.
+    """
+    return f'media/public/sha256/{content_hash}'
+
+
+def sha256_checksum(content_hash):
+    # S3 checksums are the base64 of the digest
+    return base64.b64encode(bytes.fromhex(content_hash)).decode()
+
+
+def presign_content_upload(content_hash, filename):
+    """
+    Returns a presigned PUT URL that stores a file by its content and the
+    headers the PUT has to send. S3 rejects the file unless its sha256 is
+    `content_hash`.
+    """
+    headers = {
+        'Content-Type': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'x-amz-acl': 'public-read',
+        'x-amz-checksum-sha256': sha256_checksum(content_hash),
+    }
+    url = get_s3_client().generate_presigned_url('put_object', Params={
+        'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': content_key(content_hash),
+        'ContentType': headers['Content-Type'], 'ACL': headers['x-amz-acl'],
+        'ChecksumSHA256': headers['x-amz-checksum-sha256'],
+    }, ExpiresIn=get_upload_url_expiry())
+    return {'url': url, 'headers': headers}
+
+
+def content_stored(content_hash):
+    """
+    Returns whether the object of `content_hash` exists with S3's sha256
+    checksum of it matching.
+    """
+    try:
+        response = _call('head_object', Key=content_key(content_hash), ChecksumMode='ENABLED')
+    except S3Error as exc:
+        # HEAD responses have no body, a missing key is a bare 404
+        if exc.code in ('404', 'NoSuchKey'):
+            return False
+        raise
+    return response.get('ChecksumSHA256') == sha256_checksum(content_hash)
+
+
+def create_multipart_upload(key, filename):
+    """
+    Starts a multipart upload to `key`, returns its S3 upload id.
+    """
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = _call('create_multipart_upload', Key=key, ACL='public-read',
+                     ContentType=content_type)
+    return response['UploadId']
+
+
+def presign_upload_parts(key, upload_id, part_numbers):
+    """
+    Returns a presigned PUT URL for every one of `part_numbers`, in order.
+    """
+    client = get_s3_client()
+    expiry = get_upload_part_url_expiry()
+    return [{
+        'part_number': part_number,
+        'url': client.generate_presigned_url('upload_part', Params={
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key,
+            'UploadId': upload_id, 'PartNumber': part_number,
+        }, ExpiresIn=expiry),
+    } for part_number in part_numbers]
+
+
+def list_uploaded_parts(key, upload_id):
+    """
+    Returns the parts S3 has received so far, a resumed upload sends the others.
+    """
+    parts = []
+    marker = 0
+    while True:
+        page = _call('list_parts', Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        parts += [{'part_number': part['PartNumber'], 'etag': part['ETag'], 'size': part['Size']}
+                  for part in page.get('Parts', [])]
+        if not page.get('IsTruncated'):
+            return parts
+        marker = page['NextPartNumberMarker']
+
+
+def complete_multipart_upload(key, upload_id, parts):
+    """
+    Joins `parts` (dicts of part_number and etag) into the object at `key`.
+    """
+    parts = sorted(parts, key=lambda part: part['part_number'])
+    _call('complete_multipart_upload', Key=key, UploadId=upload_id, MultipartUpload={
+        'Parts': [{'PartNumber': part['part_number'], 'ETag': part['etag']} for part in parts]})
+
+
+def abort_multipart_upload(key, upload_id):
+    """
+    Aborts the upload and frees the parts S3 stored for it.
+    """
+    try:
+        _call('abort_multipart_upload', Key=key, UploadId=upload_id)
+    except S3Error as exc:
+        # aborted or completed already
+        if exc.code != 'NoSuchUpload':
+            raise
@@ -1,12 +1,102 @@
 from rest_framework import serializers
 
-from .models import FileUploads
+from .images import derivatives_of
+from .models import FileUploads, MultipartUpload
+from .s3 import get_upload_presign_batch_size
+
+
+class ImageURLField(serializers.URLField):
+    """
+    An image URL that is written as is and read as the URL of one of its
+    derivatives (core.images): the `image_size` query parameter, else
+    `size`, else the original. Sizes not generated (yet) fall back to the
+    original as well.
+    """
+
+    def __init__(self, variants_source, size=None, **kwargs):
+        self.variants_source = variants_source
+        self.size = size
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        url = super().get_attribute(instance)
+        return url, getattr(instance, self.variants_source, None)
+
+    def get_size(self):
+        request = self.context.get('request')
+        size = request and getattr(request, 'query_params', request.GET).get('image_size')
+        return size or self.size
+
+    def to_representation(self, value):
+        url, variants = value
+        size = self.get_size()
+        if not url or not size:
+            return url
+        return derivatives_of(url, variants).get(size, {}).get('url', url)
 
 
 class FileUploadsSerializer(serializers.ModelSerializer):
+    url = ImageURLField(variants_source='variants')
 
     class Meta:
         model = FileUploads
         fields = ('url', 'file_type', 'id', 'description')
         read_only_fields = ('id',)
 
+
+class FileUploadBatchSerializer(serializers.Serializer):
+    files = serializers.ListField(child=serializers.CharField(max_length=255), min_length=1)
+
+    def validate_files(self, files):
+        batch_size = get_upload_presign_batch_size()
+        if len(files) > batch_size:
+            raise serializers.ValidationError(f'Ensure this field has no more than {batch_size} elements.')
+        return files
+
+
+class ContentUploadSerializer(serializers.Serializer):
+    content_hash = serializers.RegexField(r'^[0-9a-f]{64}$', error_messages={
+        'invalid': 'Enter the lowercase hex sha256 digest of the file.'})
+    filename = serializers.CharField(max_length=255)
+    file_type = serializers.ChoiceField(choices=FileUploads.FILE_TYPE_CHOICES, default='image')
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class StreamUploadSerializer(serializers.Serializer):
+    # read from the query string, the body is the file
+    file = serializers.CharField(max_length=255)
+    file_type = serializers.ChoiceField(choices=FileUploads.FILE_TYPE_CHOICES, default='image')
+    description = serializers.CharField(required=False, allow_blank=True)
+    private = serializers.BooleanField(default=False)
+
+
+class MultipartUploadSerializer(serializers.ModelSerializer):
+    file_upload = FileUploadsSerializer(read_only=True)
+
+    class Meta:
+        model = MultipartUpload
+        fields = ('id', 'filename', 'file_type', 'description', 'status', 'key',
+                  'created_at', 'completed_at', 'file_upload')
+        read_only_fields = ('id', 'status', 'key', 'created_at', 'completed_at')
+
+
+class MultipartPartsSerializer(serializers.Serializer):
+    # S3 numbers the parts of an upload from 1 to 10000
+    part_numbers = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=10000), min_length=1)
+
+    def validate_part_numbers(self, part_numbers):
+        batch_size = get_upload_presign_batch_size()
+        if len(part_numbers) > batch_size:
+            raise serializers.ValidationError(f'Ensure this field has no more than {batch_size} elements.')
+        return part_numbers
+
+
+class MultipartPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1, max_value=10000)
+    etag = serializers.CharField(max_length=255)
+
+
+class MultipartCompleteSerializer(serializers.Serializer):
+    # the parts S3 has are completed when the client does not list them
+    parts = MultipartPartSerializer(many=True, required=False)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from django.dispatch import receiver
+
+from . import images
+from .models import FileUploads
+from .pagination import invalidate_cached_counts
+
+
+__all__ = [
+    'invalidate_counts_on_create',
+    'invalidate_counts_on_delete',
+    'derive_uploaded_image',
+]
+
+
+def get_counted_models():
+    """
+    Returns the models whose list counts are cached by
+    core.pagination.EstimatedCountPaginator
+    Set Django SETTINGS.PAGINATION_COUNTED_MODELS to overwrite this list
+    """
+    return getattr(settings, 'PAGINATION_COUNTED_MODELS',
+                   ['accounts.User', 'accounts.UserProfile'])
+
+
+def invalidate_counts_on_create(sender, instance, created, *args, **kwargs):
+    # Only inserts change how many rows a list has; updates are covered by
+    # the cache timeout.
+    if created:
+        invalidate_cached_counts(sender)
+
+
+def invalidate_counts_on_delete(sender, instance, *args, **kwargs):
+    invalidate_cached_counts(sender)
+
+
+# Receivers are connected per model: a delete receiver on every model would
+# stop Django from using fast deletes anywhere.
+for model in get_counted_models():
+    post_save.connect(invalidate_counts_on_create, sender=model)
+    post_delete.connect(invalidate_counts_on_delete, sender=model)
+
+
+@receiver(post_save, sender=FileUploads)
+def derive_uploaded_image(sender, instance, *args, **kwargs):
+    # the task records the derivatives with an update, which sends no signal
+    if instance.file_type == 'image' and images.needs_derivatives(instance.url, instance.variants):
+        images.enqueue_derivatives(instance)
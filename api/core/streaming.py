@@ -0,0 +1,88 @@
+import json
+
+from django.http import StreamingHttpResponse
+
+from djangorestframework_camel_case.settings import api_settings
+from rest_framework.permissions import IsAdminUser
+from rest_framework.utils.encoders import JSONEncoder
+
+from .camel_case import camelize
+
+
+__all__ = ['iterate_in_chunks', 'streaming_success_response', 'StreamingListMixin']
+
+
+def iterate_in_chunks(queryset, chunk_size=500):
+    """
+    Iterate over `queryset` in primary key order, `chunk_size` rows at a
+    time. Every chunk is its own query, so `prefetch_related` keeps working
+    and only one chunk is held in memory.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False,
+                      separators=(',', ':'))
+
+
+def streaming_success_response(detail, queryset, serializer_class, context=None,
+                               chunk_size=500, code=200):
+    """
+    Same envelope as `success_response` with the serialized `queryset` as
+    `data.results`, written to the client chunk by chunk instead of being
+    built and encoded in memory first.
+    """
+    def stream():
+        yield f'{{"status":"Success","detail":{_dumps(detail)},"data":{{"results":['.encode('utf-8')
+        separator = ''
+        for chunk in iterate_in_chunks(queryset, chunk_size):
+            data = serializer_class(chunk, many=True, context=context).data
+            for item in camelize(data, **api_settings.JSON_UNDERSCOREIZE):
+                yield f'{separator}{_dumps(item)}'.encode('utf-8')
+                separator = ','
+        yield b']}}'
+
+    return StreamingHttpResponse(stream(), status=code, content_type='application/json')
+
+
+class StreamingListMixin:
+    """
+    `?stream=true` on a list endpoint streams every row of the filtered
+    queryset instead of returning one page. A stream is not capped like a
+    page, so it takes `stream_permission_classes` on top of the view's own
+    permissions.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+    stream_permission_classes = [IsAdminUser]
+
+    def check_stream_permissions(self, request):
+        for permission in [permission() for permission in self.stream_permission_classes]:
+            if not permission.has_permission(request, self):
+                self.permission_denied(
+                    request, message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None))
+
+    def wants_stream(self, request):
+        return request.query_params.get(self.stream_query_param, '').lower() in ('1', 'true')
+
+    def stream_response(self, queryset, serializer_class, detail="Fetched all records"):
+        return streaming_success_response(
+            detail, queryset, serializer_class,
+            context=self.get_serializer_context(), chunk_size=self.stream_chunk_size)
+
+    def list(self, request, *args, **kwargs):
+        if self.wants_stream(request):
+            self.check_stream_permissions(request)
+            return self.stream_response(
+                self.filter_queryset(self.get_queryset()), self.get_serializer_class())
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,154 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import images, s3
+from .models import MultipartUpload, OutboxEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_outbox_batch_size():
+    """
+    Returns the number of outbox emails delivered per task run (default: 100)
+    Set Django SETTINGS.EMAIL_OUTBOX_BATCH_SIZE to overwrite this value
+    """
+    return getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+
+
+def get_outbox_max_attempts():
+    """
+    Returns the number of delivery attempts before an outbox email is marked
+    as failed (default: 5)
+    Set Django SETTINGS.EMAIL_OUTBOX_MAX_ATTEMPTS to overwrite this value
+    """
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def get_multipart_upload_expiry_hours():
+    """
+    Returns after how many hours an unfinished multipart upload is aborted (default: 24)
+    Set Django SETTINGS.MULTIPART_UPLOAD_EXPIRY_HOURS to overwrite this time
+    """
+    return getattr(settings, 'MULTIPART_UPLOAD_EXPIRY_HOURS', 24)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def deliver_outbox_emails(self, ids=None):
+    """
+    Deliver pending outbox emails over a single SMTP connection.
+    :param ids: Deliver only these outbox emails, all pending ones if empty
+    :return: number of emails sent
+    """
+    max_attempts = get_outbox_max_attempts()
+    queryset = OutboxEmail.objects.filter(status='pending')
+    if ids:
+        queryset = queryset.filter(pk__in=ids)
+
+    with transaction.atomic():
+        # rows locked by another worker are skipped so that an email is
+        # never delivered twice
+        emails = list(queryset.select_for_update(
+            skip_locked=True)[:get_outbox_batch_size()])
+        if not emails:
+            return 0
+
+        connection = get_connection(
+            username=getattr(settings, 'EMAIL_HOST_USER', None),
+            fail_silently=False)
+        error = None
+        try:
+            connection.open()
+        except Exception as exc:
+            error = exc
+
+        sent = 0
+        for email in emails:
+            email.attempts += 1
+            try:
+                if error is not None:
+                    raise error
+                msg = EmailMultiAlternatives(
+                    email.subject, email.body, email.from_email, email.to,
+                    connection=connection)
+                if email.html_body:
+                    msg.attach_alternative(email.html_body, 'text/html')
+                msg.send()
+            except Exception as exc:
+                email.last_error = str(exc)
+                if email.attempts >= max_attempts:
+                    email.status = 'failed'
+            else:
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = None
+                sent += 1
+
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        OutboxEmail.objects.bulk_update(
+            emails, ['status', 'attempts', 'last_error', 'sent_at'])
+
+    retry_ids = [email.pk for email in emails if email.status == 'pending']
+    if retry_ids:
+        logger.warning('Could not deliver outbox emails %s', retry_ids)
+        raise self.retry(args=(retry_ids,), exc=error)
+    return sent
+
+
+@shared_task
+def abort_abandoned_multipart_uploads(batch_size=100):
+    """
+    Abort multipart uploads started more than MULTIPART_UPLOAD_EXPIRY_HOURS
+    ago and never completed, S3 keeps (and bills) their parts until then.
+    :return: number of uploads aborted
+    """
+    expired = timezone.now() - timedelta(hours=get_multipart_upload_expiry_hours())
+    uploads = list(MultipartUpload.objects.filter(
+        status='in_progress', created_at__lt=expired)[:batch_size])
+    aborted = []
+    for upload in uploads:
+        try:
+            s3.abort_multipart_upload(upload.key, upload.upload_id)
+        except s3.S3Error as exc:
+            # left for the next run
+            logger.warning('Could not abort multipart upload %s: %s', upload.pk, exc)
+            continue
+        aborted.append(upload.pk)
+    # a client may have completed an upload in the meantime
+    return MultipartUpload.objects.filter(
+        pk__in=aborted, status='in_progress').update(status='aborted')
+
+
+@shared_task
+def generate_image_derivatives(model_label, pk):
+    """
+    Generate and record the resized derivatives of a FileUploads image or
+    an avatar, see core.images.
+    :param model_label: Label of the model, e.g. core.fileuploads
+    :param pk: Primary key of the row
+    :return: number of derivatives generated
+    """
+    if not images.available():
+        logger.warning('Pillow is not installed or IMAGE_DERIVATIVE_SIZES is empty, '
+                       'no derivatives of %s %s', model_label, pk)
+        return 0
+    model = apps.get_model(model_label)
+    url_field, _ = images.IMAGE_FIELDS[model._meta.label_lower]
+    url = model.objects.filter(pk=pk).values_list(url_field, flat=True).first()
+    if not url:
+        return 0
+    variants = images.generate_derivatives(url)
+    images.save_derivatives(model, pk, url, variants)
+    return len(variants['sizes'])
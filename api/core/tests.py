@@ -1,8 +1,47 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-from rest_framework.test import APITestCase, APIClient
+from asgiref.sync import async_to_sync
+
+from botocore.stub import ANY, Stubber
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import QueryDict
+from django.utils import timezone
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from djangorestframework_camel_case import util as library_util
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient
 
 from accounts.models import User
+from accounts.relations import InterestRelatedField, SkillRelatedField
+from accounts.serializers import UserMinimalSerializer, UserProfileSerializer
+
+from . import images, planning, s3
+from .camel_case import camelize, serializer_key_map, underscoreize
+
+from .mail import queue_email
+from .management.commands.startup_profile import parse_importtime
+from .models import FileUploads, MultipartUpload, OutboxEmail
+from .streaming import iterate_in_chunks
+from .uploads import stream_to_storage
+from .serializers import FileUploadsSerializer
+from .tasks import abort_abandoned_multipart_uploads, deliver_outbox_emails, generate_image_derivatives
+from .views import MultipartUploadViewSet, file_upload
+from .warmup import warm_up
 
 
 class BaseTestCaseMixin(object):
@@ -10,6 +49,12 @@ class BaseTestCaseMixin(object):
     Create data that should be shared in all of our test cases
     """
     def setUp(self):
+        # Cached counts and tag ids would outlive the rolled back rows of
+        # other tests.
+        cache.clear()
+        SkillRelatedField.id_cache.clear()
+        InterestRelatedField.id_cache.clear()
+
         # Create users for our test cases.
         self.admin_user = User.objects.create_superuser(
             'admin', 'testadmin@asdf.com', 'adminpassword')
@@ -46,3 +91,754 @@ class BaseAPITestCase(BaseTestCaseMixin, APITestCase):
         self.sally_client.force_authenticate(self.sally_user)
         self.roger_client = APIClient()
         self.roger_client.force_authenticate(self.roger_user)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxEmailTestCase(BaseTestCase):
+
+    def queue_reset_email(self):
+        return queue_email(
+            'Password Reset for Roger', 'email/user_reset_password',
+            {'email': self.roger_user.email, 'code': '123456'},
+            [self.roger_user.email], 'Support <support@gmail.com>')
+
+    def test_queue_email_renders_templates_into_outbox(self):
+        email = self.queue_reset_email()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.to, [self.roger_user.email])
+        self.assertIn('123456', email.body)
+        self.assertIn('<code>123456</code>', email.html_body)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_deliver_outbox_emails_sends_pending_emails(self):
+        first = self.queue_reset_email()
+        second = self.queue_reset_email()
+        self.assertEqual(deliver_outbox_emails(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        for email in (first, second):
+            email.refresh_from_db()
+            self.assertEqual(email.status, 'sent')
+            self.assertEqual(email.attempts, 1)
+            self.assertIsNotNone(email.sent_at)
+
+        # sent emails are not delivered again
+        self.assertEqual(deliver_outbox_emails(), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_deliver_outbox_emails_only_sends_given_ids(self):
+        first = self.queue_reset_email()
+        self.queue_reset_email()
+        self.assertEqual(deliver_outbox_emails([first.pk]), 1)
+        self.assertEqual(OutboxEmail.objects.filter(status='pending').count(), 1)
+
+
+class KeysetPaginationAPITestCase(BaseAPITestCase):
+
+    def get_page(self, url, **params):
+        response = self.admin_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json().get('data')
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        url = reverse('user-list')
+        first = self.get_page(url, pagination='cursor', page_size=2)
+        self.assertNotIn('count', first)
+        self.assertIsNone(first['previous'])
+        self.assertEqual([user['id'] for user in first['results']],
+                         [self.admin_user.id, self.sally_user.id])
+
+        second = self.get_page(first['next'])
+        self.assertEqual([user['id'] for user in second['results']],
+                         [self.roger_user.id, self.james_user.id])
+        self.assertIsNone(second['next'])
+
+        previous = self.get_page(second['previous'])
+        self.assertEqual(previous['results'], first['results'])
+
+    def test_page_number_pagination_is_kept_by_default(self):
+        data = self.get_page(reverse('user-list'), page_size=2)
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(len(data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.admin_client.get(reverse('user-list'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 404)
+
+
+class EstimatedCountPaginationAPITestCase(BaseAPITestCase):
+
+    def get_page(self):
+        response = self.admin_client.get(reverse('user-list'))
+        self.assertEqual(response.status_code, 200)
+        return response.json().get('data')
+
+    def test_count_is_cached_until_a_row_is_created(self):
+        data = self.get_page()
+        self.assertEqual(data['count'], 4)
+        self.assertFalse(data['countIsApproximate'])
+
+        with self.assertNumQueries(1):
+            data = self.get_page()
+        self.assertEqual(data['count'], 4)
+        self.assertTrue(data['countIsApproximate'])
+
+        User.objects.create_user('tom', 'tom@asdf.com', '2424df22')
+        data = self.get_page()
+        self.assertEqual(data['count'], 5)
+        self.assertFalse(data['countIsApproximate'])
+
+
+class IterateInChunksTestCase(BaseTestCase):
+
+    def test_chunks_cover_queryset_once(self):
+        chunks = list(iterate_in_chunks(User.objects.all(), chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        self.assertEqual([user.pk for chunk in chunks for user in chunk],
+                         list(User.objects.order_by('pk').values_list('pk', flat=True)))
+
+
+class CamelCaseTestCase(TestCase):
+    """
+    The memoized translation must give the same keys as
+    djangorestframework_camel_case.
+    """
+    data = {
+        'first_name': 'Roger',
+        'is_email_verified': True,
+        'address_line_1': 'Main street',
+        'skills': ['public_speaking'],
+        'nested_list': [{'country_code': '+977', 'v2_key': None}],
+    }
+
+    def test_camelize_matches_library(self):
+        self.assertEqual(camelize(self.data), library_util.camelize(self.data))
+
+    def test_underscoreize_matches_library(self):
+        camel = library_util.camelize(self.data)
+        for options in ({}, {'no_underscore_before_number': True}):
+            self.assertEqual(underscoreize(camel, **options),
+                             library_util.underscoreize(camel, **options))
+
+    def test_ignore_fields(self):
+        data = {'meta_data': {'inner_key': 1}}
+        self.assertEqual(camelize(data, ignore_fields=('meta_data',)),
+                         {'metaData': {'inner_key': 1}})
+
+    def test_query_dict(self):
+        data = QueryDict('firstName=Roger&skills=a&skills=b')
+        result = underscoreize(data)
+        self.assertEqual(result.getlist('skills'), ['a', 'b'])
+        self.assertEqual(result['first_name'], 'Roger')
+
+    def test_serializer_key_map(self):
+        key_map = serializer_key_map(UserProfileSerializer)
+        self.assertEqual(key_map['is_email_verified'], 'isEmailVerified')
+        self.assertEqual(key_map['country_code'], 'countryCode')
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2')
+@mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+class AsyncFileUploadTestCase(TestCase):
+
+    def setUp(self):
+        # clients keep the credentials they were built with
+        s3.clear_s3_clients()
+        self.addCleanup(s3.clear_s3_clients)
+
+    def call(self, query=''):
+        response = async_to_sync(file_upload)(AsyncRequestFactory().get(f'/?{query}'))
+        return response.status_code, json.loads(response.content)
+
+    def test_presigned_post(self):
+        status_code, body = self.call('file=avatar.png')
+        self.assertEqual(status_code, 200)
+        self.assertEqual(body['detail'], 'Generated pre-signed post')
+        self.assertEqual(body['data']['fields']['key'], 'media/public/avatar.png')
+
+    def test_file_is_required(self):
+        status_code, body = self.call()
+        self.assertEqual(status_code, 400)
+        self.assertEqual(body['detail'], 'Querystring file not provided')
+
+
+class WarmUpTestCase(TestCase):
+
+    def test_warm_up(self):
+        planning._plans.clear()
+        loaded = warm_up()
+        self.assertGreater(loaded['url_patterns'], 0)
+        self.assertGreater(loaded['templates'], 0)
+        self.assertGreater(loaded['serializers'], 0)
+        self.assertIn((UserProfileSerializer, UserProfileSerializer.Meta.model), planning._plans)
+
+
+class StartupProfileTestCase(TestCase):
+
+    def test_parse_importtime(self):
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |   botocore.compat\n'
+                  'import time:      1500 |       1620 | boto3\n')
+        self.assertEqual(parse_importtime(output), [
+            ('botocore.compat', 0.00012, 0.00012, 1),
+            ('boto3', 0.0015, 0.00162, 0),
+        ])
+
+    def test_heavy_dependencies_are_not_imported_at_startup(self):
+        stdout = io.StringIO()
+        call_command('startup_profile', '--json', '--limit', '10000', stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(set(report['phases']), {'settings', 'apps', 'urlconf', 'middleware', 'total'})
+        self.assertNotIn('boto3', report['packages'])
+
+
+class SchemaDocsTestCase(TestCase):
+
+    def setUp(self):
+        from api import docs
+
+        self.schema_dir = tempfile.mkdtemp()
+        settings = override_settings(API_SCHEMA_DIR=self.schema_dir, DEBUG=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        docs.load_schema.cache_clear()
+        self.addCleanup(docs.load_schema.cache_clear)
+        call_command('build_schema', stdout=io.StringIO())
+
+    def test_build_writes_schema(self):
+        with open(os.path.join(self.schema_dir, 'openapi-v1.json')) as schema_file:
+            schema = json.load(schema_file)
+        self.assertEqual(schema['info']['version'], 'v1')
+        self.assertIn('/users/me/', schema['paths'])
+
+    def test_built_schema_is_served_with_etag(self):
+        url = reverse('api-docs') + '?format=openapi'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertEqual(response.json()['info']['title'], 'API')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('api-schema-json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_debug_regenerates_schema(self):
+        with override_settings(DEBUG=True):
+            response = self.client.get(reverse('api-schema-json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('/users/me/', response.json()['paths'])
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2',
+                   UPLOAD_PRESIGN_BATCH_SIZE=3)
+@mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+class FileUploadAPITestCase(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        s3.clear_s3_clients()
+        self.addCleanup(s3.clear_s3_clients)
+
+    def test_client_is_shared(self):
+        self.assertIs(s3.get_s3_client(), s3.get_s3_client())
+        with override_settings(AWS_S3_REGION_NAME='eu-west-1'):
+            self.assertEqual(s3.get_s3_client().meta.region_name, 'eu-west-1')
+
+    def test_single_presign(self):
+        response = self.sally_client.get(reverse('upload'), {'file': 'avatar.png'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['fields']['key'], 'media/public/avatar.png')
+
+    def test_batch_presign(self):
+        files = ['one.png', 'two.png', 'three.png']
+        response = self.sally_client.post(reverse('upload-batch'), {'files': files}, format='json')
+        self.assertEqual(response.status_code, 200)
+        uploads = response.json()['data']['uploads']
+        self.assertEqual([upload['file'] for upload in uploads], files)
+        self.assertEqual([upload['fields']['key'] for upload in uploads],
+                         [f'media/public/{name}' for name in files])
+        self.assertTrue(all(upload['url'] for upload in uploads))
+
+    def test_batch_presign_requires_a_user(self):
+        response = self.client.post(reverse('upload-batch'), {'files': ['one.png']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_batch_presign_limits(self):
+        url = reverse('upload-batch')
+        response = self.sally_client.post(url, {'files': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.sally_client.post(url, {'files': ['a', 'b', 'c', 'd']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('files', response.json())
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2',
+                   AWS_S3_CUSTOM_DOMAIN='cdn.example.com')
+class MultipartUploadAPITestCase(BaseAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        environ = mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        s3.clear_s3_clients()
+        self.addCleanup(s3.clear_s3_clients)
+        self.stubber = Stubber(s3.get_s3_client())
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def create_upload(self, filename='holiday.mp4'):
+        self.stubber.add_response('create_multipart_upload', {'UploadId': 'upload-1'}, {
+            'Bucket': 'bucket', 'Key': f'media/public/{filename}', 'ACL': 'public-read',
+            'ContentType': 'video/mp4',
+        })
+        response = self.roger_client.post(reverse('multipart-upload-list'), {
+            'filename': filename, 'fileType': 'video', 'description': 'Holiday'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['data']
+
+    def stub_list_parts(self):
+        self.stubber.add_response('list_parts', {
+            'Parts': [{'PartNumber': 1, 'ETag': '"one"', 'Size': 5 * 2 ** 20},
+                      {'PartNumber': 2, 'ETag': '"two"', 'Size': 1024}],
+            'IsTruncated': False,
+        }, {'Bucket': 'bucket', 'Key': 'media/public/holiday.mp4', 'UploadId': 'upload-1',
+            'PartNumberMarker': 0})
+
+    def test_upload_is_tracked_until_completed(self):
+        upload = self.create_upload()
+        self.assertEqual(upload['status'], 'in_progress')
+        self.assertFalse(FileUploads.objects.exists())
+
+        response = self.roger_client.post(reverse('multipart-upload-parts', args=[upload['id']]),
+                                          {'partNumbers': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        parts = response.json()['data']['parts']
+        self.assertEqual([part['partNumber'] for part in parts], [1, 2])
+        self.assertIn('partNumber=2', parts[1]['url'])
+        self.assertIn('uploadId=upload-1', parts[1]['url'])
+
+        # resuming lists the parts S3 has
+        self.stub_list_parts()
+        response = self.roger_client.get(reverse('multipart-upload-detail', args=[upload['id']]))
+        self.assertEqual([part['etag'] for part in response.json()['data']['parts']],
+                         ['"one"', '"two"'])
+
+        self.stub_list_parts()
+        self.stubber.add_response('complete_multipart_upload', {}, {
+            'Bucket': 'bucket', 'Key': 'media/public/holiday.mp4', 'UploadId': 'upload-1',
+            'MultipartUpload': {'Parts': [{'PartNumber': 1, 'ETag': '"one"'},
+                                          {'PartNumber': 2, 'ETag': '"two"'}]},
+        })
+        response = self.roger_client.post(
+            reverse('multipart-upload-complete', args=[upload['id']]), {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(data['fileUpload']['url'], 'https://cdn.example.com/media/public/holiday.mp4')
+        file_upload = FileUploads.objects.get()
+        self.assertEqual((file_upload.file_type, file_upload.created_by), ('video', self.roger_user))
+        self.stubber.assert_no_pending_responses()
+
+        response = self.roger_client.post(
+            reverse('multipart-upload-complete', args=[upload['id']]), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(FileUploads.objects.count(), 1)
+
+    def test_complete_with_client_parts(self):
+        upload = self.create_upload()
+        self.stubber.add_client_error('complete_multipart_upload', 'InvalidPart', 'Part two is missing')
+        response = self.roger_client.post(
+            reverse('multipart-upload-complete', args=[upload['id']]),
+            {'parts': [{'partNumber': 2, 'etag': '"two"'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], ['S3 error: Part two is missing'])
+        self.assertFalse(FileUploads.objects.exists())
+        self.assertEqual(MultipartUpload.objects.get().status, 'in_progress')
+
+    def test_s3_failure_is_a_bad_gateway(self):
+        upload = self.create_upload()
+        self.stubber.add_client_error('list_parts', 'InternalError', 'We encountered an internal error')
+        response = self.roger_client.get(reverse('multipart-upload-detail', args=[upload['id']]))
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.json()['detail'], 'S3 error: We encountered an internal error')
+
+    def test_schema_generation_has_no_user(self):
+        view = MultipartUploadViewSet(swagger_fake_view=True)
+        self.assertFalse(view.get_queryset().exists())
+
+    def test_abort(self):
+        upload = self.create_upload()
+        self.stubber.add_response('abort_multipart_upload', {}, {
+            'Bucket': 'bucket', 'Key': 'media/public/holiday.mp4', 'UploadId': 'upload-1'})
+        response = self.roger_client.post(reverse('multipart-upload-abort', args=[upload['id']]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(MultipartUpload.objects.get().status, 'aborted')
+        response = self.roger_client.post(reverse('multipart-upload-parts', args=[upload['id']]),
+                                          {'partNumbers': [1]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_uploads_are_private(self):
+        upload = self.create_upload()
+        response = self.sally_client.post(reverse('multipart-upload-parts', args=[upload['id']]),
+                                          {'partNumbers': [1]}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_abandoned_uploads_are_aborted(self):
+        upload = self.create_upload()
+        self.create_upload()
+        self.stubber.add_response('abort_multipart_upload', {})
+        # S3 already dropped the second one
+        self.stubber.add_client_error('abort_multipart_upload', 'NoSuchUpload')
+        MultipartUpload.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(abort_abandoned_multipart_uploads(), 2)
+        self.assertEqual(MultipartUpload.objects.get(pk=upload['id']).status, 'aborted')
+        self.assertEqual(abort_abandoned_multipart_uploads(), 0)
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2',
+                   AWS_S3_CUSTOM_DOMAIN='cdn.example.com')
+class ContentUploadAPITestCase(BaseAPITestCase):
+    content = b'\x89PNG avatar'
+
+    def setUp(self):
+        super().setUp()
+        environ = mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        s3.clear_s3_clients()
+        self.addCleanup(s3.clear_s3_clients)
+        self.stubber = Stubber(s3.get_s3_client())
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+        self.content_hash = hashlib.sha256(self.content).hexdigest()
+        self.key = f'media/public/sha256/{self.content_hash}'
+
+    def post(self, client):
+        return client.post(reverse('upload-content'), {
+            'contentHash': self.content_hash, 'filename': 'avatar.png', 'fileType': 'image'}, format='json')
+
+    def stub_head(self, checksum):
+        params = {'Bucket': 'bucket', 'Key': self.key, 'ChecksumMode': 'ENABLED'}
+        if checksum is None:
+            self.stubber.add_client_error('head_object', '404', 'Not Found', 404, expected_params=params)
+        else:
+            self.stubber.add_response('head_object', {'ChecksumSHA256': checksum}, params)
+
+    def test_file_is_uploaded_once(self):
+        self.stub_head(None)
+        response = self.post(self.roger_client)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertFalse(data['exists'])
+        self.assertIn('/media/public/sha256/', data['url'])
+        checksum = base64.b64encode(hashlib.sha256(self.content).digest()).decode()
+        self.assertEqual(data['headers']['x-amz-checksum-sha256'], checksum)
+        self.assertEqual(data['headers']['Content-Type'], 'image/png')
+
+        # registered once the PUT went through
+        self.stub_head(checksum)
+        response = self.post(self.roger_client)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()['data']
+        self.assertTrue(data['exists'])
+        self.assertEqual(data['url'], f'https://cdn.example.com/{self.key}')
+        self.assertNotIn('contentHash', data)
+
+        # known files are not looked up on S3 again, another user gets a
+        # row of their own for the stored file
+        response = self.post(self.sally_client)
+        self.assertEqual(response.status_code, 200)
+        sally_data = response.json()['data']
+        self.assertNotEqual(sally_data['id'], data['id'])
+        self.assertEqual(sally_data['url'], data['url'])
+        self.assertEqual(FileUploads.objects.get(pk=sally_data['id']).created_by, self.sally_user)
+        # and the same one the next time
+        response = self.post(self.sally_client)
+        self.assertEqual(response.json()['data']['id'], sally_data['id'])
+        self.assertEqual(FileUploads.objects.filter(content_hash=self.content_hash).count(), 2)
+        self.stubber.assert_no_pending_responses()
+
+    def test_s3_failure_is_a_bad_gateway(self):
+        self.stubber.add_client_error('head_object', 'InternalError', 'We encountered an internal error', 500)
+        response = self.post(self.roger_client)
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(FileUploads.objects.exists())
+
+    def test_checksum_mismatch_is_not_registered(self):
+        self.stub_head(base64.b64encode(b'0' * 32).decode())
+        response = self.post(self.roger_client)
+        self.assertFalse(response.json()['data']['exists'])
+        self.assertFalse(FileUploads.objects.exists())
+
+    def test_hash_is_validated(self):
+        self.content_hash = 'not-a-hash'
+        response = self.post(self.roger_client)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('contentHash', response.json())
+
+
+class ImageDerivativesTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        # local filesystem storage stands in for S3
+        storage = override_settings(MEDIA_ROOT=media_root.name, MEDIA_URL='https://media.example.com/',
+                                    DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage')
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.url = 'https://media.example.com/media/public/avatar.png'
+        self.variants = {'source': self.url, 'sizes': {
+            'thumbnail': {'url': 'https://media.example.com/media/public/avatar.thumbnail.webp',
+                          'width': 96, 'height': 64}}}
+
+    def save_image(self, name='media/public/avatar.png', size=(1200, 800), mode='RGB'):
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.new(mode, size, 'red').save(output, 'PNG')
+        default_storage.save(name, ContentFile(output.getvalue()))
+        return default_storage.url(name)
+
+    def test_storage_name(self):
+        self.assertEqual(images.storage_name(self.url), 'media/public/avatar.png')
+        self.assertIsNone(images.storage_name('https://www.gravatar.com/avatar/1'))
+
+    def test_serializers_pick_the_size(self):
+        profile = self.roger_profile
+        profile.avatar, profile.avatar_variants = self.url, self.variants
+        self.assertEqual(UserMinimalSerializer(profile).data['avatar'],
+                         self.variants['sizes']['thumbnail']['url'])
+        self.assertEqual(UserProfileSerializer(profile).data['avatar'], self.url)
+        request = Request(APIRequestFactory().get('/', {'image_size': 'thumbnail'}))
+        self.assertEqual(UserProfileSerializer(profile, context={'request': request}).data['avatar'],
+                         self.variants['sizes']['thumbnail']['url'])
+        # sizes not generated and derivatives of a previous avatar fall back to the original
+        request = Request(APIRequestFactory().get('/', {'image_size': 'medium'}))
+        self.assertEqual(UserProfileSerializer(profile, context={'request': request}).data['avatar'], self.url)
+        profile.avatar = 'https://media.example.com/media/public/new.png'
+        self.assertEqual(UserMinimalSerializer(profile).data['avatar'], profile.avatar)
+        profile.avatar = None
+        self.assertIsNone(UserMinimalSerializer(profile).data['avatar'])
+
+        upload = FileUploads(url=self.url, variants=self.variants)
+        self.assertEqual(FileUploadsSerializer(upload).data['url'], self.url)
+
+    @mock.patch.object(images, 'available', return_value=True)
+    def test_saves_enqueue_derivatives(self, available):
+        with mock.patch.object(generate_image_derivatives, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                upload = FileUploads.objects.create(url=self.url, file_type='image')
+                FileUploads.objects.create(url='https://media.example.com/talk.mp4', file_type='video')
+                self.roger_profile.avatar = self.url
+                self.roger_profile.save()
+            self.assertEqual([call.kwargs['args'] for call in apply_async.call_args_list], [
+                ('core.fileuploads', upload.pk), ('accounts.userprofile', self.roger_profile.pk)])
+
+            apply_async.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.roger_profile.avatar_variants = self.variants
+                self.roger_profile.save()
+            apply_async.assert_not_called()
+
+    @skipUnless(images.Image, 'Pillow is not installed')
+    def test_derivatives_are_generated(self):
+        url = self.save_image()
+        self.roger_profile.avatar = url
+        self.roger_profile.save()
+        self.assertEqual(generate_image_derivatives('accounts.userprofile', self.roger_profile.pk), 3)
+
+        self.roger_profile.refresh_from_db()
+        sizes = self.roger_profile.avatar_variants['sizes']
+        self.assertEqual(self.roger_profile.avatar_variants['source'], url)
+        self.assertEqual({size: (variant['width'], variant['height']) for size, variant in sizes.items()},
+                         {'thumbnail': (96, 64), 'small': (320, 213), 'medium': (960, 640)})
+        self.assertTrue(default_storage.exists('media/public/avatar.thumbnail.webp'))
+        self.assertEqual(UserMinimalSerializer(self.roger_profile).data['avatar'],
+                         'https://media.example.com/media/public/avatar.thumbnail.webp')
+
+        # regenerating replaces the files
+        self.assertEqual(generate_image_derivatives('accounts.userprofile', self.roger_profile.pk), 3)
+        self.assertEqual(sorted(os.listdir(os.path.join(default_storage.location, 'media/public'))), [
+            'avatar.medium.webp', 'avatar.png', 'avatar.small.webp', 'avatar.thumbnail.webp'])
+
+    @skipUnless(images.Image, 'Pillow is not installed')
+    def test_small_and_broken_images(self):
+        self.save_image(size=(50, 40), mode='RGBA')
+        with default_storage.open('media/public/avatar.png') as image_file:
+            rendered = images.render_derivatives(image_file.read())
+        # never enlarged, transparency is kept
+        self.assertEqual({size: (width, height) for size, (_, width, height) in rendered.items()},
+                         {'thumbnail': (50, 40), 'small': (50, 40), 'medium': (50, 40)})
+
+        default_storage.save('media/public/broken.png', ContentFile(b'not an image'))
+        upload = FileUploads.objects.create(url='https://media.example.com/media/public/broken.png')
+        self.assertEqual(generate_image_derivatives('core.fileuploads', upload.pk), 0)
+        upload.refresh_from_db()
+        self.assertEqual(upload.variants, {'source': upload.url, 'sizes': {}})
+
+    @skipUnless(images.Image, 'Pillow is not installed')
+    def test_command_backfills_in_a_pool(self):
+        url = self.save_image()
+        upload = FileUploads.objects.create(url=url, file_type='image')
+        stdout = io.StringIO()
+        call_command('build_image_derivatives', workers=0, stdout=stdout)
+        self.assertIn('Generated 3 derivatives of 1 images', stdout.getvalue())
+        upload.refresh_from_db()
+        self.assertEqual(len(upload.variants['sizes']), 3)
+
+
+class ChunkedStream:
+    """
+    A request body that records how much every read asks for.
+    """
+
+    def __init__(self, content):
+        self.stream = io.BytesIO(content)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return self.stream.read(size)
+
+
+class StreamUploadAPITestCase(BaseAPITestCase):
+    content = os.urandom(300 * 1024)
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        storage = override_settings(MEDIA_ROOT=media_root.name, MEDIA_URL='https://media.example.com/',
+                                    DEFAULT_FILE_STORAGE='django.core.files.storage.FileSystemStorage')
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.uploads_dir = os.path.join(media_root.name, 'uploads')
+
+    def put(self, query, content=None, content_type='application/octet-stream'):
+        return self.roger_client.put(f'{reverse("upload-stream")}?{query}', self.content if content is None
+                                     else content, content_type=content_type)
+
+    def test_body_is_stored_and_hashed(self):
+        response = self.put('file=../report.pdf&file_type=document&description=Q3')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()['data']
+        content_hash = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual((data['contentHash'], data['size']), (content_hash, len(self.content)))
+        self.assertEqual(data['url'], 'https://media.example.com/uploads/report.pdf')
+        with open(os.path.join(self.uploads_dir, 'report.pdf'), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        file_upload = FileUploads.objects.get()
+        self.assertEqual((file_upload.content_hash, file_upload.file_type, file_upload.description),
+                         (content_hash, 'document', 'Q3'))
+
+        # the same content again keeps the stored file
+        response = self.put('file=copy.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['exists'])
+        self.assertEqual(response.json()['data']['id'], file_upload.id)
+        self.assertEqual(os.listdir(self.uploads_dir), ['report.pdf'])
+
+        # another user gets a row of their own for it
+        response = self.sally_client.put(f'{reverse("upload-stream")}?file=mine.pdf&description=Mine',
+                                         self.content, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertNotEqual(data['id'], file_upload.id)
+        self.assertEqual((data['url'], data['description']),
+                         ('https://media.example.com/uploads/report.pdf', 'Mine'))
+        self.assertEqual(os.listdir(self.uploads_dir), ['report.pdf'])
+
+    def test_body_is_read_in_chunks(self):
+        stream = ChunkedStream(self.content)
+        name, content_hash = stream_to_storage(stream, len(self.content), 'big.bin', default_storage)
+        self.assertEqual(content_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertLessEqual(max(stream.reads), 64 * 1024)
+
+        stream = ChunkedStream(self.content[:1000])
+        with self.assertRaisesMessage(ParseError, 'Upload ended after 1000 of 2000 bytes'):
+            stream_to_storage(stream, 2000, 'short.bin', default_storage)
+
+    def test_rejected_uploads(self):
+        with override_settings(STREAM_UPLOAD_MAX_SIZE=1024):
+            self.assertEqual(self.put('file=big.bin').status_code, 413)
+        self.assertEqual(self.put('file=a.bin', content_type='multipart/form-data; boundary=x').status_code, 415)
+        self.assertEqual(self.put('file=a.bin', content=b'').status_code, 400)
+        self.assertEqual(self.put('').status_code, 400)
+        self.assertEqual(self.put('file=a.bin&private=true').status_code, 400)
+        self.assertFalse(FileUploads.objects.exists())
+
+    def test_private_upload(self):
+        with override_settings(PRIVATE_FILE_STORAGE='django.core.files.storage.FileSystemStorage'):
+            response = self.put('file=contract.pdf&private=true')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['data']['name'], 'uploads/contract.pdf')
+        self.assertFalse(FileUploads.objects.exists())
+
+    @override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2')
+    @mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+    def test_s3_storage(self):
+        from api.storage_backends import PublicMediaStorage
+
+        storage = PublicMediaStorage()
+        with Stubber(storage.connection.meta.client) as stubber:
+            stubber.add_client_error('head_object', '404', 'Not Found', 404)
+            stubber.add_response('put_object', {'ETag': '"stored"'}, {
+                'Bucket': 'bucket', 'Key': 'media/uploads/report.pdf', 'Body': ANY,
+                'ACL': 'public-read', 'ContentType': 'application/pdf'})
+            name, content_hash = stream_to_storage(
+                io.BytesIO(self.content), len(self.content), 'report.pdf', storage)
+            stubber.assert_no_pending_responses()
+        self.assertEqual(name, 'uploads/report.pdf')
+        self.assertEqual(content_hash, hashlib.sha256(self.content).hexdigest())
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_REGION_NAME='ap-southeast-2',
+                   AWS_SIGNED_URL_BUCKET_SECONDS=900, AWS_SIGNED_URL_MIN_VALIDITY=3600)
+@mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'key', 'AWS_SECRET_ACCESS_KEY': 'secret'})
+class SignedURLCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        from api.storage_backends import PrivateMediaStorage
+
+        self.storage = PrivateMediaStorage()
+        self.now = 900 * 2000000 + 100.25
+        clock = mock.patch('api.storage_backends.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_urls_are_reused_within_a_bucket(self):
+        with mock.patch('storages.backends.s3boto3.S3Boto3Storage.url', autospec=True,
+                        side_effect=lambda storage, name, expire: f'{name}?expires={expire}&at={self.now}') as sign:
+            url = self.storage.url('contract.pdf')
+            # valid until the bucket ends plus the minimum validity
+            self.assertEqual(url, f'contract.pdf?expires={800 + 3600}&at={self.now}')
+            self.now += 700
+            self.assertEqual(self.storage.url('contract.pdf'), url)
+            self.assertEqual(sign.call_count, 1)
+
+            # another process gets the URL from the cache
+            from api.storage_backends import PrivateMediaStorage
+            self.assertEqual(PrivateMediaStorage().url('contract.pdf'), url)
+            self.assertEqual(sign.call_count, 1)
+
+            self.now += 200
+            self.assertNotEqual(self.storage.url('contract.pdf'), url)
+            self.assertEqual(sign.call_count, 2)
+
+    def test_lists_are_signed_with_one_cache_lookup(self):
+        names = [f'invoices/{index}.pdf' for index in range(20)]
+        with mock.patch('api.storage_backends.cache.get_many', wraps=cache.get_many) as get_many:
+            urls = self.storage.urls(names + names[:5])
+            self.assertEqual(get_many.call_count, 1)
+            self.assertEqual(self.storage.urls(names), {name: urls[name] for name in names})
+            self.assertEqual(get_many.call_count, 1)
+        self.assertIn(f'Expires={900 * 2000001 + 3600}', urls['invoices/0.pdf'])
+        self.assertIn('/media/invoices/0.pdf?', urls['invoices/0.pdf'])
+        # explicit expiry or parameters are signed as asked
+        self.assertNotEqual(self.storage.url('invoices/0.pdf', expire=60), urls['invoices/0.pdf'])
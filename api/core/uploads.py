@@ -0,0 +1,103 @@
+"""
+Uploads streamed through the API into a storage backend.
+
+Clients that cannot use presigned posts send the file as the raw request
+body. `stream_to_storage` hands the body to `Storage.save` as a read-only
+stream, so nothing is spooled to memory or a temp file first: the file
+system storage writes it in 64 kB chunks, S3Boto3Storage sends it with a
+multipart upload of 8 MB parts, and the file is hashed as it goes by.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage, get_storage_class
+
+from rest_framework import exceptions, status
+
+
+__all__ = ['RequestTooLarge', 'HashingReader', 'get_upload_storage', 'stream_to_storage']
+
+
+def get_stream_upload_max_size():
+    """
+    Returns the largest file in bytes the streaming upload takes (default: 5 GB)
+    Set Django SETTINGS.STREAM_UPLOAD_MAX_SIZE to overwrite this
+    """
+    return getattr(settings, 'STREAM_UPLOAD_MAX_SIZE', 5 * 2 ** 30)
+
+
+class RequestTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'File is too large.'
+    default_code = 'request_too_large'
+
+
+class HashingReader:
+    """
+    Reads `size` bytes of `stream` exactly, computing their sha256 on the
+    way. A body that ends early raises a ParseError instead of storing
+    half a file.
+    """
+    closed = False
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.size = size
+        self.read_size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        remaining = self.size - self.read_size
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if not size:
+            return b''
+        data = self.stream.read(size)
+        if not data:
+            raise exceptions.ParseError(
+                detail=f'Upload ended after {self.read_size} of {self.size} bytes')
+        self.read_size += len(data)
+        self.sha256.update(data)
+        return data
+
+    def seekable(self):
+        # S3Boto3Storage would rewind a seekable file before sending it
+        return False
+
+    @property
+    def content_hash(self):
+        return self.sha256.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _get_storage(import_path):
+    # S3 storages set up a boto3 session of their own, build them once
+    return get_storage_class(import_path)()
+
+
+def get_upload_storage(private=False):
+    """
+    Returns the PRIVATE_FILE_STORAGE for private files, the default storage
+    otherwise, None when private files have no storage configured.
+    """
+    if not private:
+        return default_storage
+    import_path = getattr(settings, 'PRIVATE_FILE_STORAGE', None)
+    return _get_storage(import_path) if import_path else None
+
+
+def stream_to_storage(stream, size, filename, storage):
+    """
+    Saves the `size` bytes of `stream` as uploads/`filename` in `storage`.
+    :return: tuple of (name the file got, sha256 hex digest of it)
+    """
+    max_size = get_stream_upload_max_size()
+    if size > max_size:
+        raise RequestTooLarge(detail=f'Ensure the file has no more than {max_size} bytes.')
+    reader = HashingReader(stream, size)
+    name = f'uploads/{storage.get_valid_name(os.path.basename(filename))}'
+    name = storage.save(name, File(reader, name))
+    return name, reader.content_hash
@@ -0,0 +1,12 @@
+from django.urls import re_path, include
+
+from rest_framework.routers import SimpleRouter
+
+from .views import MultipartUploadViewSet
+
+core_router = SimpleRouter()
+core_router.register(r'uploads/multipart', MultipartUploadViewSet, basename='multipart-upload')
+
+urlpatterns = [
+    re_path(r"", include(core_router.urls)),
+]
@@ -1,27 +1,263 @@
-import boto3
+from django.db import transaction
+from django.utils import timezone
 
-from botocore.client import Config
-
-from django.conf import settings
-
-from rest_framework.generics import RetrieveAPIView
+from rest_framework import exceptions, mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.generics import GenericAPIView, RetrieveAPIView
 from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAuthenticated
 
+from . import s3
+from .async_views import async_api_view, async_success_response, run_sync
+from .models import FileUploads, MultipartUpload
+from .s3 import presign_upload, presign_uploads
+from .serializers import (ContentUploadSerializer, FileUploadBatchSerializer, FileUploadsSerializer,
+                          MultipartCompleteSerializer, MultipartPartsSerializer, MultipartUploadSerializer,
+                          StreamUploadSerializer)
+from .uploads import get_upload_storage, stream_to_storage
 from .utils import success_response
 
 
+class S3Unavailable(exceptions.APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = 'S3 request failed.'
+    default_code = 'bad_gateway'
+
+
+# S3 errors caused by the parts a client sent, anything else is S3's fault
+S3_CLIENT_ERROR_CODES = {'InvalidPart', 'InvalidPartOrder', 'EntityTooSmall', 'NoSuchUpload'}
+
+
+def s3_error(exc):
+    """
+    Returns the APIException to answer a failed S3 request with.
+    """
+    if exc.code in S3_CLIENT_ERROR_CODES:
+        return exceptions.ValidationError({'detail': [f'S3 error: {exc.message}']})
+    return S3Unavailable(detail=f'S3 error: {exc.message}')
+
+
 class FileUploadView(RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
-        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-        region_name = settings.AWS_S3_REGION_NAME
-        signature_version = 's3v4'
         filename = request.GET.get('file', '')
         if not filename:
             raise ParseError(detail='Querystring file not provided')
-        s3_client = boto3.client('s3', config=Config(
-            signature_version=signature_version, region_name=region_name))
-        upload_details = s3_client.generate_presigned_post(
-            bucket_name, f'media/public/{filename}', Fields={"acl": "public-read", }, Conditions=[
-                {"acl": "public-read"},
-            ])
+        upload_details = presign_upload(filename)
         return success_response(detail="Generated pre-signed post", **upload_details)
+
+
+class FileUploadBatchView(GenericAPIView):
+    serializer_class = FileUploadBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        # one client and one round trip for a whole gallery
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        uploads = presign_uploads(serializer.validated_data['files'])
+        return success_response(detail="Generated pre-signed posts", uploads=uploads)
+
+
+def get_content_upload(content_hash, user, file_type, description=None):
+    """
+    Returns the FileUploads of `user` for the file with `content_hash`, or
+    None when no one stored it yet. A user who has none gets a row of their
+    own pointing at the stored file, the rows of other users stay theirs.
+    """
+    file_upload = FileUploads.objects.filter(
+        content_hash=content_hash, created_by=user).order_by('created_at').first()
+    if file_upload is not None:
+        return file_upload
+    stored = FileUploads.objects.filter(content_hash=content_hash).order_by('created_at').first()
+    if stored is None:
+        return None
+    # derivatives were made of the same URL, they are shared as well
+    return FileUploads.objects.create(
+        url=stored.url, content_hash=content_hash, variants=stored.variants,
+        file_type=file_type, description=description, created_by=user)
+
+
+class ContentUploadView(GenericAPIView):
+    """
+    Uploads stored by their sha256, a file is uploaded and stored once.
+    The client posts the hash first: a known file returns the caller's
+    FileUploads of it (`exists` true), an unknown one a presigned PUT to
+    send it with. After the PUT the client posts again and the file is
+    registered, once S3's checksum of it matches the hash.
+    """
+    serializer_class = ContentUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        content_hash = data['content_hash']
+
+        file_upload = get_content_upload(content_hash, request.user, data['file_type'], data.get('description'))
+        if file_upload is not None:
+            return success_response(detail="File already uploaded", exists=True,
+                                    **FileUploadsSerializer(file_upload).data)
+        try:
+            if not s3.content_stored(content_hash):
+                upload_details = s3.presign_content_upload(content_hash, data['filename'])
+                return success_response(detail="Generated pre-signed upload", exists=False, **upload_details)
+        except s3.S3Error as exc:
+            raise s3_error(exc)
+
+        file_upload = FileUploads.objects.create(
+            url=s3.object_url(s3.content_key(content_hash)), content_hash=content_hash,
+            file_type=data['file_type'], description=data.get('description'), created_by=request.user)
+        return success_response(detail="File uploaded", code=201, exists=True,
+                                **FileUploadsSerializer(file_upload).data)
+
+
+class StreamUploadView(GenericAPIView):
+    """
+    For clients that cannot use presigned posts: PUT the file as the raw
+    request body, `?file=name` (and optionally fileType, description,
+    private=true) in the query string. The body is streamed to the storage
+    and never parsed, see core.uploads. Public files get a FileUploads row,
+    a file already stored with the same content is kept and the new copy
+    deleted.
+    """
+    serializer_class = StreamUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, *args, **kwargs):
+        if request.content_type.startswith('multipart/'):
+            raise exceptions.UnsupportedMediaType(
+                request.content_type, detail='Send the file as the request body, not as a form')
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        size = int(request.META.get('CONTENT_LENGTH') or 0)
+        if not size:
+            raise ParseError(detail='Request body is empty')
+        storage = get_upload_storage(data['private'])
+        if storage is None:
+            raise exceptions.ValidationError({'private': ['Private uploads are not configured']})
+
+        name, content_hash = stream_to_storage(request.stream, size, data['file'], storage)
+        if data['private']:
+            return success_response(detail="File uploaded", code=201, name=name, url=storage.url(name),
+                                    size=size, content_hash=content_hash)
+
+        file_upload = get_content_upload(content_hash, request.user, data['file_type'], data.get('description'))
+        if file_upload is not None:
+            storage.delete(name)
+            return success_response(detail="File already uploaded", exists=True, size=size,
+                                    content_hash=content_hash, **FileUploadsSerializer(file_upload).data)
+        file_upload = FileUploads.objects.create(
+            url=storage.url(name), content_hash=content_hash, file_type=data['file_type'],
+            description=data.get('description'), created_by=request.user)
+        return success_response(detail="File uploaded", code=201, exists=False, size=size,
+                                content_hash=content_hash, **FileUploadsSerializer(file_upload).data)
+
+
+class MultipartUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                             viewsets.GenericViewSet):
+    """
+    Large files are uploaded to S3 in parts: create an upload, presign its
+    parts in batches and PUT them, then complete it. An interrupted upload
+    is resumed by retrieving it, which lists the parts S3 already has. The
+    FileUploads row is created when the upload is completed, abandoned ones
+    are aborted by the core.tasks.abort_abandoned_multipart_uploads task.
+    """
+    serializer_class = MultipartUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # the schema generator has no user
+            return MultipartUpload.objects.none()
+        return MultipartUpload.objects.filter(
+            created_by=self.request.user).select_related('file_upload')
+
+    def get_in_progress(self, lock=False):
+        upload = self.get_object()
+        if lock:
+            upload = MultipartUpload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status != 'in_progress':
+            raise exceptions.ValidationError(
+                {'detail': f'Upload is {upload.get_status_display().lower()}'})
+        return upload
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        filename = serializer.validated_data['filename']
+        key = s3.upload_key(filename)
+        try:
+            upload_id = s3.create_multipart_upload(key, filename)
+        except s3.S3Error as exc:
+            raise s3_error(exc)
+        serializer.save(created_by=request.user, key=key, upload_id=upload_id)
+        return success_response(detail="Multipart upload created", code=201, **serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        parts = []
+        if upload.status == 'in_progress':
+            try:
+                parts = s3.list_uploaded_parts(upload.key, upload.upload_id)
+            except s3.S3Error as exc:
+                raise s3_error(exc)
+        serializer = self.get_serializer(upload)
+        return success_response(detail="Fetched multipart upload", parts=parts, **serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def parts(self, request, pk=None):
+        upload = self.get_in_progress()
+        serializer = MultipartPartsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        parts = s3.presign_upload_parts(
+            upload.key, upload.upload_id, serializer.validated_data['part_numbers'])
+        return success_response(detail="Generated pre-signed part uploads", parts=parts)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        serializer = MultipartCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # the lock makes a repeated complete wait and then see the upload completed
+        with transaction.atomic():
+            upload = self.get_in_progress(lock=True)
+            try:
+                parts = serializer.validated_data.get('parts') or s3.list_uploaded_parts(
+                    upload.key, upload.upload_id)
+                if not parts:
+                    raise exceptions.ValidationError({'parts': ['No parts have been uploaded']})
+                s3.complete_multipart_upload(upload.key, upload.upload_id, parts)
+            except s3.S3Error as exc:
+                raise s3_error(exc)
+
+            upload.file_upload = FileUploads.objects.create(
+                url=s3.object_url(upload.key), file_type=upload.file_type,
+                description=upload.description, created_by=request.user)
+            upload.status = 'completed'
+            upload.completed_at = timezone.now()
+            upload.save(update_fields=['file_upload', 'status', 'completed_at'])
+        serializer = self.get_serializer(upload)
+        return success_response(detail="Multipart upload completed", **serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def abort(self, request, pk=None):
+        with transaction.atomic():
+            upload = self.get_in_progress(lock=True)
+            try:
+                s3.abort_multipart_upload(upload.key, upload.upload_id)
+            except s3.S3Error as exc:
+                raise s3_error(exc)
+            upload.status = 'aborted'
+            upload.save(update_fields=['status'])
+        return success_response(detail="Multipart upload aborted")
+
+
+@async_api_view()
+async def file_upload(request):
+    # FileUploadView for ASGI, signing runs off the event loop
+    filename = request.GET.get('file', '')
+    if not filename:
+        raise ParseError(detail='Querystring file not provided')
+    upload_details = await run_sync(presign_upload)(filename)
+    return async_success_response(detail="Generated pre-signed post", **upload_details)
@@ -0,0 +1,98 @@
+"""
+Load what the first requests of a new process would otherwise pay for.
+
+Called by the gunicorn master (api/gunicorn_conf.py) after the preloaded
+application is imported: everything loaded here is built once and shared
+copy-on-write by the forked workers.
+"""
+import inspect
+import logging
+import os
+from importlib import import_module
+from importlib.util import find_spec
+
+from django.apps import apps
+from django.db import connections
+from django.template import TemplateDoesNotExist, engines
+from django.urls import get_resolver
+
+from rest_framework import serializers
+
+from .camel_case import serializer_key_map
+from .planning import get_queryset_plan
+
+
+__all__ = ['warm_up']
+
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # builds the reverse lookups of every included URLconf
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def project_serializers():
+    for app_config in apps.get_app_configs():
+        name = f'{app_config.name}.serializers'
+        if app_config.path.startswith(PROJECT_DIR) and find_spec(name):
+            module = import_module(name)
+            for _, value in inspect.getmembers(module, inspect.isclass):
+                if issubclass(value, serializers.BaseSerializer) and value.__module__ == name:
+                    yield value
+
+
+def warm_serializers():
+    count = 0
+    for serializer_class in project_serializers():
+        try:
+            # field building fills the model meta and field mapping caches
+            serializer_class().fields
+        except Exception:
+            # serializers that need context or arguments are built per request
+            continue
+        if issubclass(serializer_class, serializers.ModelSerializer):
+            get_queryset_plan(serializer_class, serializer_class.Meta.model)
+            serializer_key_map(serializer_class)
+        count += 1
+    return count
+
+
+def warm_templates():
+    count = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    name = os.path.relpath(os.path.join(root, filename), directory)
+                    try:
+                        engine.get_template(name)
+                    except (TemplateDoesNotExist, UnicodeDecodeError):
+                        continue
+                    count += 1
+    return count
+
+
+def warm_up():
+    """
+    Resolve the URLconf, build the project's serializers and compile its
+    templates. Database connections opened on the way are closed, so no
+    forked process inherits one.
+    :return: dict of what was loaded
+    """
+    try:
+        loaded = {
+            'url_patterns': warm_urls(),
+            'serializers': warm_serializers(),
+            'templates': warm_templates(),
+        }
+    finally:
+        connections.close_all()
+    logger.info('Warmed up %(url_patterns)s url patterns, %(serializers)s serializers '
+                'and %(templates)s templates', loaded)
+    return loaded